@@ -0,0 +1,102 @@
+"""
+Benchmark cold start: waktu import setiap lambda_function di proses Python baru.
+
+Setiap function di-import REPEAT kali, masing-masing di interpreter baru
+(seperti cold start Lambda), dengan lambda/layer*/python di sys.path.
+Output: median waktu import per function dan modul paling mahal
+(python -X importtime) dari run pertama.
+
+    python benchmarks/cold_start_imports.py
+    BENCH_REPEAT=10 BENCH_TOP=5 python benchmarks/cold_start_imports.py order_management
+
+Function yang dependency-nya tidak ter-install ditandai FAILED.
+"""
+import os
+import sys
+import glob
+import statistics
+import subprocess
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+LAMBDA_DIR = os.path.join(ROOT, 'lambda')
+REPEAT = int(os.environ.get('BENCH_REPEAT', 5))
+TOP = int(os.environ.get('BENCH_TOP', 8))
+
+# Env minimal supaya import module-level tidak gagal karena konfigurasi
+DUMMY_ENV = {
+    'S3_BUCKET': 'bench-bucket',
+    'STATE_MACHINE_ARN': 'arn:aws:states:us-east-1:123456789012:stateMachine:bench',
+    'SNS_TOPIC_ARN': 'arn:aws:sns:us-east-1:123456789012:bench',
+    'AWS_DEFAULT_REGION': 'us-east-1',
+    'INSTRUMENTATION_MODE': 'off',
+}
+
+CHILD = """
+import sys, time
+started = time.perf_counter()
+import lambda_function
+print(f"{(time.perf_counter() - started) * 1000:.3f}")
+"""
+
+
+def layer_paths():
+    return sorted(glob.glob(os.path.join(LAMBDA_DIR, 'layer*', 'python')))
+
+
+def functions(selected):
+    names = sorted(
+        name for name in os.listdir(LAMBDA_DIR)
+        if os.path.isfile(os.path.join(LAMBDA_DIR, name, 'lambda_function.py'))
+    )
+    return [name for name in names if not selected or name in selected]
+
+
+def run_once(name, importtime=False):
+    env = dict(os.environ, **DUMMY_ENV)
+    env['PYTHONPATH'] = os.pathsep.join([os.path.join(LAMBDA_DIR, name)] + layer_paths())
+    env['PYTHONDONTWRITEBYTECODE'] = '1'
+    args = [sys.executable]
+    if importtime:
+        args += ['-X', 'importtime']
+    result = subprocess.run(args + ['-c', CHILD], env=env, capture_output=True, text=True)
+    if result.returncode != 0:
+        error = result.stderr.strip().splitlines()
+        raise RuntimeError(error[-1] if error else 'import failed')
+    return float(result.stdout.strip().splitlines()[-1]), result.stderr
+
+
+def top_modules(importtime_output):
+    """
+    Parse output -X importtime ("import time: self | cumulative | name"):
+    modul yang di-import langsung oleh lambda_function, urut cumulative time.
+    """
+    modules = []
+    for line in importtime_output.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        parts = line.split('|')
+        if len(parts) != 3:
+            continue
+        # Indent 2 spasi = di-import langsung oleh lambda_function (level teratas)
+        name = parts[2][1:]
+        if name.startswith('  ') and not name.startswith('   '):
+            modules.append((int(parts[1]), name.strip()))
+    return sorted(modules, reverse=True)[:TOP]
+
+
+def main():
+    selected = set(sys.argv[1:])
+    print(f"{'function':<20} {'median ms':>10} {'min ms':>8}  top imports (cumulative ms)")
+    for name in functions(selected):
+        try:
+            first, importtime_output = run_once(name, importtime=True)
+            times = [run_once(name)[0] for _ in range(REPEAT)]
+        except RuntimeError as e:
+            print(f"{name:<20} {'FAILED':>10}  {e}")
+            continue
+        top = ', '.join(f"{module} {us / 1000:.0f}" for us, module in top_modules(importtime_output))
+        print(f"{name:<20} {statistics.median(times):>10.1f} {min(times):>8.1f}  {top}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,105 @@
+"""
+Benchmark decrement stok: satu row inventory vs sharded counter.
+
+Butuh Postgres lokal dengan schema dari init_database (tabel inventory dan
+inventory_stock_shards). Jalankan:
+
+    BENCH_DSN="dbname=orders user=postgres host=localhost" \
+        python benchmarks/sharded_stock_decrement.py
+
+Setiap worker memakai koneksi sendiri dan melakukan decrement 1 unit per
+transaksi selama BENCH_SECONDS detik, meniru banyak update_inventory
+paralel untuk satu produk populer.
+"""
+import os
+import sys
+import time
+import threading
+import psycopg2
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'lambda', 'layer', 'python'))
+import stock_shards  # noqa: E402
+
+DSN = os.environ.get('BENCH_DSN', 'dbname=postgres user=postgres host=localhost')
+SECONDS = float(os.environ.get('BENCH_SECONDS', 5))
+WORKERS = [int(n) for n in os.environ.get('BENCH_WORKERS', '1,2,4,8,16').split(',')]
+SHARDS = int(os.environ.get('BENCH_SHARDS', 16))
+PRODUCT_ID = 'BENCH-HOT-SKU'
+STOCK = 10_000_000
+
+
+def setup(shard_count):
+    conn = psycopg2.connect(DSN)
+    cur = conn.cursor()
+    cur.execute("DELETE FROM inventory WHERE product_id = %s", (PRODUCT_ID,))
+    cur.execute("""
+        INSERT INTO inventory (product_id, product_name, price, stock_quantity)
+        VALUES (%s, 'Benchmark product', 1, %s)
+    """, (PRODUCT_ID, STOCK))
+    if shard_count:
+        stock_shards.enable(cur, PRODUCT_ID, shard_count)
+    conn.commit()
+    conn.close()
+
+
+def teardown():
+    conn = psycopg2.connect(DSN)
+    cur = conn.cursor()
+    cur.execute("DELETE FROM inventory WHERE product_id = %s", (PRODUCT_ID,))
+    conn.commit()
+    conn.close()
+
+
+def single_row(cur):
+    cur.execute("""
+        UPDATE inventory
+        SET stock_quantity = stock_quantity - 1
+        WHERE product_id = %s AND stock_quantity >= 1
+    """, (PRODUCT_ID,))
+
+
+def sharded(cur):
+    stock_shards.decrement(cur, PRODUCT_ID, 1, SHARDS)
+
+
+def worker(decrement, deadline, counts, index):
+    conn = psycopg2.connect(DSN)
+    cur = conn.cursor()
+    done = 0
+    while time.monotonic() < deadline:
+        decrement(cur)
+        conn.commit()
+        done += 1
+    counts[index] = done
+    conn.close()
+
+
+def run(decrement, workers):
+    counts = [0] * workers
+    deadline = time.monotonic() + SECONDS
+    threads = [
+        threading.Thread(target=worker, args=(decrement, deadline, counts, i))
+        for i in range(workers)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return sum(counts) / SECONDS
+
+
+def main():
+    print(f"{'workers':>8} {'single row/s':>14} {'sharded/s':>12} {'speedup':>8}")
+    try:
+        for workers in WORKERS:
+            setup(0)
+            single = run(single_row, workers)
+            setup(SHARDS)
+            shard = run(sharded, workers)
+            print(f"{workers:>8} {single:>14.0f} {shard:>12.0f} {shard / single:>7.2f}x")
+    finally:
+        teardown()
+
+
+if __name__ == '__main__':
+    main()
@@ -5,6 +5,8 @@ let AWS_REGION = 'us-east-1';
 let DEBUG_MODE = true;
 
 let currentPage = 1;
+// Keyset pagination: pageCursors[n - 1] adalah cursor untuk halaman n
+let pageCursors = [''];
 
 // Storage keys
 const STORAGE_KEYS = {
@@ -137,6 +139,9 @@ function showConfigurationWarning() {
     }
 }
 
+// ETag cache untuk GET: endpoint -> { etag, data }
+const etagCache = new Map();
+
 // API Helper
 async function apiCall(endpoint, method = 'GET', body = null) {
     console.log(`=== API CALL START: ${method} ${endpoint} ===`);
@@ -173,6 +178,12 @@ async function apiCall(endpoint, method = 'GET', body = null) {
             options.body = JSON.stringify(body);
         }
         
+        // Conditional GET: server membalas 304 kalau data belum berubah
+        const cachedEntry = method === 'GET' ? etagCache.get(endpoint) : null;
+        if (cachedEntry) {
+            options.headers['If-None-Match'] = cachedEntry.etag;
+        }
+        
         // Clean up endpoint URL
         const baseUrl = API_ENDPOINT.replace(/\/$/, '');
         const url = `${baseUrl}${endpoint}`;
@@ -192,6 +203,12 @@ async function apiCall(endpoint, method = 'GET', body = null) {
             responseTimeEl.textContent = `${responseTime}ms`;
         }
         
+        if (response.status === 304 && cachedEntry) {
+            console.log('Not modified, using cached data');
+            logActivity(`API ${method} ${endpoint} - Not Modified (${responseTime}ms)`);
+            return cachedEntry.data;
+        }
+        
         if (!response.ok) {
             let errorMessage = `HTTP error! status: ${response.status}`;
             let errorDetails = '';
@@ -230,6 +247,11 @@ async function apiCall(endpoint, method = 'GET', body = null) {
         }
         
         console.log('Parsed Response Data:', data);
+        
+        const etag = response.headers.get('ETag');
+        if (method === 'GET' && etag) {
+            etagCache.set(endpoint, { etag, data });
+        }
         logActivity(`API ${method} ${endpoint} - Success (${responseTime}ms)`);
         
         return data;
@@ -270,18 +292,20 @@ async function loadDashboard() {
             tableBody.innerHTML = '<tr><td colspan="5" class="text-center"><div class="spinner-border spinner-border-sm"></div> Loading...</td></tr>';
         }
         
-        // Load orders for dashboard
-        const data = await apiCall('/orders?limit=100');
-        console.log('Dashboard data received:', data);
+        // Stats dihitung di server (GET /stats), cukup ambil 5 order terbaru untuk tabel
+        const [stats, data] = await Promise.all([
+            apiCall('/stats'),
+            apiCall('/orders?limit=5&cursor=')
+        ]);
+        console.log('Dashboard data received:', stats, data);
         
-        // Calculate stats from API response
         const orders = data.orders || [];
         console.log(`Found ${orders.length} orders`);
         
-        const totalOrders = data.pagination?.total || orders.length;
-        const totalRevenue = orders.reduce((sum, order) => sum + (order.total_amount || 0), 0);
-        const completedOrders = orders.filter(o => o.status === 'completed' || o.status === 'delivered').length;
-        const pendingOrders = orders.filter(o => o.status === 'pending').length;
+        const totalOrders = stats.total_orders || 0;
+        const totalRevenue = stats.total_revenue || 0;
+        const completedOrders = stats.completed_orders || 0;
+        const pendingOrders = stats.pending_orders || 0;
         
         console.log('Stats calculated:', {
             totalOrders,
@@ -358,7 +382,8 @@ async function loadOrders() {
             tableBody.innerHTML = '<tr><td colspan="7" class="text-center"><div class="spinner-border spinner-border-sm"></div> Loading orders...</td></tr>';
         }
         
-        const data = await apiCall(`/orders?page=${currentPage}&limit=10`);
+        const cursor = pageCursors[currentPage - 1] || '';
+        const data = await apiCall(`/orders?limit=10&cursor=${encodeURIComponent(cursor)}`);
         console.log('Orders data received:', data);
         
         const orders = data.orders || [];
@@ -394,7 +419,11 @@ async function loadOrders() {
         
         // Update pagination
         const pagination = data.pagination || {};
-        document.getElementById('current-page').textContent = pagination.page || currentPage;
+        pageCursors = pageCursors.slice(0, currentPage);
+        if (pagination.next_cursor) {
+            pageCursors.push(pagination.next_cursor);
+        }
+        document.getElementById('current-page').textContent = currentPage;
         
         console.log('Orders loaded successfully');
         showToast('✓ Orders updated', 'success');
@@ -820,6 +849,8 @@ function changePage(delta) {
     console.log(`Changing page by ${delta}, current: ${currentPage}`);
     const newPage = currentPage + delta;
     if (newPage < 1) return;
+    // Halaman berikutnya hanya bisa dibuka kalau server memberi next_cursor
+    if (newPage > pageCursors.length) return;
     
     currentPage = newPage;
     loadOrders();
@@ -0,0 +1,39 @@
+import db_pool
+import structured_log
+import instrumentation
+
+log = structured_log.get_logger('compact_rollups')
+
+def get_db_connection():
+    # Pinjam koneksi dari pool (dipakai ulang antar warm invocation)
+    return db_pool.get_connection()
+
+def release_db_connection(conn):
+    db_pool.release_connection(conn)
+
+@log.wrap_handler('status', 'compacted')
+@instrumentation.instrument_handler('compact_rollups')
+def lambda_handler(event, context):
+    """
+    Compaction rollup harian terjadwal (EventBridge).
+    Trigger di orders / order_items hanya menulis baris delta; fungsi
+    rollup_compact() (dibuat init_database) melipat delta yang sudah
+    commit ke tabel summary dalam satu transaksi.
+    """
+    conn = get_db_connection()
+    cur = conn.cursor()
+
+    try:
+        cur.execute("SELECT rollup_compact()")
+        compacted = cur.fetchone()[0]
+        conn.commit()
+
+        return {'status': 'success', 'compacted': compacted}
+
+    except Exception as e:
+        conn.rollback()
+        log.error('compact rollups failed', error=str(e), exc_info=True)
+        return {'status': 'error', 'message': str(e)}
+    finally:
+        cur.close()
+        release_db_connection(conn)
@@ -1,47 +1,171 @@
 import json
 import os
-import psycopg2
-import boto3
-from datetime import datetime
+import db_pool
+from stock_shards import EFFECTIVE_STOCK_SQL
+from datetime import datetime, timedelta
+import structured_log
+import instrumentation
+import aws_clients
 
-DB_HOST = os.environ.get('DB_HOST')
-DB_NAME = os.environ.get('DB_NAME')
-DB_USER = os.environ.get('DB_USER')
-DB_PASSWORD = os.environ.get('DB_PASSWORD')
-
-sns_client = boto3.client("sns")
+sns_client = aws_clients.lazy("sns")
 SNS_TOPIC_ARN = os.environ.get("SNS_TOPIC_ARN")
 
+# Watermark dimundurkan sebanyak ini supaya transaksi yang commit terlambat
+# (updated_at lebih kecil dari watermark) tetap ikut terbaca
+WATERMARK_OVERLAP_SECONDS = int(os.environ.get("WATERMARK_OVERLAP_SECONDS", 60))
+# Item yang ditulis satu per satu di pesan SNS, sisanya diringkas
+DIGEST_MAX_ITEMS = int(os.environ.get("DIGEST_MAX_ITEMS", 200))
+JOB_NAME = "detects_lowstock"
+
+log = structured_log.get_logger("detects_lowstock")
+
 def get_db_connection():
-    return psycopg2.connect(
-        host=DB_HOST,
-        database=DB_NAME,
-        user=DB_USER,
-        password=DB_PASSWORD
-    )
+    # Pinjam koneksi dari pool (dipakai ulang antar warm invocation)
+    return db_pool.get_connection()
 
-def lambda_handler(event, context):
-    print(f"=== CUSTOM LAMBDA FUNCTION STARTS ===")
+def release_db_connection(conn):
+    db_pool.release_connection(conn)
 
-    conn = get_db_connection()
-    cur = conn.cursor()
+def get_watermark(cur):
+    cur.execute("""
+        SELECT watermark
+        FROM job_watermarks
+        WHERE job_name = %s
+        FOR UPDATE
+    """, (JOB_NAME,))
+    row = cur.fetchone()
+    return row[0] if row else None
 
+def save_watermark(cur, watermark):
     cur.execute("""
-            SELECT stock_quantity, product_name
+        INSERT INTO job_watermarks (job_name, watermark, updated_at)
+        VALUES (%s, %s, %s)
+        ON CONFLICT (job_name) DO UPDATE
+        SET watermark = EXCLUDED.watermark, updated_at = EXCLUDED.updated_at
+    """, (JOB_NAME, watermark, datetime.now()))
+
+def find_newly_low(cur, since):
+    """
+    Produk yang stoknya sudah mencapai reorder_point-nya dan berubah sejak watermark.
+    Predicate sama dengan partial index idx_inventory_below_reorder, jadi scan
+    hanya menyentuh baris low-stock, lalu produk yang
+    sudah pernah dilaporkan dan belum direstock disaring lewat low_stock_reported.
+    Produk sharded dicek terpisah: decrement hanya mengubah inventory_stock_shards
+    (stok = SUM shard, berubah = updated_at shard), inventory.stock_quantity-nya
+    baru sinkron saat rebalance.
+    """
+    cur.execute(f"""
+        WITH low AS (
+            SELECT product_id, product_name, stock_quantity, reorder_point
             FROM inventory
-            WHERE stock_quantity <= 10
-        """)
-
-    result = cur.fetchall()
-    
-    if not result:
-        response = sns_client.publish(
-            TopicArn=SNS_TOPIC_ARN,
-            Subject="Low Stock Detected",
-            Message=result
+            WHERE stock_quantity <= reorder_point
+            AND stock_shards = 0
+            AND updated_at > %(since)s
+            UNION ALL
+            SELECT product_id, product_name, stock_quantity, reorder_point
+            FROM (
+                SELECT i.product_id, i.product_name, {EFFECTIVE_STOCK_SQL} AS stock_quantity, i.reorder_point
+                FROM inventory i
+                WHERE i.stock_shards > 0
+                AND (
+                    i.updated_at > %(since)s
+                    OR EXISTS (
+                        SELECT 1 FROM inventory_stock_shards s
+                        WHERE s.product_id = i.product_id
+                        AND s.updated_at > %(since)s
+                    )
+                )
+            ) sharded
+            WHERE stock_quantity <= reorder_point
+        ),
+        reported AS (
+            INSERT INTO low_stock_reported (product_id, reported_at)
+            SELECT product_id, %(now)s FROM low
+            ON CONFLICT (product_id) DO NOTHING
+            RETURNING product_id
         )
-    continue
+        SELECT low.product_id, low.product_name, low.stock_quantity, low.reorder_point
+        FROM low
+        JOIN reported ON reported.product_id = low.product_id
+        ORDER BY low.stock_quantity, low.product_id
+    """, {'since': since, 'now': datetime.now()})
+    return cur.fetchall()
+
+def clear_restocked(cur):
+    """
+    Produk yang sudah direstock boleh dilaporkan lagi kalau turun lagi.
+    Restock yang sudah turun lagi sebelum run ini dihapus oleh trigger
+    low_stock_reported_clear (init_database) saat restock terjadi; di sini
+    hanya sapuan untuk produk yang saat ini sudah di atas reorder_point.
+    """
+    cur.execute(f"""
+        DELETE FROM low_stock_reported r
+        USING inventory i
+        WHERE i.product_id = r.product_id
+        AND {EFFECTIVE_STOCK_SQL} > i.reorder_point
+    """)
+    return cur.rowcount
+
+def build_digest(items):
+    lines = [f"{len(items)} product(s) reached their reorder point:", ""]
+    for product_id, product_name, stock_quantity, reorder_point in items[:DIGEST_MAX_ITEMS]:
+        lines.append(f"- {product_name} ({product_id}): {stock_quantity} left (reorder point {reorder_point})")
+    if len(items) > DIGEST_MAX_ITEMS:
+        lines.append(f"... and {len(items) - DIGEST_MAX_ITEMS} more")
+    return "\n".join(lines)
 
-    return {
+@log.wrap_handler("status", "low_stock_count", "restocked_count", "watermark")
+@instrumentation.instrument_handler("detects_lowstock")
+def lambda_handler(event, context):
+    """
+    Scanner low-stock terjadwal (EventBridge).
+    Hanya produk yang baru mencapai reorder_point sejak run sebelumnya yang
+    dilaporkan, semuanya digabung dalam satu pesan SNS.
+    """
+    conn = get_db_connection()
+    cur = conn.cursor()
+
+    try:
+        # Lock baris watermark: dua run yang tumpang tindih tidak mengirim digest ganda
+        watermark = get_watermark(cur) or datetime(1970, 1, 1)
+        since = watermark - timedelta(seconds=WATERMARK_OVERLAP_SECONDS)
+        scan_started = datetime.now()
+
+        cleared = clear_restocked(cur)
+        items = find_newly_low(cur, since)
+
+        if items:
+            sns_client.publish(
+                TopicArn=SNS_TOPIC_ARN,
+                Subject="Low Stock Detected",
+                Message=build_digest(items)
+            )
+
+        watermark = scan_started
+        save_watermark(cur, watermark)
+        # Commit setelah publish: kalau SNS gagal, produk tetap dilaporkan di run berikutnya
+        conn.commit()
+
+        return {
             "status": "stock detection finished",
-    }
\ No newline at end of file
+            "low_stock_count": len(items),
+            "restocked_count": cleared,
+            "products": [{
+                "product_id": product_id,
+                "product_name": product_name,
+                "stock_quantity": stock_quantity,
+                "reorder_point": reorder_point
+            } for product_id, product_name, stock_quantity, reorder_point in items],
+            "watermark": watermark.isoformat()
+        }
+
+    except Exception as e:
+        conn.rollback()
+        log.error("detect low stock failed", error=str(e), exc_info=True)
+        return {
+            "status": "error",
+            "message": str(e)
+        }
+    finally:
+        cur.close()
+        release_db_connection(conn)
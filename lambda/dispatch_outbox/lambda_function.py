@@ -0,0 +1,234 @@
+import json
+import os
+from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+from psycopg2.extras import execute_values
+import db_pool
+import order_archive
+import structured_log
+import instrumentation
+import aws_clients
+
+STATE_MACHINE_ARN = os.environ.get('STATE_MACHINE_ARN')
+# Bucket arsip orders/{order_id}.json (kosong = arsip tidak ditulis dispatcher)
+S3_BUCKET = os.environ.get('S3_BUCKET')
+
+# Jumlah baris outbox yang diambil per batch dan batas batch per invocation
+OUTBOX_BATCH_SIZE = int(os.environ.get('OUTBOX_BATCH_SIZE', 50))
+OUTBOX_MAX_BATCHES = int(os.environ.get('OUTBOX_MAX_BATCHES', 10))
+# start_execution paralel dalam satu batch (StartExecution tidak punya batch API)
+OUTBOX_CONCURRENCY = int(os.environ.get('OUTBOX_CONCURRENCY', 8))
+# Baris yang sedang diproses di-lease selama ini; kalau dispatcher mati di tengah jalan,
+# baris otomatis bisa diambil lagi setelah lease habis
+OUTBOX_LEASE_SECONDS = int(os.environ.get('OUTBOX_LEASE_SECONDS', 120))
+# Baris yang sudah gagal sebanyak ini tetap di-retry (backoff maksimal), tapi
+# dihitung sebagai stuck: metric OutboxStuck untuk alarm CloudWatch
+OUTBOX_MAX_ATTEMPTS = int(os.environ.get('OUTBOX_MAX_ATTEMPTS', 10))
+
+log = structured_log.get_logger('dispatch_outbox')
+
+sfn_client = aws_clients.lazy('stepfunctions')
+s3_client = aws_clients.lazy('s3')
+executor = ThreadPoolExecutor(max_workers=OUTBOX_CONCURRENCY)
+
+def get_db_connection():
+    # Pinjam koneksi dari pool (dipakai ulang antar warm invocation)
+    return db_pool.get_connection()
+
+def release_db_connection(conn):
+    db_pool.release_connection(conn)
+
+def execution_arn_for(order_id):
+    """arn:aws:states:region:account:execution:stateMachineName:order-{order_id}"""
+    parts = STATE_MACHINE_ARN.split(':')
+    return f"arn:aws:states:{parts[3]}:{parts[4]}:execution:{parts[6]}:order-{order_id}"
+
+def claim_batch(cur, conn, batch_size):
+    """
+    Ambil baris pending dan pasang lease dalam satu statement.
+    SKIP LOCKED membuat beberapa dispatcher bisa jalan bersamaan tanpa
+    mengambil baris yang sama. Transaksi langsung di-commit supaya lock
+    tidak ditahan selama memanggil Step Functions.
+    Kolom terakhir: arsip S3 order sudah ada (orders.archived_at terisi).
+    """
+    cur.execute("""
+        UPDATE order_outbox
+        SET attempts = attempts + 1,
+            next_attempt_at = %s
+        WHERE id IN (
+            SELECT id
+            FROM order_outbox
+            WHERE status = 'pending'
+            AND next_attempt_at <= %s
+            ORDER BY next_attempt_at
+            LIMIT %s
+            FOR UPDATE SKIP LOCKED
+        )
+        RETURNING id, order_id, payload, attempts, (
+            SELECT o.archived_at IS NOT NULL
+            FROM orders o
+            WHERE o.order_id = order_outbox.order_id
+        )
+    """, (datetime.now() + timedelta(seconds=OUTBOX_LEASE_SECONDS), datetime.now(), batch_size))
+    rows = cur.fetchall()
+    conn.commit()
+    return rows
+
+def start_execution(client, order_id, payload):
+    """
+    Nama execution order-{order_id} membuat start idempotent:
+    kalau sudah pernah dijalankan (oleh create_order atau dispatcher lain),
+    ExecutionAlreadyExists dianggap sukses.
+    """
+    try:
+        result = client.start_execution(
+            stateMachineArn=STATE_MACHINE_ARN,
+            name=f"order-{order_id}",
+            input=json.dumps(payload)
+        )
+        return result['executionArn']
+    except client.exceptions.ExecutionAlreadyExists:
+        return execution_arn_for(order_id)
+
+def retry_delay(attempts):
+    """Exponential backoff: 10s, 20s, 40s, ... maksimal 15 menit"""
+    return min(10 * (2 ** (attempts - 1)), 900)
+
+def record_results(cur, conn, dispatched, failed, archived=()):
+    """
+    Baris yang gagal selalu kembali ke pending dengan backoff; tidak ada status
+    terminal, jadi setiap order akhirnya mendapat workflow begitu penyebabnya hilang.
+    """
+    now = datetime.now()
+
+    # Arsip yang gagal dibiarkan archived_at NULL, diambil reconcile_order_archives
+    order_archive.mark_archived(cur, archived)
+
+    if dispatched:
+        cur.execute("""
+            UPDATE order_outbox
+            SET status = 'dispatched', dispatched_at = %s, last_error = NULL
+            WHERE id = ANY(%s)
+        """, (now, [row_id for row_id, _ in dispatched]))
+
+    if failed:
+        rows = [
+            (row_id, error[:1000], now + timedelta(seconds=retry_delay(attempts)))
+            for row_id, attempts, error in failed
+        ]
+        execute_values(cur, """
+            UPDATE order_outbox AS o
+            SET last_error = v.last_error,
+                next_attempt_at = v.next_attempt_at
+            FROM (VALUES %s) AS v (id, last_error, next_attempt_at)
+            WHERE o.id = v.id
+        """, rows, template="(%s::bigint, %s, %s::timestamp)")
+
+    conn.commit()
+
+def count_stuck(cur, conn):
+    """
+    Baris pending yang sudah gagal OUTBOX_MAX_ATTEMPTS kali (partial index
+    idx_order_outbox_pending, hanya baris pending yang dibaca).
+    Returns (jumlah, created_at tertua).
+    """
+    cur.execute("""
+        SELECT COUNT(*), MIN(created_at)
+        FROM order_outbox
+        WHERE status = 'pending'
+        AND attempts >= %s
+    """, (OUTBOX_MAX_ATTEMPTS,))
+    stuck, oldest = cur.fetchone()
+    conn.commit()
+    return stuck, oldest
+
+def archive_order(s3, order_id, payload):
+    order_archive.put_order_archive(s3, S3_BUCKET, order_id, order_archive.archive_from_payload(payload))
+
+def dispatch_batch(cur, conn, client, batch_size=OUTBOX_BATCH_SIZE, s3=s3_client):
+    """
+    Proses satu batch outbox: start workflow dan tulis arsip S3 order
+    (yang belum diarsipkan) secara paralel.
+    Return (jumlah diambil, dispatched, failed)
+    """
+    rows = claim_batch(cur, conn, batch_size)
+    if not rows:
+        return 0, 0, 0
+
+    futures = []
+    archive_futures = []
+    for row_id, order_id, payload, attempts, archived in rows:
+        if isinstance(payload, str):
+            payload = json.loads(payload)
+        futures.append((row_id, order_id, attempts, executor.submit(start_execution, client, order_id, payload)))
+        if S3_BUCKET and not archived:
+            archive_futures.append((order_id, executor.submit(archive_order, s3, order_id, payload)))
+
+    dispatched = []
+    failed = []
+    for row_id, order_id, attempts, future in futures:
+        try:
+            dispatched.append((row_id, future.result()))
+        except Exception as e:
+            log.warning('start workflow failed', order_id=order_id, attempts=attempts, error=str(e))
+            failed.append((row_id, attempts, str(e)))
+
+    archived = []
+    for order_id, future in archive_futures:
+        try:
+            future.result()
+            archived.append(order_id)
+        except Exception as e:
+            log.warning('archive failed, left for reconciliation', order_id=order_id, error=str(e))
+
+    record_results(cur, conn, dispatched, failed, archived)
+    return len(rows), len(dispatched), len(failed)
+
+@log.wrap_handler('status', 'claimed', 'dispatched', 'failed', 'batches', 'stuck')
+@instrumentation.instrument_handler('dispatch_outbox')
+def lambda_handler(event, context):
+    """
+    Drain order_outbox: start Step Functions execution untuk setiap order
+    yang workflow-nya belum dijalankan.
+    Dipanggil terjadwal (EventBridge, misalnya rate(1 minute)).
+    """
+    if not STATE_MACHINE_ARN or 'execution' in STATE_MACHINE_ARN:
+        return {
+            'status': 'error',
+            'message': 'STATE_MACHINE_ARN is missing or is not a state machine ARN'
+        }
+
+    conn = get_db_connection()
+    cur = conn.cursor()
+
+    totals = {'claimed': 0, 'dispatched': 0, 'failed': 0, 'batches': 0}
+    try:
+        for _ in range(OUTBOX_MAX_BATCHES):
+            claimed, dispatched, failed = dispatch_batch(cur, conn, sfn_client)
+            if not claimed:
+                break
+            totals['batches'] += 1
+            totals['claimed'] += claimed
+            totals['dispatched'] += dispatched
+            totals['failed'] += failed
+
+            # Jangan ambil batch baru kalau waktu invocation hampir habis
+            if context and context.get_remaining_time_in_millis() < (OUTBOX_LEASE_SECONDS * 1000) // 4:
+                break
+
+        # Dilaporkan setiap run (termasuk 0) supaya alarm OutboxStuck > 0 bisa kembali OK
+        stuck, oldest = count_stuck(cur, conn)
+        totals['stuck'] = stuck
+        instrumentation.count('OutboxStuck', stuck)
+        if stuck:
+            log.warning('outbox rows stuck', stuck=stuck, max_attempts=OUTBOX_MAX_ATTEMPTS, oldest_created_at=oldest)
+
+        return dict(totals, status='success')
+
+    except Exception as e:
+        conn.rollback()
+        log.error('dispatch outbox failed', error=str(e), exc_info=True)
+        return dict(totals, status='error', message=str(e))
+    finally:
+        cur.close()
+        release_db_connection(conn)
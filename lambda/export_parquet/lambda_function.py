@@ -0,0 +1,208 @@
+import os
+import db_pool
+import pyarrow as pa
+import pyarrow.parquet as pq
+from datetime import datetime, timedelta
+from s3_stream import S3MultipartWriter
+import structured_log
+import instrumentation
+import aws_clients
+
+S3_BUCKET = os.environ.get('S3_BUCKET')
+EXPORT_PREFIX = os.environ.get('EXPORT_PREFIX', 'exports')
+# Order yang lebih baru dari ini belum diekspor: transaksi yang commit
+# terlambat masih sempat masuk dan status order sudah lebih stabil
+EXPORT_LAG_MINUTES = int(os.environ.get('EXPORT_LAG_MINUTES', 60))
+# Batas range per invocation (catch-up histori dilakukan bertahap)
+EXPORT_MAX_DAYS = int(os.environ.get('EXPORT_MAX_DAYS', 7))
+# Baris per row group Parquet / per fetch server-side cursor
+EXPORT_BATCH_ROWS = int(os.environ.get('EXPORT_BATCH_ROWS', 10000))
+JOB_NAME = 'export_parquet'
+
+log = structured_log.get_logger('export_parquet')
+
+s3_client = aws_clients.lazy('s3')
+
+ORDERS_SCHEMA = pa.schema([
+    ('order_id', pa.string()),
+    ('customer_id', pa.string()),
+    ('status', pa.string()),
+    ('total_amount', pa.decimal128(12, 2)),
+    ('created_at', pa.timestamp('us')),
+    ('updated_at', pa.timestamp('us')),
+])
+
+ORDER_ITEMS_SCHEMA = pa.schema([
+    ('order_id', pa.string()),
+    ('product_id', pa.string()),
+    ('quantity', pa.int32()),
+    ('price', pa.decimal128(10, 2)),
+    ('order_created_at', pa.timestamp('us')),
+])
+
+ORDERS_QUERY = """
+    SELECT order_id, customer_id, status, total_amount, created_at, updated_at
+    FROM orders
+    WHERE created_at >= %s
+    AND created_at < %s
+    ORDER BY created_at
+"""
+
+ORDER_ITEMS_QUERY = """
+    SELECT oi.order_id, oi.product_id, oi.quantity, oi.price, o.created_at
+    FROM orders o
+    JOIN order_items oi ON oi.order_id = o.order_id
+    WHERE o.created_at >= %s
+    AND o.created_at < %s
+    ORDER BY o.created_at
+"""
+
+def get_db_connection():
+    # Pinjam koneksi dari pool (dipakai ulang antar warm invocation)
+    return db_pool.get_connection()
+
+def release_db_connection(conn):
+    db_pool.release_connection(conn)
+
+def stream_query(conn, name, query, params=()):
+    """Server-side cursor: baris diambil per EXPORT_BATCH_ROWS"""
+    cur = conn.cursor(name=name)
+    cur.itersize = EXPORT_BATCH_ROWS
+    try:
+        cur.execute(query, params)
+        for row in cur:
+            yield row
+    finally:
+        cur.close()
+
+def get_watermark(cur):
+    cur.execute("""
+        SELECT watermark
+        FROM job_watermarks
+        WHERE job_name = %s
+        FOR UPDATE
+    """, (JOB_NAME,))
+    row = cur.fetchone()
+    if row:
+        return row[0]
+
+    # Run pertama: mulai dari order paling lama
+    cur.execute("SELECT MIN(created_at) FROM orders")
+    first = cur.fetchone()[0]
+    if first is None:
+        return None
+    return datetime.combine(first.date(), datetime.min.time())
+
+def save_watermark(cur, watermark):
+    cur.execute("""
+        INSERT INTO job_watermarks (job_name, watermark, updated_at)
+        VALUES (%s, %s, %s)
+        ON CONFLICT (job_name) DO UPDATE
+        SET watermark = EXCLUDED.watermark, updated_at = EXCLUDED.updated_at
+    """, (JOB_NAME, watermark, datetime.now()))
+
+def export_table(conn, table, query, schema, date_column, window_start, window_end):
+    """
+    Ekspor satu tabel untuk window [window_start, window_end) ke file Parquet
+    per tanggal: {EXPORT_PREFIX}/{table}/dt=YYYY-MM-DD/part-{window}.parquet.
+    Query harus terurut berdasarkan date_column.
+    Nama file deterministik per window, jadi run ulang menimpa file yang sama.
+    Returns {tanggal: jumlah baris}.
+    """
+    run_tag = f"{window_start:%Y%m%dT%H%M%S}-{window_end:%Y%m%dT%H%M%S}"
+    date_index = schema.get_field_index(date_column)
+    names = schema.names
+
+    counts = {}
+    output = writer = None
+    current_date = None
+    batch = []
+
+    def flush():
+        if batch:
+            columns = {name: [row[i] for row in batch] for i, name in enumerate(names)}
+            writer.write_table(pa.Table.from_pydict(columns, schema=schema))
+            batch.clear()
+
+    def close_file():
+        flush()
+        writer.close()
+        output.close()
+
+    try:
+        for row in stream_query(conn, f'export_{table}', query, (window_start, window_end)):
+            row_date = row[date_index].date()
+            if row_date != current_date:
+                if writer is not None:
+                    close_file()
+                current_date = row_date
+                key = f"{EXPORT_PREFIX}/{table}/dt={row_date}/part-{run_tag}.parquet"
+                output = S3MultipartWriter(s3_client, S3_BUCKET, key)
+                writer = pq.ParquetWriter(output, schema, compression='snappy')
+                counts[str(row_date)] = 0
+
+            batch.append(row)
+            counts[str(row_date)] += 1
+            if len(batch) >= EXPORT_BATCH_ROWS:
+                flush()
+
+        if writer is not None:
+            close_file()
+    except Exception:
+        # Jangan tinggalkan multipart upload setengah jadi
+        if output is not None:
+            output.abort()
+        raise
+
+    return counts
+
+@log.wrap_handler('status', 'window_start', 'window_end')
+@instrumentation.instrument_handler('export_parquet')
+def lambda_handler(event, context):
+    """
+    Ekspor incremental orders dan order_items ke Parquet (partisi dt=YYYY-MM-DD)
+    berdasarkan watermark created_at di job_watermarks.
+    Dipanggil terjadwal (EventBridge, misalnya rate(1 hour)).
+    """
+    conn = get_db_connection()
+    cur = conn.cursor()
+
+    try:
+        # Lock baris watermark: run yang tumpang tindih menunggu, tidak mengekspor ganda
+        window_start = get_watermark(cur)
+        if window_start is None:
+            conn.rollback()
+            return {'status': 'success', 'message': 'No orders to export'}
+
+        window_end = min(
+            datetime.now() - timedelta(minutes=EXPORT_LAG_MINUTES),
+            window_start + timedelta(days=EXPORT_MAX_DAYS)
+        )
+        if window_end <= window_start:
+            conn.rollback()
+            return {'status': 'success', 'message': 'Export is up to date', 'watermark': window_start.isoformat()}
+
+        orders = export_table(conn, 'orders', ORDERS_QUERY, ORDERS_SCHEMA, 'created_at', window_start, window_end)
+        items = export_table(conn, 'order_items', ORDER_ITEMS_QUERY, ORDER_ITEMS_SCHEMA,
+                             'order_created_at', window_start, window_end)
+
+        # Watermark maju hanya setelah semua file selesai di-upload
+        save_watermark(cur, window_end)
+        conn.commit()
+
+        log.set(orders=sum(orders.values()), order_items=sum(items.values()))
+        return {
+            'status': 'success',
+            'window_start': window_start.isoformat(),
+            'window_end': window_end.isoformat(),
+            'orders': orders,
+            'order_items': items
+        }
+
+    except Exception as e:
+        conn.rollback()
+        log.error('export parquet failed', error=str(e), exc_info=True)
+        return {'status': 'error', 'message': str(e)}
+    finally:
+        cur.close()
+        release_db_connection(conn)
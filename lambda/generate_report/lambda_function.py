@@ -1,116 +1,265 @@
 import json
 import os
-import boto3
-import psycopg2
+import db_pool
+from stock_shards import EFFECTIVE_STOCK_SQL
 from datetime import datetime, timedelta
-import pandas as pd
-from io import BytesIO
+from decimal import Decimal
+from openpyxl import Workbook
+from s3_stream import S3MultipartWriter
+import structured_log
+import instrumentation
+import aws_clients
 
-DB_HOST = os.environ.get('DB_HOST')
-DB_NAME = os.environ.get('DB_NAME')
-DB_USER = os.environ.get('DB_USER')
-DB_PASSWORD = os.environ.get('DB_PASSWORD')
 S3_BUCKET = os.environ.get('S3_BUCKET')
+# Baris yang diambil per round trip dari server-side cursor
+REPORT_FETCH_SIZE = int(os.environ.get('REPORT_FETCH_SIZE', 2000))
+# Sheet detail semua baris order hari itu (ukurannya mengikuti volume harian)
+REPORT_INCLUDE_ORDER_LINES = os.environ.get('REPORT_INCLUDE_ORDER_LINES', 'true').lower() == 'true'
 
-s3_client = boto3.client('s3')
+log = structured_log.get_logger('generate_report')
+
+s3_client = aws_clients.lazy('s3')
 
 def get_db_connection():
-    return psycopg2.connect(
-        host=DB_HOST,
-        database=DB_NAME,
-        user=DB_USER,
-        password=DB_PASSWORD
-    )
+    # Pinjam koneksi dari pool (dipakai ulang antar warm invocation)
+    return db_pool.get_connection()
+
+def release_db_connection(conn):
+    db_pool.release_connection(conn)
+
+def stream_query(conn, name, query, params=()):
+    """
+    Jalankan query dengan server-side cursor: baris diambil per
+    REPORT_FETCH_SIZE, tidak pernah seluruh result set sekaligus.
+    """
+    cur = conn.cursor(name=name)
+    cur.itersize = REPORT_FETCH_SIZE
+    try:
+        cur.execute(query, params)
+        for row in cur:
+            yield row
+    finally:
+        cur.close()
+
+def write_sheet(workbook, title, header, rows, keep=None):
+    """
+    Tulis baris ke sheet write-only satu per satu.
+    keep: simpan baris yang lolos predicate ini (untuk summary JSON); default tidak ada.
+    """
+    sheet = workbook.create_sheet(title)
+    sheet.append(header)
+    kept = []
+    for row in rows:
+        sheet.append(list(row))
+        if keep and keep(row):
+            kept.append(dict(zip(header, row)))
+    return kept
+
+def to_json_value(value):
+    if isinstance(value, Decimal):
+        return float(value)
+    return value
 
+def records(items):
+    return [{key: to_json_value(value) for key, value in item.items()} for item in items]
+
+def report_period(period, today):
+    """
+    Range tanggal half-open [start, end) untuk period report:
+    - daily: kemarin
+    - weekly: minggu lalu (Senin - Minggu)
+    - monthly: bulan lalu
+    """
+    if period == 'daily':
+        start = today - timedelta(days=1)
+        return start, today
+    if period == 'weekly':
+        end = today - timedelta(days=today.weekday())
+        return end - timedelta(days=7), end
+    if period == 'monthly':
+        end = today.replace(day=1)
+        return (end - timedelta(days=1)).replace(day=1), end
+    raise ValueError(f'Unknown period: {period}')
+
+def backfill_rollups(event):
+    """
+    Hitung ulang order_stats_daily dan product_sales_daily untuk
+    from_date s/d to_date (inklusif) dari tabel orders / order_items.
+    """
+    try:
+        from_date = datetime.strptime(event['from_date'], '%Y-%m-%d').date()
+        to_date = datetime.strptime(event['to_date'], '%Y-%m-%d').date()
+    except (KeyError, ValueError):
+        return {
+            'status': 'error',
+            'message': 'from_date and to_date (YYYY-MM-DD) are required'
+        }
+    
+    conn = get_db_connection()
+    cur = conn.cursor()
+    try:
+        cur.execute("SELECT rollup_backfill(%s, %s)", (from_date, to_date + timedelta(days=1)))
+        conn.commit()
+        return {
+            'status': 'success',
+            'message': 'Rollups backfilled',
+            'from_date': str(from_date),
+            'to_date': str(to_date)
+        }
+    except Exception as e:
+        conn.rollback()
+        log.error('rollup backfill failed', from_date=from_date, to_date=to_date, error=str(e), exc_info=True)
+        return {
+            'status': 'error',
+            'message': f'Rollup backfill failed: {str(e)}'
+        }
+    finally:
+        cur.close()
+        release_db_connection(conn)
+
+@log.wrap_handler('status', 'period', 'report_date', 'report_location', 'from_date', 'to_date')
+@instrumentation.instrument_handler('generate_report')
 def lambda_handler(event, context):
     """
-    Generate daily order report
+    Generate order report (default daily).
+    event: {"period": "daily" | "weekly" | "monthly"}
+    atau {"action": "backfill_rollups", "from_date": "YYYY-MM-DD", "to_date": "YYYY-MM-DD"}
     """
+    event = event or {}
+    if event.get('action') == 'backfill_rollups':
+        return backfill_rollups(event)
+    
+    conn = None
     try:
-        report_date = datetime.now().date()
-        start_date = report_date - timedelta(days=1)
+        period = event.get('period', 'daily')
+        start_date, end_date = report_period(period, datetime.now().date())
+        # Range half-open [start, end) di created_at supaya index orders(created_at) terpakai
+        period_start = datetime.combine(start_date, datetime.min.time())
+        period_end = datetime.combine(end_date, datetime.min.time())
         
         conn = get_db_connection()
         
-        # Daily orders summary
+        # Write-only workbook: baris langsung di-flush ke file sementara,
+        # bukan disimpan sebagai object cell di memory
+        workbook = Workbook(write_only=True)
+        
+        # Orders summary (dari rollup order_stats_daily + delta yang belum di-compact, bukan scan orders)
         query = """
             SELECT 
-                o.status,
-                COUNT(*) as order_count,
-                SUM(o.total_amount) as total_revenue
-            FROM orders o
-            WHERE DATE(o.order_date) = %s
-            GROUP BY o.status
+                s.status,
+                SUM(s.order_count) as order_count,
+                SUM(s.total_revenue) as total_revenue
+            FROM order_stats_daily_live s
+            WHERE s.stat_date >= %s
+            AND s.stat_date < %s
+            GROUP BY s.status
+            HAVING SUM(s.order_count) > 0
         """
         
-        df_summary = pd.read_sql_query(query, conn, params=(start_date,))
+        orders_by_status = write_sheet(
+            workbook, 'Daily Summary' if period == 'daily' else 'Summary',
+            ['status', 'order_count', 'total_revenue'],
+            stream_query(conn, 'report_summary', query, (start_date, end_date)),
+            keep=lambda row: True
+        )
         
-        # Top products
+        # Top products (dari rollup product_sales_daily + delta yang belum di-compact)
         query = """
             SELECT 
                 i.product_name,
-                SUM(oi.quantity) as total_quantity,
-                SUM(oi.quantity * oi.price) as total_revenue
-            FROM order_items oi
-            JOIN orders o ON oi.order_id = o.order_id
-            JOIN inventory i ON oi.product_id = i.product_id
-            WHERE DATE(o.order_date) = %s
+                SUM(p.total_quantity) as total_quantity,
+                SUM(p.total_revenue) as total_revenue
+            FROM product_sales_daily_live p
+            JOIN inventory i ON p.product_id = i.product_id
+            WHERE p.stat_date >= %s
+            AND p.stat_date < %s
             GROUP BY i.product_name
+            HAVING SUM(p.total_quantity) > 0
             ORDER BY total_revenue DESC
             LIMIT 10
         """
         
-        df_products = pd.read_sql_query(query, conn, params=(start_date,))
+        top_products = write_sheet(
+            workbook, 'Top Products',
+            ['product_name', 'total_quantity', 'total_revenue'],
+            stream_query(conn, 'report_top_products', query, (start_date, end_date)),
+            keep=lambda row: True
+        )
         
-        # Inventory status
-        query = """
+        # Inventory status (stok produk sharded = SUM shard, bukan inventory.stock_quantity)
+        query = f"""
             SELECT 
                 product_name,
                 stock_quantity,
+                reorder_point,
                 CASE 
-                    WHEN stock_quantity < 10 THEN 'Critical'
-                    WHEN stock_quantity < 50 THEN 'Low'
+                    WHEN stock_quantity <= reorder_point THEN 'Critical'
+                    WHEN stock_quantity <= reorder_point * 5 THEN 'Low'
                     ELSE 'Normal'
                 END as stock_status
-            FROM inventory
+            FROM (
+                SELECT i.product_name, {EFFECTIVE_STOCK_SQL} AS stock_quantity, i.reorder_point
+                FROM inventory i
+            ) stock
             ORDER BY stock_quantity ASC
             LIMIT 20
         """
         
-        df_inventory = pd.read_sql_query(query, conn)
+        low_stock_items = write_sheet(
+            workbook, 'Inventory Status',
+            ['product_name', 'stock_quantity', 'reorder_point', 'stock_status'],
+            stream_query(conn, 'report_inventory', query),
+            keep=lambda row: row[3] != 'Normal'
+        )
         
-        conn.close()
+        # Order lines: satu-satunya sheet yang membaca tabel mentah, hanya untuk report harian
+        if REPORT_INCLUDE_ORDER_LINES and period == 'daily':
+            query = """
+                SELECT 
+                    o.order_id,
+                    o.created_at,
+                    o.customer_id,
+                    o.status,
+                    oi.product_id,
+                    oi.quantity,
+                    oi.price
+                FROM orders o
+                JOIN order_items oi ON oi.order_id = o.order_id
+                WHERE o.created_at >= %s
+                AND o.created_at < %s
+                ORDER BY o.created_at, o.order_id
+            """
+            write_sheet(
+                workbook, 'Order Lines',
+                ['order_id', 'created_at', 'customer_id', 'status', 'product_id', 'quantity', 'price'],
+                stream_query(conn, 'report_order_lines', query, (period_start, period_end))
+            )
         
-        # Create Excel report
-        output = BytesIO()
-        with pd.ExcelWriter(output, engine='openpyxl') as writer:
-            df_summary.to_excel(writer, sheet_name='Daily Summary', index=False)
-            df_products.to_excel(writer, sheet_name='Top Products', index=False)
-            df_inventory.to_excel(writer, sheet_name='Inventory Status', index=False)
+        release_db_connection(conn)
+        conn = None
         
-        output.seek(0)
-        
-        # Upload to S3
-        report_key = f"reports/daily-report-{start_date}.xlsx"
-        s3_client.put_object(
-            Bucket=S3_BUCKET,
-            Key=report_key,
-            Body=output.getvalue(),
-            ContentType='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-        )
+        # Upload to S3 (multipart, per part; file tidak pernah utuh di memory)
+        report_key = f"reports/{period}-report-{start_date}.xlsx"
+        with S3MultipartWriter(
+            s3_client, S3_BUCKET, report_key,
+            content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+        ) as output:
+            workbook.save(output)
         
         # Create JSON summary
         summary = {
             'report_date': str(start_date),
-            'total_orders': int(df_summary['order_count'].sum()),
-            'total_revenue': float(df_summary['total_revenue'].sum()),
-            'orders_by_status': df_summary.to_dict('records'),
-            'top_products': df_products.head(5).to_dict('records'),
-            'low_stock_items': df_inventory[df_inventory['stock_status'] != 'Normal'].to_dict('records')
+            'period': period,
+            'period_end': str(end_date),
+            'total_orders': int(sum(item['order_count'] for item in orders_by_status)),
+            'total_revenue': float(sum(item['total_revenue'] or 0 for item in orders_by_status)),
+            'orders_by_status': records(orders_by_status),
+            'top_products': records(top_products[:5]),
+            'low_stock_items': records(low_stock_items)
         }
         
         # Save JSON summary
-        summary_key = f"reports/daily-summary-{start_date}.json"
+        summary_key = f"reports/{period}-summary-{start_date}.json"
         s3_client.put_object(
             Bucket=S3_BUCKET,
             Key=summary_key,
@@ -122,13 +271,17 @@ def lambda_handler(event, context):
             'status': 'success',
             'message': 'Report generated successfully',
             'report_date': str(start_date),
+            'period': period,
             'report_location': f"s3://{S3_BUCKET}/{report_key}",
             'summary': summary
         }
         
     except Exception as e:
-        print(f"Error generating report: {str(e)}")
+        log.error('generate report failed', error=str(e), exc_info=True)
         return {
             'status': 'error',
             'message': f'Report generation failed: {str(e)}'
-        }
\ No newline at end of file
+        }
+    finally:
+        if conn is not None:
+            release_db_connection(conn)
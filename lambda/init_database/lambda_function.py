@@ -38,6 +38,16 @@ def lambda_handler(event, context):
         if drop_existing:
             print("⚠️ Dropping existing tables")
             cur.execute("""
+                DROP TABLE IF EXISTS order_outbox CASCADE;
+                DROP TABLE IF EXISTS inventory_stock_shards CASCADE;
+                DROP TABLE IF EXISTS low_stock_alerts CASCADE;
+                DROP TABLE IF EXISTS low_stock_reported CASCADE;
+                DROP TABLE IF EXISTS job_watermarks CASCADE;
+                DROP TABLE IF EXISTS catalog_versions CASCADE;
+                DROP TABLE IF EXISTS order_stats_daily CASCADE;
+                DROP TABLE IF EXISTS order_stats_daily_delta CASCADE;
+                DROP TABLE IF EXISTS product_sales_daily CASCADE;
+                DROP TABLE IF EXISTS product_sales_daily_delta CASCADE;
                 DROP TABLE IF EXISTS order_items CASCADE;
                 DROP TABLE IF EXISTS orders CASCADE;
                 DROP TABLE IF EXISTS inventory CASCADE;
@@ -105,6 +115,83 @@ def lambda_handler(event, context):
             );
         """)
 
+        # Transactional outbox: workflow launch yang ditulis create_order
+        # di transaksi yang sama dengan order, dijalankan oleh dispatch_outbox
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS order_outbox (
+                id BIGSERIAL PRIMARY KEY,
+                order_id VARCHAR(50) NOT NULL UNIQUE,
+                payload JSONB NOT NULL,
+                status VARCHAR(20) NOT NULL DEFAULT 'pending',
+                attempts INTEGER NOT NULL DEFAULT 0,
+                last_error TEXT,
+                next_attempt_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                dispatched_at TIMESTAMP,
+                FOREIGN KEY (order_id)
+                    REFERENCES orders(order_id)
+                    ON DELETE CASCADE
+            );
+        """)
+
+        # Dispatcher tidak lagi punya status terminal: baris 'failed' dari versi
+        # sebelumnya dikembalikan ke antrian supaya order-nya tetap mendapat workflow
+        cur.execute("""
+            UPDATE order_outbox
+            SET status = 'pending', next_attempt_at = CURRENT_TIMESTAMP
+            WHERE status = 'failed';
+        """)
+
+        # Sharded stock counter untuk produk flash-sale (inventory.stock_shards > 0),
+        # dikelola lewat layer stock_shards dan lambda rebalance_shards
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS inventory_stock_shards (
+                product_id VARCHAR(50) NOT NULL,
+                shard_no SMALLINT NOT NULL,
+                stock_quantity INTEGER NOT NULL DEFAULT 0 CHECK (stock_quantity >= 0),
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                PRIMARY KEY (product_id, shard_no),
+                FOREIGN KEY (product_id)
+                    REFERENCES inventory(product_id)
+                    ON DELETE CASCADE
+            );
+        """)
+
+        # Alert LowStock terakhir per produk (dedup lintas invocation update_inventory)
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS low_stock_alerts (
+                product_id VARCHAR(50) PRIMARY KEY,
+                last_sent_at TIMESTAMP NOT NULL
+            );
+        """)
+
+        # Produk low-stock yang sudah dilaporkan detects_lowstock (dihapus saat restock)
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS low_stock_reported (
+                product_id VARCHAR(50) PRIMARY KEY,
+                reported_at TIMESTAMP NOT NULL
+            );
+        """)
+
+        # Versi catalog untuk cache order_management: dinaikkan trigger
+        # statement-level saat baris catalog ditambah / dihapus
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS catalog_versions (
+                table_name VARCHAR(100) PRIMARY KEY,
+                version BIGINT NOT NULL DEFAULT 0,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            );
+        """)
+
+        # Watermark job terjadwal (updated_at / created_at terakhir yang sudah diproses)
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS job_watermarks (
+                job_name VARCHAR(100) PRIMARY KEY,
+                watermark TIMESTAMP NOT NULL,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            );
+        """)
+
         conn.commit()
         print("✅ Base tables ready")
 
@@ -241,6 +328,66 @@ def lambda_handler(event, context):
                     ALTER TABLE orders ADD COLUMN transaction_id VARCHAR(100);
                 END IF;
             END $$;
+            """,
+
+            # orders.execution_arn (GET /status/{id} tanpa list_executions)
+            """
+            DO $$
+            BEGIN
+                IF NOT EXISTS (
+                    SELECT 1 FROM information_schema.columns
+                    WHERE table_name='orders'
+                    AND column_name='execution_arn'
+                ) THEN
+                    ALTER TABLE orders ADD COLUMN execution_arn VARCHAR(256);
+                END IF;
+            END $$;
+            """,
+
+            # orders.archived_at (NULL = arsip S3 belum ada, diproses reconcile_archives).
+            # Order lama dianggap sudah diarsip oleh create_order versi sebelumnya.
+            """
+            DO $$
+            BEGIN
+                IF NOT EXISTS (
+                    SELECT 1 FROM information_schema.columns
+                    WHERE table_name='orders'
+                    AND column_name='archived_at'
+                ) THEN
+                    ALTER TABLE orders ADD COLUMN archived_at TIMESTAMP;
+                    UPDATE orders SET archived_at = created_at;
+                END IF;
+            END $$;
+            """,
+
+            # inventory.reorder_point (threshold low-stock per produk, default sama dengan nilai lama)
+            """
+            DO $$
+            BEGIN
+                IF NOT EXISTS (
+                    SELECT 1 FROM information_schema.columns
+                    WHERE table_name='inventory'
+                    AND column_name='reorder_point'
+                ) THEN
+                    ALTER TABLE inventory ADD COLUMN reorder_point INTEGER NOT NULL DEFAULT 10
+                        CHECK (reorder_point >= 0);
+                END IF;
+            END $$;
+            """,
+
+            # inventory.stock_shards (0 = satu counter di stock_quantity,
+            # N = stok tersebar di N baris inventory_stock_shards)
+            """
+            DO $$
+            BEGIN
+                IF NOT EXISTS (
+                    SELECT 1 FROM information_schema.columns
+                    WHERE table_name='inventory'
+                    AND column_name='stock_shards'
+                ) THEN
+                    ALTER TABLE inventory ADD COLUMN stock_shards SMALLINT NOT NULL DEFAULT 0;
+                END IF;
+            END $$;
             """
         ]
 
@@ -299,6 +446,133 @@ def lambda_handler(event, context):
                     ON customers(email);
                 END IF;
             END $$;
+            """,
+
+            # Versi catalog cache: MAX(updated_at) di order_management
+            """
+            DO $$
+            BEGIN
+                IF NOT EXISTS (
+                    SELECT 1 FROM pg_indexes
+                    WHERE tablename='inventory'
+                    AND indexname='idx_inventory_updated_at'
+                ) THEN
+                    CREATE INDEX idx_inventory_updated_at
+                    ON inventory(updated_at);
+                END IF;
+            END $$;
+            """,
+
+            # Partial index: hanya produk yang sudah mencapai reorder_point-nya,
+            # dipakai detects_lowstock (menggantikan idx_inventory_low_stock yang threshold-nya tetap)
+            """
+            DROP INDEX IF EXISTS idx_inventory_low_stock;
+            """,
+
+            """
+            DO $$
+            BEGIN
+                IF NOT EXISTS (
+                    SELECT 1 FROM pg_indexes
+                    WHERE tablename='inventory'
+                    AND indexname='idx_inventory_below_reorder'
+                ) THEN
+                    CREATE INDEX idx_inventory_below_reorder
+                    ON inventory(updated_at)
+                    WHERE stock_quantity <= reorder_point;
+                END IF;
+            END $$;
+            """,
+
+            """
+            DO $$
+            BEGIN
+                IF NOT EXISTS (
+                    SELECT 1 FROM pg_indexes
+                    WHERE tablename='customers'
+                    AND indexname='idx_customers_updated_at'
+                ) THEN
+                    CREATE INDEX idx_customers_updated_at
+                    ON customers(updated_at);
+                END IF;
+            END $$;
+            """,
+
+            """
+            DO $$
+            BEGIN
+                IF NOT EXISTS (
+                    SELECT 1 FROM pg_indexes
+                    WHERE tablename='inventory_stock_shards'
+                    AND indexname='idx_inventory_stock_shards_updated_at'
+                ) THEN
+                    CREATE INDEX idx_inventory_stock_shards_updated_at
+                    ON inventory_stock_shards(updated_at);
+                END IF;
+            END $$;
+            """,
+
+            # Order yang arsip S3-nya belum ada (reconcile_archives)
+            """
+            DO $$
+            BEGIN
+                IF NOT EXISTS (
+                    SELECT 1 FROM pg_indexes
+                    WHERE tablename='orders'
+                    AND indexname='idx_orders_unarchived'
+                ) THEN
+                    CREATE INDEX idx_orders_unarchived
+                    ON orders(created_at)
+                    WHERE archived_at IS NULL;
+                END IF;
+            END $$;
+            """,
+
+            # Baris outbox yang menunggu di-dispatch
+            """
+            DO $$
+            BEGIN
+                IF NOT EXISTS (
+                    SELECT 1 FROM pg_indexes
+                    WHERE tablename='order_outbox'
+                    AND indexname='idx_order_outbox_pending'
+                ) THEN
+                    CREATE INDEX idx_order_outbox_pending
+                    ON order_outbox(next_attempt_at)
+                    WHERE status = 'pending';
+                END IF;
+            END $$;
+            """,
+
+            # Keyset pagination GET /orders: ORDER BY created_at DESC, order_id DESC.
+            # Kolom depan created_at juga melayani range created_at >= .. AND < .. di generate_report
+            """
+            DO $$
+            BEGIN
+                IF NOT EXISTS (
+                    SELECT 1 FROM pg_indexes
+                    WHERE tablename='orders'
+                    AND indexname='idx_orders_created_at_order_id'
+                ) THEN
+                    CREATE INDEX idx_orders_created_at_order_id
+                    ON orders(created_at DESC, order_id DESC);
+                END IF;
+            END $$;
+            """,
+
+            # Join orders -> order_items (generate_report, get_order, update_inventory)
+            """
+            DO $$
+            BEGIN
+                IF NOT EXISTS (
+                    SELECT 1 FROM pg_indexes
+                    WHERE tablename='order_items'
+                    AND indexname='idx_order_items_order_id'
+                ) THEN
+                    CREATE INDEX idx_order_items_order_id
+                    ON order_items(order_id);
+                END IF;
+            END $$;
             """
         ]
 
@@ -311,6 +585,54 @@ def lambda_handler(event, context):
                 conn.rollback()
                 print(f"⚠️ INDEX skipped ({idx + 1}): {e}")
 
+        # =====================================================
+        # SUMMARY TABLES (GET /stats, generate_report)
+        # =====================================================
+        print("📊 Creating summary tables")
+
+        create_rollup_tables(cur, conn)
+
+        # =====================================================
+        # CATALOG VERSION TRIGGERS (cache /products, /customers)
+        # =====================================================
+        print("🔁 Creating catalog version triggers")
+
+        create_catalog_version_triggers(cur, conn)
+
+        # =====================================================
+        # LOW STOCK REPORTED (detects_lowstock)
+        # =====================================================
+        print("📉 Creating low stock restock triggers")
+
+        create_low_stock_triggers(cur, conn)
+
+        # =====================================================
+        # SCHEMA VERSION
+        # =====================================================
+        # Lambda lain meng-cache hasil probe information_schema
+        # (schema_cache di layer). Menaikkan versi di sini membuat
+        # cache tersebut di-reload setelah migrasi.
+        print("🔖 Bumping schema version")
+
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS schema_meta (
+                id INTEGER PRIMARY KEY CHECK (id = 1),
+                schema_version INTEGER NOT NULL DEFAULT 1,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            );
+        """)
+        cur.execute("""
+            INSERT INTO schema_meta (id, schema_version)
+            VALUES (1, 1)
+            ON CONFLICT (id) DO UPDATE
+            SET schema_version = schema_meta.schema_version + 1,
+                updated_at = CURRENT_TIMESTAMP
+            RETURNING schema_version;
+        """)
+        schema_version = cur.fetchone()[0]
+        conn.commit()
+        print(f"✅ Schema version: {schema_version}")
+
         # =====================================================
         # SAMPLE DATA
         # =====================================================
@@ -337,6 +659,7 @@ def lambda_handler(event, context):
                 "message": "Database initialized successfully",
                 "sample_data": insert_sample_data,
                 "dropped_existing": drop_existing,
+                "schema_version": schema_version,
                 "timestamp": datetime.utcnow().isoformat()
             })
         }
@@ -359,6 +682,391 @@ def lambda_handler(event, context):
         conn.close()
 
 
+# =====================================================
+# CATALOG VERSION
+# =====================================================
+CATALOG_TABLES = ('customers', 'inventory', 'inventory_stock_shards')
+
+
+def create_catalog_version_triggers(cur, conn):
+    """
+    catalog_versions dinaikkan sekali per statement INSERT / DELETE / TRUNCATE
+    di tabel catalog. Perubahan baris biasa sudah terlihat dari MAX(updated_at)
+    (terindex); versi ini menangkap baris yang hilang atau baris baru yang
+    updated_at-nya lebih tua dari MAX, tanpa COUNT(*) di sisi pembaca.
+    """
+    cur.execute("""
+        CREATE OR REPLACE FUNCTION catalog_version_bump() RETURNS trigger AS $$
+        BEGIN
+            INSERT INTO catalog_versions (table_name, version, updated_at)
+            VALUES (TG_TABLE_NAME, 1, CURRENT_TIMESTAMP)
+            ON CONFLICT (table_name) DO UPDATE
+            SET version = catalog_versions.version + 1,
+                updated_at = EXCLUDED.updated_at;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+    """)
+
+    for table_name in CATALOG_TABLES:
+        cur.execute(f"""
+            DO $$
+            BEGIN
+                IF NOT EXISTS (
+                    SELECT 1 FROM pg_trigger
+                    WHERE tgname = 'trg_{table_name}_catalog_version'
+                ) THEN
+                    CREATE TRIGGER trg_{table_name}_catalog_version
+                    AFTER INSERT OR DELETE OR TRUNCATE
+                    ON {table_name}
+                    FOR EACH STATEMENT EXECUTE FUNCTION catalog_version_bump();
+                END IF;
+            END $$;
+        """)
+
+    cur.execute("""
+        INSERT INTO catalog_versions (table_name)
+        SELECT unnest(%s::varchar[])
+        ON CONFLICT (table_name) DO NOTHING
+    """, (list(CATALOG_TABLES),))
+
+    conn.commit()
+    print("✅ Catalog version triggers ready")
+
+
+# =====================================================
+# LOW STOCK REPORTED
+# =====================================================
+def create_low_stock_triggers(cur, conn):
+    """
+    Marker low_stock_reported dihapus saat stok produk naik (restock) sampai
+    di atas reorder_point-nya. detects_lowstock hanya melihat stok saat run,
+    jadi tanpa ini produk yang direstock lalu turun lagi sebelum run berikutnya
+    tidak pernah dilaporkan ulang.
+    Trigger hanya jalan untuk UPDATE yang menaikkan stok; decrement order
+    (update_inventory, stock_shards.decrement) tidak menyentuhnya.
+    Produk sharded dicek dari SUM shard, jadi rebalance (total tetap) tidak
+    menghapus marker produk yang masih low.
+    """
+    cur.execute("""
+        CREATE OR REPLACE FUNCTION low_stock_reported_clear() RETURNS trigger AS $$
+        BEGIN
+            DELETE FROM low_stock_reported r
+            USING inventory i
+            WHERE r.product_id = NEW.product_id
+            AND i.product_id = NEW.product_id
+            AND CASE WHEN i.stock_shards > 0 THEN (
+                    SELECT COALESCE(SUM(s.stock_quantity), 0)
+                    FROM inventory_stock_shards s
+                    WHERE s.product_id = i.product_id
+                ) ELSE i.stock_quantity END > i.reorder_point;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+    """)
+
+    for table_name in ('inventory', 'inventory_stock_shards'):
+        cur.execute(f"""
+            DO $$
+            BEGIN
+                IF NOT EXISTS (
+                    SELECT 1 FROM pg_trigger
+                    WHERE tgname = 'trg_{table_name}_low_stock_restock'
+                ) THEN
+                    CREATE TRIGGER trg_{table_name}_low_stock_restock
+                    AFTER UPDATE OF stock_quantity ON {table_name}
+                    FOR EACH ROW
+                    WHEN (NEW.stock_quantity > OLD.stock_quantity)
+                    EXECUTE FUNCTION low_stock_reported_clear();
+                END IF;
+            END $$;
+        """)
+
+    conn.commit()
+    print("✅ Low stock restock triggers ready")
+
+
+# =====================================================
+# SUMMARY TABLES
+# =====================================================
+def create_rollup_tables(cur, conn):
+    """
+    Rollup harian yang di-maintain incremental oleh trigger:
+    - order_stats_daily: jumlah order & revenue per (tanggal order, status).
+      Ikut berubah saat status order berubah (update_order, update_inventory, dll).
+      Trigger hanya menulis baris delta append-only ke order_stats_daily_delta,
+      jadi INSERT / UPDATE orders tidak pernah mengunci baris summary bersama
+      (semua order hari ini berstatus 'pending' akan antri di satu baris).
+      rollup_compact() (lambda compact_rollups, terjadwal) melipat delta ke
+      summary; pembaca memakai view order_stats_daily_live = summary + delta.
+    - product_sales_daily: quantity & revenue per (tanggal order, produk),
+      dari order_items. Sama seperti order_stats_daily, trigger hanya menulis
+      ke product_sales_daily_delta (order untuk SKU yang sama tidak antri
+      di satu baris rollup, dan tidak ada urutan lock antar produk yang bisa
+      deadlock); pembaca memakai view product_sales_daily_live.
+    rollup_backfill(from, to) menghitung ulang range tanggal [from, to) dari
+    tabel mentah; dipakai saat tabel baru dibuat dan oleh generate_report
+    (action backfill_rollups).
+    """
+    cur.execute("""
+        SELECT table_name FROM information_schema.tables
+        WHERE table_name IN ('order_stats_daily', 'product_sales_daily')
+    """)
+    is_new = len(cur.fetchall()) < 2
+
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS order_stats_daily (
+            stat_date DATE NOT NULL,
+            status VARCHAR(50) NOT NULL,
+            order_count BIGINT NOT NULL DEFAULT 0,
+            total_revenue DECIMAL(14,2) NOT NULL DEFAULT 0,
+            PRIMARY KEY (stat_date, status)
+        );
+    """)
+
+    # Append-only, tanpa index: insert dari trigger tidak pernah konflik
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS order_stats_daily_delta (
+            stat_date DATE NOT NULL,
+            status VARCHAR(50) NOT NULL,
+            order_count BIGINT NOT NULL,
+            total_revenue DECIMAL(14,2) NOT NULL
+        );
+    """)
+
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS product_sales_daily (
+            stat_date DATE NOT NULL,
+            product_id VARCHAR(50) NOT NULL,
+            order_count BIGINT NOT NULL DEFAULT 0,
+            total_quantity BIGINT NOT NULL DEFAULT 0,
+            total_revenue DECIMAL(14,2) NOT NULL DEFAULT 0,
+            PRIMARY KEY (stat_date, product_id)
+        );
+    """)
+
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS product_sales_daily_delta (
+            stat_date DATE NOT NULL,
+            product_id VARCHAR(50) NOT NULL,
+            order_count BIGINT NOT NULL,
+            total_quantity BIGINT NOT NULL,
+            total_revenue DECIMAL(14,2) NOT NULL
+        );
+    """)
+
+    cur.execute("""
+        CREATE OR REPLACE FUNCTION order_stats_daily_apply() RETURNS trigger AS $$
+        BEGIN
+            IF TG_OP = 'UPDATE'
+                AND NEW.status IS NOT DISTINCT FROM OLD.status
+                AND NEW.total_amount = OLD.total_amount
+                AND NEW.created_at IS NOT DISTINCT FROM OLD.created_at THEN
+                RETURN NULL;
+            END IF;
+
+            IF TG_OP IN ('UPDATE', 'DELETE') THEN
+                INSERT INTO order_stats_daily_delta (stat_date, status, order_count, total_revenue)
+                VALUES (OLD.created_at::date, COALESCE(OLD.status, 'unknown'), -1, -OLD.total_amount);
+            END IF;
+
+            IF TG_OP IN ('INSERT', 'UPDATE') THEN
+                INSERT INTO order_stats_daily_delta (stat_date, status, order_count, total_revenue)
+                VALUES (NEW.created_at::date, COALESCE(NEW.status, 'unknown'), 1, NEW.total_amount);
+            END IF;
+
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+    """)
+
+    # Tanggal rollup produk mengikuti orders.created_at. Saat order dihapus,
+    # order_items ikut terhapus (CASCADE) setelah baris orders hilang, jadi
+    # pengurangannya dilakukan di BEFORE DELETE orders dan trigger order_items
+    # melewati item yang order-nya sudah tidak ada.
+    cur.execute("""
+        CREATE OR REPLACE FUNCTION product_sales_daily_apply() RETURNS trigger AS $$
+        DECLARE
+            order_date DATE;
+        BEGIN
+            IF TG_OP IN ('UPDATE', 'DELETE') THEN
+                SELECT created_at::date INTO order_date FROM orders WHERE order_id = OLD.order_id;
+                IF order_date IS NOT NULL THEN
+                    INSERT INTO product_sales_daily_delta (stat_date, product_id, order_count, total_quantity, total_revenue)
+                    VALUES (order_date, OLD.product_id, -1, -OLD.quantity, -(OLD.quantity * OLD.price));
+                END IF;
+            END IF;
+
+            IF TG_OP IN ('INSERT', 'UPDATE') THEN
+                SELECT created_at::date INTO order_date FROM orders WHERE order_id = NEW.order_id;
+                INSERT INTO product_sales_daily_delta (stat_date, product_id, order_count, total_quantity, total_revenue)
+                VALUES (order_date, NEW.product_id, 1, NEW.quantity, NEW.quantity * NEW.price);
+            END IF;
+
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+    """)
+
+    cur.execute("""
+        CREATE OR REPLACE FUNCTION product_sales_daily_order_delete() RETURNS trigger AS $$
+        BEGIN
+            INSERT INTO product_sales_daily_delta (stat_date, product_id, order_count, total_quantity, total_revenue)
+            SELECT OLD.created_at::date, product_id, -COUNT(*), -SUM(quantity), -SUM(quantity * price)
+            FROM order_items
+            WHERE order_id = OLD.order_id
+            GROUP BY product_id;
+            RETURN OLD;
+        END;
+        $$ LANGUAGE plpgsql;
+    """)
+
+    cur.execute("""
+        CREATE OR REPLACE VIEW order_stats_daily_live AS
+        SELECT stat_date, status, SUM(order_count)::bigint AS order_count, SUM(total_revenue) AS total_revenue
+        FROM (
+            SELECT stat_date, status, order_count, total_revenue FROM order_stats_daily
+            UNION ALL
+            SELECT stat_date, status, order_count, total_revenue FROM order_stats_daily_delta
+        ) s
+        GROUP BY stat_date, status;
+    """)
+
+    cur.execute("""
+        CREATE OR REPLACE VIEW product_sales_daily_live AS
+        SELECT stat_date, product_id,
+               SUM(order_count)::bigint AS order_count,
+               SUM(total_quantity)::bigint AS total_quantity,
+               SUM(total_revenue) AS total_revenue
+        FROM (
+            SELECT stat_date, product_id, order_count, total_quantity, total_revenue FROM product_sales_daily
+            UNION ALL
+            SELECT stat_date, product_id, order_count, total_quantity, total_revenue FROM product_sales_daily_delta
+        ) s
+        GROUP BY stat_date, product_id;
+    """)
+
+    # Lipat delta ke summary. Hanya delta yang sudah commit yang terhapus,
+    # delta transaksi yang masih jalan menunggu compaction berikutnya.
+    # SHARE ROW EXCLUSIVE di summary: compaction & backfill tidak jalan
+    # bersamaan, trigger (yang hanya menulis delta) tidak ikut terblokir.
+    cur.execute("""
+        CREATE OR REPLACE FUNCTION rollup_compact() RETURNS bigint AS $$
+        DECLARE
+            compacted BIGINT;
+            moved_rows BIGINT;
+        BEGIN
+            LOCK TABLE order_stats_daily, product_sales_daily IN SHARE ROW EXCLUSIVE MODE;
+
+            WITH moved AS (
+                DELETE FROM order_stats_daily_delta
+                RETURNING stat_date, status, order_count, total_revenue
+            )
+            INSERT INTO order_stats_daily (stat_date, status, order_count, total_revenue)
+            SELECT stat_date, status, SUM(order_count), SUM(total_revenue)
+            FROM moved
+            GROUP BY stat_date, status
+            ON CONFLICT (stat_date, status) DO UPDATE
+            SET order_count = order_stats_daily.order_count + EXCLUDED.order_count,
+                total_revenue = order_stats_daily.total_revenue + EXCLUDED.total_revenue;
+            GET DIAGNOSTICS compacted = ROW_COUNT;
+
+            WITH moved AS (
+                DELETE FROM product_sales_daily_delta
+                RETURNING stat_date, product_id, order_count, total_quantity, total_revenue
+            )
+            INSERT INTO product_sales_daily (stat_date, product_id, order_count, total_quantity, total_revenue)
+            SELECT stat_date, product_id, SUM(order_count), SUM(total_quantity), SUM(total_revenue)
+            FROM moved
+            GROUP BY stat_date, product_id
+            ON CONFLICT (stat_date, product_id) DO UPDATE
+            SET order_count = product_sales_daily.order_count + EXCLUDED.order_count,
+                total_quantity = product_sales_daily.total_quantity + EXCLUDED.total_quantity,
+                total_revenue = product_sales_daily.total_revenue + EXCLUDED.total_revenue;
+            GET DIAGNOSTICS moved_rows = ROW_COUNT;
+
+            RETURN compacted + moved_rows;
+        END;
+        $$ LANGUAGE plpgsql;
+    """)
+
+    # Backfill range [p_from, p_to): hitung ulang dari orders / order_items.
+    # Lock SHARE memblokir penulisan order selama backfill supaya trigger
+    # tidak ikut menambah ke range yang sedang dihitung ulang.
+    cur.execute("""
+        CREATE OR REPLACE FUNCTION rollup_backfill(p_from DATE, p_to DATE) RETURNS void AS $$
+        BEGIN
+            LOCK TABLE orders, order_items IN SHARE MODE;
+            LOCK TABLE order_stats_daily, product_sales_daily IN SHARE ROW EXCLUSIVE MODE;
+
+            DELETE FROM order_stats_daily_delta WHERE stat_date >= p_from AND stat_date < p_to;
+            DELETE FROM order_stats_daily WHERE stat_date >= p_from AND stat_date < p_to;
+            INSERT INTO order_stats_daily (stat_date, status, order_count, total_revenue)
+            SELECT created_at::date, COALESCE(status, 'unknown'), COUNT(*), SUM(total_amount)
+            FROM orders
+            WHERE created_at >= p_from AND created_at < p_to
+            GROUP BY 1, 2;
+
+            DELETE FROM product_sales_daily_delta WHERE stat_date >= p_from AND stat_date < p_to;
+            DELETE FROM product_sales_daily WHERE stat_date >= p_from AND stat_date < p_to;
+            INSERT INTO product_sales_daily (stat_date, product_id, order_count, total_quantity, total_revenue)
+            SELECT o.created_at::date, oi.product_id, COUNT(*), SUM(oi.quantity), SUM(oi.quantity * oi.price)
+            FROM orders o
+            JOIN order_items oi ON oi.order_id = o.order_id
+            WHERE o.created_at >= p_from AND o.created_at < p_to
+            GROUP BY 1, 2;
+        END;
+        $$ LANGUAGE plpgsql;
+    """)
+
+    cur.execute("""
+        DO $$
+        BEGIN
+            IF NOT EXISTS (
+                SELECT 1 FROM pg_trigger
+                WHERE tgname = 'trg_order_stats_daily'
+            ) THEN
+                CREATE TRIGGER trg_order_stats_daily
+                AFTER INSERT OR DELETE OR UPDATE OF status, total_amount, created_at
+                ON orders
+                FOR EACH ROW EXECUTE FUNCTION order_stats_daily_apply();
+            END IF;
+
+            IF NOT EXISTS (
+                SELECT 1 FROM pg_trigger
+                WHERE tgname = 'trg_product_sales_daily'
+            ) THEN
+                CREATE TRIGGER trg_product_sales_daily
+                AFTER INSERT OR DELETE OR UPDATE OF product_id, quantity, price, order_id
+                ON order_items
+                FOR EACH ROW EXECUTE FUNCTION product_sales_daily_apply();
+            END IF;
+
+            IF NOT EXISTS (
+                SELECT 1 FROM pg_trigger
+                WHERE tgname = 'trg_product_sales_daily_order_delete'
+            ) THEN
+                CREATE TRIGGER trg_product_sales_daily_order_delete
+                BEFORE DELETE
+                ON orders
+                FOR EACH ROW EXECUTE FUNCTION product_sales_daily_order_delete();
+            END IF;
+        END $$;
+    """)
+
+    if is_new:
+        # Tabel rollup baru: hitung dari seluruh histori order
+        cur.execute("""
+            SELECT rollup_backfill(MIN(created_at)::date, MAX(created_at)::date + 1)
+            FROM orders
+            HAVING COUNT(*) > 0
+        """)
+        print("✅ Rollup tables backfilled")
+
+    conn.commit()
+    print("✅ Summary tables ready")
+
+
 # =====================================================
 # SAMPLE DATA
 # =====================================================
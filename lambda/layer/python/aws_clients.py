@@ -0,0 +1,43 @@
+import threading
+import instrumentation
+
+# Client boto3 per service, dibuat saat pertama kali dipakai lalu dipakai ulang
+# antar warm invocation. boto3 sendiri juga baru di-import saat itu, jadi route
+# yang tidak memanggil AWS (misalnya GET /customers) tidak membayar biayanya.
+_clients = {}
+_lock = threading.Lock()
+
+
+def get(service):
+    client = _clients.get(service)
+    if client is None:
+        with _lock:
+            client = _clients.get(service)
+            if client is None:
+                import boto3
+                client = instrumentation.instrument_client(boto3.client(service))
+                _clients[service] = client
+    return client
+
+
+class LazyClient:
+    """
+    Pengganti client module-level:
+
+        s3_client = aws_clients.lazy('s3')
+        s3_client.put_object(...)   # client dibuat di sini
+
+    Semua atribut (put_object, exceptions, meta, ...) diteruskan ke client asli.
+    """
+
+    __slots__ = ('_service',)
+
+    def __init__(self, service):
+        self._service = service
+
+    def __getattr__(self, name):
+        return getattr(get(self._service), name)
+
+
+def lazy(service):
+    return LazyClient(service)
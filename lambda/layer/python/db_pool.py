@@ -0,0 +1,175 @@
+import os
+import time
+import threading
+import psycopg2
+from psycopg2 import pool, extensions
+import structured_log
+import instrumentation
+
+log = structured_log.get_logger('db_pool')
+
+# ==============================
+# ENV VARIABLES
+# ==============================
+DB_HOST = os.environ.get('DB_HOST')
+DB_NAME = os.environ.get('DB_NAME')
+DB_USER = os.environ.get('DB_USER')
+DB_PASSWORD = os.environ.get('DB_PASSWORD')
+
+# Satu container Lambda hanya melayani satu request pada satu waktu, jadi
+# pool kecil sudah cukup. Total koneksi ke RDS = concurrency x DB_POOL_MAX,
+# jadi nilai ini yang menjaga budget max_connections.
+DB_POOL_MIN = int(os.environ.get('DB_POOL_MIN', 1))
+DB_POOL_MAX = int(os.environ.get('DB_POOL_MAX', 2))
+DB_CONNECT_TIMEOUT = int(os.environ.get('DB_CONNECT_TIMEOUT', 5))
+
+# Koneksi yang idle lebih lama dari ini di-ping dulu sebelum dipakai
+# (container bisa di-freeze lama, RDS / NAT bisa memutus koneksi idle)
+DB_POOL_PING_AFTER = int(os.environ.get('DB_POOL_PING_AFTER', 30))
+
+# Pool hidup di level module sehingga tetap ada di antara warm invocation
+_pool = None
+_pool_lock = threading.Lock()
+_last_used = {}
+
+
+class InstrumentedCursor(extensions.cursor):
+    """
+    Cursor yang mencatat durasi, jumlah query dan rowcount ke instrumentation.
+    Dipasang lewat cursor_factory, jadi semua lambda yang memakai pool
+    ikut terukur tanpa mengubah kode query.
+    """
+
+    def execute(self, query, vars=None):
+        if not instrumentation.active():
+            return super().execute(query, vars)
+        started = time.perf_counter()
+        try:
+            return super().execute(query, vars)
+        finally:
+            instrumentation.record_query(query, started, self.rowcount)
+
+    def executemany(self, query, vars_list):
+        if not instrumentation.active():
+            return super().executemany(query, vars_list)
+        started = time.perf_counter()
+        try:
+            return super().executemany(query, vars_list)
+        finally:
+            instrumentation.record_query(query, started, self.rowcount)
+
+
+def _create_pool():
+    return pool.ThreadedConnectionPool(
+        DB_POOL_MIN,
+        DB_POOL_MAX,
+        host=DB_HOST,
+        database=DB_NAME,
+        user=DB_USER,
+        password=DB_PASSWORD,
+        connect_timeout=DB_CONNECT_TIMEOUT,
+        keepalives=1,
+        keepalives_idle=30,
+        keepalives_interval=10,
+        keepalives_count=3,
+        # Semua cursor dari pool tercatat di metric per invocation
+        cursor_factory=InstrumentedCursor
+    )
+
+
+def _get_pool():
+    global _pool
+    if _pool is None or _pool.closed:
+        with _pool_lock:
+            if _pool is None or _pool.closed:
+                log.info('creating DB connection pool', min=DB_POOL_MIN, max=DB_POOL_MAX)
+                _pool = _create_pool()
+    return _pool
+
+
+def _is_healthy(conn):
+    """
+    Cek koneksi sebelum dipinjamkan.
+    Ping (SELECT 1) hanya dilakukan kalau koneksi sudah lama idle.
+    """
+    if conn.closed:
+        return False
+
+    # Koneksi yang belum pernah dikembalikan berarti baru dibuat oleh pool
+    last_used = _last_used.get(id(conn))
+    if last_used is None or time.monotonic() - last_used < DB_POOL_PING_AFTER:
+        return True
+
+    try:
+        cur = conn.cursor()
+        cur.execute("SELECT 1")
+        cur.close()
+        conn.rollback()
+        return True
+    except (psycopg2.OperationalError, psycopg2.InterfaceError) as e:
+        log.warning('discarding broken DB connection', error=str(e))
+        return False
+
+
+def get_connection(retries=1):
+    """
+    Pinjam koneksi dari pool.
+    Koneksi yang rusak dibuang dan diganti koneksi baru.
+    Wajib dikembalikan dengan release_connection().
+    """
+    db_pool = _get_pool()
+
+    for attempt in range(retries + 1):
+        try:
+            conn = db_pool.getconn()
+        except psycopg2.OperationalError:
+            if attempt == retries:
+                raise
+            log.warning('DB connect failed, retrying', attempt=attempt + 1)
+            continue
+
+        if _is_healthy(conn):
+            return conn
+
+        _last_used.pop(id(conn), None)
+        db_pool.putconn(conn, close=True)
+
+    # Semua koneksi lama rusak, paksa buat koneksi baru
+    return db_pool.getconn()
+
+
+def release_connection(conn, broken=False):
+    """
+    Kembalikan koneksi ke pool.
+    Transaksi yang masih terbuka di-rollback supaya request berikutnya
+    mendapat koneksi yang bersih.
+    """
+    if conn is None:
+        return
+
+    db_pool = _get_pool()
+
+    if not broken and not conn.closed:
+        try:
+            if conn.info.transaction_status != extensions.TRANSACTION_STATUS_IDLE:
+                conn.rollback()
+        except (psycopg2.OperationalError, psycopg2.InterfaceError):
+            broken = True
+
+    if broken or conn.closed:
+        _last_used.pop(id(conn), None)
+        db_pool.putconn(conn, close=True)
+        return
+
+    _last_used[id(conn)] = time.monotonic()
+    db_pool.putconn(conn)
+
+
+def close_pool():
+    """Tutup semua koneksi (misalnya setelah migrasi atau untuk testing)"""
+    global _pool
+    with _pool_lock:
+        if _pool is not None and not _pool.closed:
+            _pool.closeall()
+        _pool = None
+        _last_used.clear()
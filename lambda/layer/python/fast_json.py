@@ -0,0 +1,39 @@
+import json
+from decimal import Decimal
+from datetime import date, datetime
+
+# orjson opsional: kalau ada di layer dipakai (encoder C, datetime native),
+# kalau tidak ada fallback ke json standar dengan hasil yang setara
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def _default(value):
+    # Decimal (NUMERIC dari psycopg2) ditulis sebagai number, tanggal sebagai ISO 8601
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f'Object of type {type(value).__name__} is not JSON serializable')
+
+
+# Encoder dibuat sekali, bukan per panggilan json.dumps(default=...)
+_encoder = json.JSONEncoder(default=_default)
+
+
+def dumps(obj):
+    """Serialize ke str JSON; Decimal dan datetime/date ditangani langsung"""
+    if orjson is not None:
+        return orjson.dumps(obj, default=_default).decode('utf-8')
+    return _encoder.encode(obj)
+
+
+def rows(columns, cursor_rows):
+    """
+    Ubah tuple hasil cursor menjadi list dict tanpa konversi per field:
+    Decimal / datetime dibiarkan apa adanya dan baru di-encode oleh dumps().
+    cursor_rows boleh cursor itu sendiri (di-iterate langsung, tanpa fetchall).
+    """
+    return [dict(zip(columns, row)) for row in cursor_rows]
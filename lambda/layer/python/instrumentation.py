@@ -0,0 +1,263 @@
+import os
+import json
+import time
+import threading
+import functools
+
+# emf   : satu baris CloudWatch Embedded Metric Format per invocation (default)
+# local : breakdown flame-style per invocation di log, untuk profiling lokal
+# off   : tanpa instrumentasi
+INSTRUMENTATION_MODE = os.environ.get('INSTRUMENTATION_MODE', 'emf').lower()
+EMF_NAMESPACE = os.environ.get('EMF_NAMESPACE', 'OrderManagement')
+FUNCTION_NAME = os.environ.get('AWS_LAMBDA_FUNCTION_NAME', 'local')
+
+# Invocation aktif (satu per container) dan stack span per thread.
+# Span dari thread lain (misalnya upload arsip di thread pool) menempel ke root.
+_invocation = None
+_lock = threading.Lock()
+_local = threading.local()
+
+
+class Span:
+    __slots__ = ('name', 'kind', 'started', 'duration_ms', 'rows', 'children')
+
+    def __init__(self, name, kind='span'):
+        self.name = name
+        self.kind = kind
+        self.started = time.perf_counter()
+        self.duration_ms = 0.0
+        self.rows = None
+        self.children = []
+
+    def finish(self):
+        self.duration_ms = (time.perf_counter() - self.started) * 1000
+
+
+class Invocation:
+    def __init__(self, name):
+        self.root = Span(name, 'handler')
+        self.counters = {'DbQueries': 0, 'DbRows': 0, 'DbTime': 0.0, 'AwsCalls': 0, 'AwsErrors': 0, 'AwsTime': 0.0}
+        # Durasi total per span bernama (span yang sama bisa terjadi berkali-kali)
+        self.spans = {}
+
+
+def _stack():
+    stack = getattr(_local, 'stack', None)
+    if stack is None:
+        stack = _local.stack = []
+    return stack
+
+
+def _attach(span):
+    stack = _stack()
+    parent = stack[-1] if stack else _invocation.root
+    with _lock:
+        parent.children.append(span)
+
+
+class span:
+    """
+    Context manager untuk mengukur satu bagian handler:
+
+        with instrumentation.span('price_lookup'):
+            cur.execute(...)
+
+    Query DB dan call AWS di dalamnya menjadi child span.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self._span = None
+
+    def __enter__(self):
+        if _invocation is not None:
+            self._span = Span(self.name)
+            _attach(self._span)
+            _stack().append(self._span)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if self._span is not None:
+            self._span.finish()
+            _stack().pop()
+            with _lock:
+                _invocation.spans[self.name] = _invocation.spans.get(self.name, 0.0) + self._span.duration_ms
+        return False
+
+
+def _record_leaf(name, kind, started, rows=None):
+    leaf = Span(name, kind)
+    leaf.started = started
+    leaf.finish()
+    leaf.rows = rows
+    _attach(leaf)
+    return leaf
+
+
+def active():
+    """True kalau sedang di dalam invocation yang diinstrumentasi"""
+    return _invocation is not None
+
+
+def record_query(query, started, rows):
+    """
+    Catat satu query DB (dipanggil cursor di db_pool).
+    Modul ini sengaja tidak meng-import psycopg2 supaya function tanpa
+    database tidak perlu membawa driver-nya.
+    """
+    if _invocation is None:
+        return
+    if isinstance(query, bytes):
+        query = query.decode('utf-8', 'replace')
+    # Nama span cukup kata kunci pertama (SELECT / INSERT / WITH ...), bukan SQL lengkap
+    words = str(query).split(None, 1)
+    rows = rows if rows and rows > 0 else 0
+    leaf = _record_leaf(f"db.{words[0].upper() if words else 'QUERY'}", 'db', started, rows)
+    with _lock:
+        counters = _invocation.counters
+        counters['DbQueries'] += 1
+        counters['DbRows'] += rows
+        counters['DbTime'] += leaf.duration_ms
+
+
+def count(name, value=1):
+    """Counter tambahan untuk invocation aktif, ditulis sebagai metric EMF (unit Count)"""
+    if _invocation is None:
+        return
+    with _lock:
+        counters = _invocation.counters
+        counters[name] = counters.get(name, 0) + value
+
+
+def _before_call(context, **kwargs):
+    if _invocation is not None:
+        context['instrumentation_started'] = time.perf_counter()
+
+
+def _record_call(context, event_name, error):
+    started = context.get('instrumentation_started')
+    if started is None or _invocation is None:
+        return
+    # event_name: after-call.<service>.<operation> / after-call-error.<service>.<operation>
+    leaf = _record_leaf(f"aws.{event_name.split('.', 1)[-1]}", 'aws', started)
+    with _lock:
+        counters = _invocation.counters
+        counters['AwsCalls'] += 1
+        counters['AwsTime'] += leaf.duration_ms
+        if error:
+            counters['AwsErrors'] += 1
+
+
+def _after_call(context, event_name='', http_response=None, **kwargs):
+    # Error dari API (4xx / 5xx) tetap lewat after-call, ClientError baru dilempar setelahnya
+    error = http_response is not None and http_response.status_code >= 300
+    _record_call(context, event_name, error)
+
+
+def _after_call_error(context, exception=None, event_name='', **kwargs):
+    # Hanya dikirim botocore (exception=, context=) kalau request gagal tanpa response:
+    # koneksi putus, timeout, endpoint tidak bisa dihubungi
+    _record_call(context, event_name, True)
+
+
+def instrument_client(client):
+    """Pasang hook timing di client boto3 (semua operasi). Return client yang sama."""
+    if INSTRUMENTATION_MODE != 'off':
+        events = client.meta.events
+        events.register('before-call.*.*', _before_call)
+        events.register('after-call.*.*', _after_call)
+        events.register('after-call-error.*.*', _after_call_error)
+    return client
+
+
+def _emit_emf(invocation):
+    root = invocation.root
+    values = {'Duration': round(root.duration_ms, 2)}
+    metrics = [{'Name': 'Duration', 'Unit': 'Milliseconds'}]
+    for name, value in invocation.counters.items():
+        values[name] = round(value, 2)
+        unit = 'Milliseconds' if name.endswith('Time') else 'Count'
+        metrics.append({'Name': name, 'Unit': unit})
+    for name, duration_ms in invocation.spans.items():
+        metric = f"Span.{name}"
+        values[metric] = round(duration_ms, 2)
+        metrics.append({'Name': metric, 'Unit': 'Milliseconds'})
+
+    record = {
+        '_aws': {
+            'Timestamp': int(time.time() * 1000),
+            'CloudWatchMetrics': [{
+                'Namespace': EMF_NAMESPACE,
+                'Dimensions': [['Function']],
+                'Metrics': metrics
+            }]
+        },
+        'Function': root.name,
+        'FunctionName': FUNCTION_NAME
+    }
+    record.update(values)
+    print(json.dumps(record, separators=(',', ':')))
+
+
+def _flame_lines(node, depth, lines):
+    detail = f" rows={node.rows}" if node.rows is not None else ''
+    lines.append(f"{'  ' * depth}{node.name} {node.duration_ms:.1f}ms{detail}")
+    # Child berturut-turut dengan nama sama digabung supaya loop tidak membanjiri output
+    merged = []
+    for child in node.children:
+        if merged and merged[-1][0].name == child.name and not child.children:
+            merged[-1][1] += 1
+            merged[-1][0].duration_ms += child.duration_ms
+            if child.rows is not None:
+                merged[-1][0].rows = (merged[-1][0].rows or 0) + child.rows
+        else:
+            merged.append([child, 1])
+    for child, count in merged:
+        if count > 1:
+            child.name = f"{child.name} x{count}"
+        _flame_lines(child, depth + 1, lines)
+
+
+def _emit_local(invocation):
+    lines = []
+    _flame_lines(invocation.root, 0, lines)
+    counters = invocation.counters
+    lines.append(
+        f"db: {counters['DbQueries']} queries, {counters['DbRows']} rows, {counters['DbTime']:.1f}ms | "
+        f"aws: {counters['AwsCalls']} calls, {counters['AwsTime']:.1f}ms"
+    )
+    print("\n".join(lines))
+
+
+def instrument_handler(name):
+    """
+    Decorator lambda_handler: ukur satu invocation dan tulis hasilnya (EMF / local).
+
+        @instrumentation.instrument_handler('order_management')
+        def lambda_handler(event, context): ...
+    """
+    def decorator(handler):
+        if INSTRUMENTATION_MODE == 'off':
+            return handler
+
+        @functools.wraps(handler)
+        def wrapper(event, context):
+            global _invocation
+            _invocation = Invocation(name)
+            _local.stack = []
+            try:
+                return handler(event, context)
+            finally:
+                invocation = _invocation
+                _invocation = None
+                invocation.root.finish()
+                try:
+                    if INSTRUMENTATION_MODE == 'local':
+                        _emit_local(invocation)
+                    else:
+                        _emit_emf(invocation)
+                except Exception as e:
+                    print(f"Instrumentation emit failed: {str(e)}")
+
+        return wrapper
+    return decorator
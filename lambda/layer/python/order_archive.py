@@ -0,0 +1,49 @@
+# Arsip order di S3 (orders/{order_id}.json).
+#
+# Ditulis oleh dispatch_outbox setelah workflow order dijalankan, jadi
+# create_order tidak menunggu S3. Order yang arsipnya gagal (archived_at
+# masih NULL) di-upload ulang oleh reconcile_order_archives di
+# order_management. Key selalu sama per order, jadi upload ulang idempotent.
+import json
+from datetime import datetime
+
+
+def build_order_archive(order_id, customer_id, items, total_amount, created_at):
+    """Isi file orders/{order_id}.json"""
+    return json.dumps({
+        'order_id': order_id,
+        'customer_id': customer_id,
+        'items': items,
+        'total_amount': float(total_amount),
+        'created_at': created_at.isoformat()
+    })
+
+
+def archive_from_payload(payload):
+    """Isi arsip dari payload order_outbox (input Step Functions, camelCase)"""
+    return build_order_archive(
+        payload['orderId'],
+        payload['customerId'],
+        [{'product_id': item['productId'], 'quantity': item['quantity']} for item in payload['items']],
+        payload['totalAmount'],
+        datetime.fromisoformat(payload['timestamp'])
+    )
+
+
+def put_order_archive(s3_client, bucket, order_id, body):
+    s3_client.put_object(
+        Bucket=bucket,
+        Key=f"orders/{order_id}.json",
+        Body=body
+    )
+
+
+def mark_archived(cur, order_ids):
+    """Isi orders.archived_at untuk order yang arsipnya sudah ada di S3. Caller yang commit."""
+    if not order_ids:
+        return 0
+    cur.execute("""
+        UPDATE orders SET archived_at = %s
+        WHERE order_id = ANY(%s) AND archived_at IS NULL
+    """, (datetime.now(), list(order_ids)))
+    return cur.rowcount
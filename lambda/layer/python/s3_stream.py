@@ -0,0 +1,122 @@
+import os
+
+# Ukuran part multipart upload (minimal 5 MB kecuali part terakhir)
+S3_PART_SIZE = int(os.environ.get('S3_PART_SIZE', 8 * 1024 * 1024))
+
+
+class S3MultipartWriter:
+    """
+    File-like object write-only yang meng-upload isinya ke S3 per part.
+    Memory yang dipakai hanya satu part, berapa pun ukuran file akhirnya.
+
+    with S3MultipartWriter(s3_client, bucket, key, content_type) as out:
+        out.write(b'...')
+
+    Keluar dari with tanpa error -> complete_multipart_upload,
+    dengan error -> abort_multipart_upload (tidak ada part yatim di bucket).
+    Tidak seekable; zipfile (openpyxl) otomatis memakai mode streaming.
+    """
+
+    def __init__(self, s3_client, bucket, key, content_type='application/octet-stream',
+                 part_size=S3_PART_SIZE):
+        self.s3_client = s3_client
+        self.bucket = bucket
+        self.key = key
+        self.content_type = content_type
+        self.part_size = max(part_size, 5 * 1024 * 1024)
+        self._buffer = bytearray()
+        self._parts = []
+        self._upload_id = None
+        self._position = 0
+        self.closed = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+        return False
+
+    def writable(self):
+        return True
+
+    def seekable(self):
+        return False
+
+    def tell(self):
+        return self._position
+
+    def write(self, data):
+        if isinstance(data, str):
+            data = data.encode('utf-8')
+        self._buffer += data
+        self._position += len(data)
+        if len(self._buffer) >= self.part_size:
+            self._upload_part(bytes(self._buffer))
+            self._buffer.clear()
+        return len(data)
+
+    def flush(self):
+        # Part dikirim saat buffer penuh; flush() dari zipfile tidak memaksa part kecil
+        pass
+
+    def _upload_part(self, body):
+        if self._upload_id is None:
+            result = self.s3_client.create_multipart_upload(
+                Bucket=self.bucket,
+                Key=self.key,
+                ContentType=self.content_type
+            )
+            self._upload_id = result['UploadId']
+        part_number = len(self._parts) + 1
+        result = self.s3_client.upload_part(
+            Bucket=self.bucket,
+            Key=self.key,
+            UploadId=self._upload_id,
+            PartNumber=part_number,
+            Body=body
+        )
+        self._parts.append({'ETag': result['ETag'], 'PartNumber': part_number})
+
+    def close(self):
+        if self.closed:
+            return
+
+        try:
+            if self._upload_id is None:
+                # File kecil (kurang dari satu part): cukup satu put_object
+                self.s3_client.put_object(
+                    Bucket=self.bucket,
+                    Key=self.key,
+                    Body=bytes(self._buffer),
+                    ContentType=self.content_type
+                )
+            else:
+                if self._buffer:
+                    self._upload_part(bytes(self._buffer))
+                self.s3_client.complete_multipart_upload(
+                    Bucket=self.bucket,
+                    Key=self.key,
+                    UploadId=self._upload_id,
+                    MultipartUpload={'Parts': self._parts}
+                )
+        except Exception:
+            self.abort()
+            raise
+        self._buffer.clear()
+        self.closed = True
+
+    def abort(self):
+        if self.closed:
+            return
+        self.closed = True
+        self._buffer.clear()
+        if self._upload_id is not None:
+            self.s3_client.abort_multipart_upload(
+                Bucket=self.bucket,
+                Key=self.key,
+                UploadId=self._upload_id
+            )
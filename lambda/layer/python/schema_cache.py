@@ -0,0 +1,87 @@
+import os
+import time
+import threading
+import structured_log
+
+# Berapa detik sekali versi schema dicek ulang ke database.
+# Di antara pengecekan, hasil probe information_schema dipakai dari memory.
+SCHEMA_CACHE_CHECK_INTERVAL = int(os.environ.get('SCHEMA_CACHE_CHECK_INTERVAL', 60))
+
+# Cache level process: diisi sekali per container, dipakai ulang di warm invocation
+_columns = None
+_version = None
+_checked_at = 0
+_lock = threading.Lock()
+
+log = structured_log.get_logger('schema_cache')
+
+
+def _load(cur):
+    global _columns, _version, _checked_at
+
+    cur.execute("""
+        SELECT table_name, column_name
+        FROM information_schema.columns
+        WHERE table_schema = current_schema()
+    """)
+    columns = {}
+    for table_name, column_name in cur.fetchall():
+        columns.setdefault(table_name, set()).add(column_name)
+
+    version = None
+    if 'schema_meta' in columns:
+        cur.execute("SELECT schema_version FROM schema_meta WHERE id = 1")
+        row = cur.fetchone()
+        version = row[0] if row else None
+
+    _columns = columns
+    _version = version
+    _checked_at = time.monotonic()
+    log.info('schema cache loaded', tables=len(columns), version=version)
+
+
+def _refresh_if_stale(cur):
+    global _checked_at
+
+    if _columns is None:
+        _load(cur)
+        return
+
+    if time.monotonic() - _checked_at < SCHEMA_CACHE_CHECK_INTERVAL:
+        return
+
+    if _version is None:
+        # Belum ada schema_meta (database lama), probe ulang seluruhnya
+        _load(cur)
+        return
+
+    # Pengecekan murah: satu lookup primary key, bukan information_schema
+    cur.execute("SELECT schema_version FROM schema_meta WHERE id = 1")
+    row = cur.fetchone()
+    if not row or row[0] != _version:
+        log.info('schema version changed, reloading schema cache')
+        _load(cur)
+    else:
+        _checked_at = time.monotonic()
+
+
+def has_column(cur, table_name, column_name):
+    """
+    Cek apakah kolom ada, memakai cache schema.
+    cur dipakai hanya kalau cache perlu diisi / divalidasi ulang.
+    """
+    with _lock:
+        _refresh_if_stale(cur)
+        return column_name in _columns.get(table_name, ())
+
+
+def invalidate():
+    """
+    Kosongkan cache, misalnya setelah migrasi atau saat query gagal
+    karena kolom yang diharapkan ternyata tidak ada
+    """
+    global _columns, _version, _checked_at
+    with _lock:
+        _columns = None
+        _version = None
+        _checked_at = 0
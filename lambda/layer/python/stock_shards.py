@@ -0,0 +1,262 @@
+# Sharded stock counter untuk produk flash-sale.
+#
+# Produk dengan inventory.stock_shards > 0 menyimpan stoknya di N baris
+# inventory_stock_shards. Decrement cukup mengunci satu shard (SKIP LOCKED),
+# jadi order-order untuk produk yang sama bisa jalan paralel alih-alih antri
+# di satu row lock inventory.
+#
+# inventory.stock_quantity untuk produk sharded hanya berupa total yang
+# disinkronkan oleh rebalance(); sumber kebenarannya adalah SUM shard.
+# Pembaca stok (list_products, detects_lowstock, generate_report) wajib
+# memakai EFFECTIVE_STOCK_SQL, bukan inventory.stock_quantity.
+#
+# Semua lock di modul ini FOR NO KEY UPDATE (product_id tidak pernah berubah),
+# sama dengan reserve_stock di update_inventory: tidak bentrok dengan FK check
+# (FOR KEY SHARE) dari INSERT order_items di create_order, jadi rebalance /
+# restock produk hot tidak menahan pembuatan order.
+import random
+from datetime import datetime
+from psycopg2.extras import execute_values
+
+# Ekspresi stok efektif, dipakai semua read path stok.
+# Alias tabel inventory harus "i".
+EFFECTIVE_STOCK_SQL = """
+    CASE WHEN i.stock_shards > 0 THEN (
+        SELECT COALESCE(SUM(s.stock_quantity), 0)
+        FROM inventory_stock_shards s
+        WHERE s.product_id = i.product_id
+    ) ELSE i.stock_quantity END
+"""
+
+
+def decrement(cur, product_id, quantity, shard_count):
+    """
+    Kurangi stok produk sharded sebanyak quantity.
+
+    Fast path: satu shard yang stoknya cukup dan tidak sedang dikunci
+    transaksi lain, mulai dari offset acak supaya beban tersebar.
+    Slow path: kunci semua shard produk (urutan shard_no, deterministik)
+    dan ambil dari beberapa shard sekaligus.
+
+    Returns (previous_total, new_total), atau (available_total, None)
+    kalau total stok tidak cukup. Caller wajib rollback di kasus itu.
+    """
+    offset = random.randrange(max(shard_count, 1))
+    now = datetime.now()
+
+    cur.execute("""
+        WITH pick AS (
+            SELECT product_id, shard_no
+            FROM inventory_stock_shards
+            WHERE product_id = %(product_id)s
+            AND stock_quantity >= %(quantity)s
+            ORDER BY (shard_no + %(offset)s) %% %(shard_count)s
+            LIMIT 1
+            FOR NO KEY UPDATE SKIP LOCKED
+        )
+        UPDATE inventory_stock_shards s
+        SET stock_quantity = s.stock_quantity - %(quantity)s,
+            updated_at = %(now)s
+        FROM pick
+        WHERE s.product_id = pick.product_id
+        AND s.shard_no = pick.shard_no
+        RETURNING (
+            SELECT SUM(stock_quantity)
+            FROM inventory_stock_shards
+            WHERE product_id = %(product_id)s
+        )
+    """, {
+        'product_id': product_id,
+        'quantity': quantity,
+        'offset': offset,
+        'shard_count': max(shard_count, 1),
+        'now': now
+    })
+    row = cur.fetchone()
+    if row:
+        # Subquery di RETURNING melihat snapshot sebelum UPDATE
+        previous_total = row[0]
+        return previous_total, previous_total - quantity
+
+    # Slow path: tidak ada satu shard pun yang cukup / bebas
+    cur.execute("""
+        SELECT shard_no, stock_quantity
+        FROM inventory_stock_shards
+        WHERE product_id = %s
+        ORDER BY shard_no
+        FOR NO KEY UPDATE
+    """, (product_id,))
+    shards = cur.fetchall()
+    total = sum(stock for _, stock in shards)
+    if total < quantity:
+        return total, None
+
+    remaining = quantity
+    updates = []
+    for shard_no, stock in sorted(shards, key=lambda shard: -shard[1]):
+        if remaining == 0:
+            break
+        take = min(stock, remaining)
+        if take:
+            updates.append((shard_no, take))
+            remaining -= take
+
+    execute_values(cur, """
+        UPDATE inventory_stock_shards AS s
+        SET stock_quantity = s.stock_quantity - v.take,
+            updated_at = v.updated_at
+        FROM (VALUES %s) AS v (product_id, shard_no, take, updated_at)
+        WHERE s.product_id = v.product_id
+        AND s.shard_no = v.shard_no
+    """, [(product_id, shard_no, take, now) for shard_no, take in updates],
+        template="(%s, %s::smallint, %s::int, %s::timestamp)")
+    return total, total - quantity
+
+
+def rebalance(cur, product_id):
+    """
+    Ratakan stok ke semua shard dan sinkronkan total ke inventory.stock_quantity.
+    Urutan lock sama dengan enable/disable (baris inventory dulu, lalu shard
+    berurutan shard_no). update_inventory tidak pernah mengunci baris
+    inventory produk sharded, jadi tidak ada siklus lock.
+    Returns total stok produk.
+    """
+    cur.execute("""
+        SELECT 1 FROM inventory
+        WHERE product_id = %s AND stock_shards > 0
+        FOR NO KEY UPDATE
+    """, (product_id,))
+    if not cur.fetchone():
+        return None
+
+    cur.execute("""
+        SELECT shard_no, stock_quantity
+        FROM inventory_stock_shards
+        WHERE product_id = %s
+        ORDER BY shard_no
+        FOR NO KEY UPDATE
+    """, (product_id,))
+    shards = cur.fetchall()
+    if not shards:
+        return None
+
+    total = sum(stock for _, stock in shards)
+    base, extra = divmod(total, len(shards))
+    now = datetime.now()
+
+    targets = []
+    for index, (shard_no, stock) in enumerate(shards):
+        target = base + (1 if index < extra else 0)
+        if target != stock:
+            targets.append((product_id, shard_no, target))
+
+    if targets:
+        execute_values(cur, """
+            UPDATE inventory_stock_shards AS s
+            SET stock_quantity = v.stock_quantity
+            FROM (VALUES %s) AS v (product_id, shard_no, stock_quantity)
+            WHERE s.product_id = v.product_id
+            AND s.shard_no = v.shard_no
+        """, targets, template="(%s, %s::smallint, %s::int)")
+
+    cur.execute("""
+        UPDATE inventory
+        SET stock_quantity = %s, updated_at = %s
+        WHERE product_id = %s AND stock_quantity IS DISTINCT FROM %s
+    """, (total, now, product_id, total))
+    return total
+
+
+def enable(cur, product_id, shard_count):
+    """
+    Aktifkan mode sharded: stok inventory saat ini dibagi rata ke shard_count baris.
+    Kalau produk sudah sharded, jumlah shard diubah dan stok diratakan ulang.
+    """
+    if shard_count < 1:
+        raise ValueError('shard_count must be positive')
+
+    cur.execute("""
+        SELECT stock_quantity, stock_shards
+        FROM inventory
+        WHERE product_id = %s
+        FOR NO KEY UPDATE
+    """, (product_id,))
+    row = cur.fetchone()
+    if not row:
+        raise ValueError(f'Product {product_id} not found')
+
+    stock_quantity, current_shards = row
+    if current_shards > 0:
+        # Total diambil dari shard yang ada, lalu shard lama dihapus
+        cur.execute("""
+            DELETE FROM inventory_stock_shards
+            WHERE product_id = %s
+            RETURNING stock_quantity
+        """, (product_id,))
+        stock_quantity = sum(r[0] for r in cur.fetchall())
+
+    base, extra = divmod(stock_quantity, shard_count)
+    execute_values(cur, """
+        INSERT INTO inventory_stock_shards (product_id, shard_no, stock_quantity)
+        VALUES %s
+    """, [(product_id, n, base + (1 if n < extra else 0)) for n in range(shard_count)])
+
+    cur.execute("""
+        UPDATE inventory
+        SET stock_shards = %s, stock_quantity = %s, updated_at = %s
+        WHERE product_id = %s
+    """, (shard_count, stock_quantity, datetime.now(), product_id))
+    return stock_quantity
+
+
+def disable(cur, product_id):
+    """Kembalikan produk ke satu counter di inventory.stock_quantity"""
+    cur.execute("""
+        SELECT stock_shards
+        FROM inventory
+        WHERE product_id = %s
+        FOR NO KEY UPDATE
+    """, (product_id,))
+    row = cur.fetchone()
+    if not row:
+        raise ValueError(f'Product {product_id} not found')
+    if row[0] == 0:
+        return None
+
+    cur.execute("""
+        DELETE FROM inventory_stock_shards
+        WHERE product_id = %s
+        RETURNING stock_quantity
+    """, (product_id,))
+    total = sum(r[0] for r in cur.fetchall())
+
+    cur.execute("""
+        UPDATE inventory
+        SET stock_shards = 0, stock_quantity = %s, updated_at = %s
+        WHERE product_id = %s
+    """, (total, datetime.now(), product_id))
+    return total
+
+
+def add_stock(cur, product_id, quantity):
+    """Restock produk sharded: tambahkan ke shard dengan stok paling sedikit lalu ratakan"""
+    cur.execute("""
+        SELECT 1 FROM inventory
+        WHERE product_id = %s AND stock_shards > 0
+        FOR NO KEY UPDATE
+    """, (product_id,))
+    if not cur.fetchone():
+        raise ValueError(f'Product {product_id} is not sharded')
+
+    cur.execute("""
+        UPDATE inventory_stock_shards
+        SET stock_quantity = stock_quantity + %s, updated_at = %s
+        WHERE (product_id, shard_no) = (
+            SELECT product_id, shard_no
+            FROM inventory_stock_shards
+            WHERE product_id = %s
+            ORDER BY stock_quantity, shard_no
+            LIMIT 1
+        )
+    """, (quantity, datetime.now(), product_id))
+    return rebalance(cur, product_id)
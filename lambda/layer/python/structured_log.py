@@ -0,0 +1,127 @@
+import os
+import json
+import time
+import random
+import functools
+import traceback
+
+# Level log: DEBUG, INFO, WARNING, ERROR
+LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO').upper()
+# Fraksi request yang payload debug-nya (event, input workflow, dll) ikut ditulis
+# walaupun LOG_LEVEL di atas DEBUG
+LOG_PAYLOAD_SAMPLE_RATE = float(os.environ.get('LOG_PAYLOAD_SAMPLE_RATE', 0.01))
+
+LEVELS = {'DEBUG': 10, 'INFO': 20, 'WARNING': 30, 'ERROR': 40}
+
+
+def _dumps(record):
+    # Satu baris JSON compact; Decimal / datetime / dll ditulis sebagai string
+    return json.dumps(record, separators=(',', ':'), default=str)
+
+
+class StructuredLogger:
+    """
+    Logger JSON satu baris per record untuk CloudWatch.
+
+    - Pesan di-format lazy: log.debug('x=%s', x) tidak memformat apa pun
+      kalau level DEBUG tidak aktif
+    - payload(name, value) hanya men-serialize value kalau DEBUG aktif atau
+      request ini terpilih sampling (LOG_PAYLOAD_SAMPLE_RATE)
+    - exc_info=True (di dalam except) menambahkan field traceback
+    - wrap_handler mengumpulkan field selama request (set()) dan menulis
+      satu baris ringkasan per invocation
+    """
+
+    def __init__(self, name, level=LOG_LEVEL, sample_rate=LOG_PAYLOAD_SAMPLE_RATE):
+        self.name = name
+        self.level = LEVELS.get(level, LEVELS['INFO'])
+        self.sample_rate = sample_rate
+        self._request_id = None
+        self._sampled = False
+        self._fields = {}
+
+    def enabled(self, level):
+        return LEVELS[level] >= self.level
+
+    def _emit(self, level, msg, args, fields, exc_info=False):
+        record = {'level': level, 'logger': self.name, 'msg': msg % args if args else msg}
+        if self._request_id:
+            record['request_id'] = self._request_id
+        record.update(fields)
+        if exc_info:
+            # Satu field string, bukan traceback.print_exc() multi-baris di luar JSON
+            record['traceback'] = traceback.format_exc()
+        print(_dumps(record))
+
+    def debug(self, msg, *args, **fields):
+        if self.enabled('DEBUG'):
+            self._emit('DEBUG', msg, args, fields)
+
+    def info(self, msg, *args, **fields):
+        if self.enabled('INFO'):
+            self._emit('INFO', msg, args, fields)
+
+    def warning(self, msg, *args, exc_info=False, **fields):
+        if self.enabled('WARNING'):
+            self._emit('WARNING', msg, args, fields, exc_info)
+
+    def error(self, msg, *args, exc_info=False, **fields):
+        self._emit('ERROR', msg, args, fields, exc_info)
+
+    def payload(self, name, value):
+        """Tulis payload besar (event, input) hanya saat DEBUG atau request tersampling"""
+        if self.enabled('DEBUG') or self._sampled:
+            self._emit('DEBUG', name, (), {'payload': value})
+
+    def set(self, **fields):
+        """Tambahkan field ke baris ringkasan request yang sedang berjalan"""
+        self._fields.update(fields)
+
+    def wrap_handler(self, *result_keys):
+        """
+        Decorator lambda_handler(event, context): satu baris ringkasan per
+        invocation berisi durasi, field dari set(), dan result_keys dari
+        return value (misalnya 'statusCode').
+        """
+        def decorator(handler):
+            @functools.wraps(handler)
+            def wrapper(event, context):
+                self._request_id = getattr(context, 'aws_request_id', None)
+                self._sampled = random.random() < self.sample_rate
+                self._fields = {}
+                started = time.perf_counter()
+                outcome = 'ok'
+                try:
+                    result = handler(event, context)
+                    if isinstance(result, dict):
+                        for key in result_keys:
+                            if key in result:
+                                self._fields[key] = result[key]
+                    return result
+                except Exception as e:
+                    outcome = 'error'
+                    self._fields['error'] = str(e)
+                    raise
+                finally:
+                    if self.enabled('INFO') or outcome == 'error':
+                        self._emit('INFO' if outcome == 'ok' else 'ERROR', 'request', (), dict(
+                            self._fields,
+                            outcome=outcome,
+                            duration_ms=round((time.perf_counter() - started) * 1000, 1)
+                        ))
+                    self._request_id = None
+                    self._sampled = False
+                    self._fields = {}
+            return wrapper
+        return decorator
+
+
+_loggers = {}
+
+
+def get_logger(name):
+    """Satu logger per nama, dibuat sekali per container"""
+    logger = _loggers.get(name)
+    if logger is None:
+        logger = _loggers[name] = StructuredLogger(name)
+    return logger
@@ -0,0 +1,54 @@
+import time
+import threading
+from collections import OrderedDict, namedtuple
+
+CacheEntry = namedtuple('CacheEntry', ['value', 'version', 'fresh'])
+
+
+class TTLCache:
+    """
+    Cache read-through sederhana di memory container.
+
+    - Ukuran dibatasi (entry paling lama tidak dipakai dibuang duluan)
+    - Selama umur entry < ttl, entry dianggap fresh dan bisa langsung dipakai
+    - Setelah itu entry masih disimpan bersama version-nya, sehingga caller
+      cukup melakukan pengecekan versi yang murah sebelum memakainya lagi
+    """
+
+    def __init__(self, max_size=64, ttl=30):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Return CacheEntry atau None kalau key belum ada di cache"""
+        with self._lock:
+            item = self._entries.get(key)
+            if item is None:
+                return None
+            self._entries.move_to_end(key)
+            value, version, stored_at = item
+            fresh = time.monotonic() - stored_at < self.ttl
+            return CacheEntry(value, version, fresh)
+
+    def put(self, key, value, version=None):
+        with self._lock:
+            self._entries[key] = (value, version, time.monotonic())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def touch(self, key):
+        """Perpanjang umur entry setelah versinya terbukti masih sama"""
+        with self._lock:
+            item = self._entries.get(key)
+            if item is not None:
+                self._entries[key] = (item[0], item[1], time.monotonic())
+
+    def invalidate(self, key=None):
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
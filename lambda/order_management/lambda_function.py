@@ -1,28 +1,58 @@
 import json
 import os
-import boto3
-import psycopg2
-from datetime import datetime
+import base64
+import hashlib
+import time
+import traceback
+from datetime import datetime, timedelta
 import uuid
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from psycopg2.errors import UndefinedColumn
+from psycopg2.extras import execute_values, Json
+import db_pool
+import schema_cache
+import stock_shards
+import order_archive
+import structured_log
+import fast_json
+from ttl_cache import TTLCache
+import instrumentation
+import aws_clients
 
 # Environment variables
-DB_HOST = os.environ['DB_HOST']
-DB_NAME = os.environ['DB_NAME']
-DB_USER = os.environ['DB_USER']
-DB_PASSWORD = os.environ['DB_PASSWORD']
+# (DB_HOST, DB_NAME, DB_USER, DB_PASSWORD dibaca oleh db_pool di layer)
 S3_BUCKET = os.environ['S3_BUCKET']
 STATE_MACHINE_ARN = os.environ['STATE_MACHINE_ARN']
 
-s3_client = boto3.client('s3')
-sfn_client = boto3.client('stepfunctions')
+# Catalog cache (/products, /customers) per container
+CATALOG_CACHE_TTL = int(os.environ.get('CATALOG_CACHE_TTL', 30))
+CATALOG_CACHE_SIZE = int(os.environ.get('CATALOG_CACHE_SIZE', 64))
+
+log = structured_log.get_logger('order_management')
+
+s3_client = aws_clients.lazy('s3')
+sfn_client = aws_clients.lazy('stepfunctions')
+
+catalog_cache = TTLCache(max_size=CATALOG_CACHE_SIZE, ttl=CATALOG_CACHE_TTL)
+
+# Arsip order ke S3 ditulis dispatch_outbox. Thread pool ini hanya dipakai
+# reconcile_order_archives dan create_order di database lama tanpa order_outbox.
+# Thread pool di level module supaya dipakai ulang antar warm invocation.
+ARCHIVE_TIMEOUT = float(os.environ.get('ARCHIVE_TIMEOUT', 5))
+archive_executor = ThreadPoolExecutor(max_workers=2)
+
+# Kalau true, create_order tetap mencoba start_execution langsung (latency workflow
+# lebih rendah); baris outbox hanya jadi jaminan kalau percobaan itu gagal.
+# Default false: start_execution sepenuhnya dikerjakan lambda dispatch_outbox.
+OUTBOX_INLINE_DISPATCH = os.environ.get('OUTBOX_INLINE_DISPATCH', 'false').lower() == 'true'
 
 def get_db_connection():
-    return psycopg2.connect(
-        host=DB_HOST,
-        database=DB_NAME,
-        user=DB_USER,
-        password=DB_PASSWORD
-    )
+    # Pinjam koneksi dari pool (dipakai ulang antar warm invocation)
+    return db_pool.get_connection()
+
+def release_db_connection(conn):
+    db_pool.release_connection(conn)
 
 def response(status_code, body):
     return {
@@ -30,93 +60,190 @@ def response(status_code, body):
         'headers': {
             'Content-Type': 'application/json',
             'Access-Control-Allow-Origin': '*',
-            'Access-Control-Allow-Headers': 'Content-Type,X-Amz-Date,Authorization,X-Api-Key',
-            'Access-Control-Allow-Methods': 'GET,POST,PUT,DELETE,OPTIONS'
+            'Access-Control-Allow-Headers': 'Content-Type,X-Amz-Date,Authorization,X-Api-Key,If-None-Match',
+            'Access-Control-Allow-Methods': 'GET,POST,PUT,DELETE,OPTIONS',
+            'Access-Control-Expose-Headers': 'ETag'
         },
-        'body': json.dumps(body)
+        'body': fast_json.dumps(body)
     }
 
+def with_etag(resp):
+    """
+    Tambahkan strong ETag (hash dari body) ke response 200.
+    Return dict baru supaya response yang tersimpan di cache tidak ikut berubah.
+    """
+    if resp.get('statusCode') != 200 or 'ETag' in resp['headers']:
+        return resp
+    
+    digest = hashlib.sha256(resp['body'].encode('utf-8')).hexdigest()
+    headers = dict(resp['headers'], ETag=f'"{digest[:40]}"')
+    return dict(resp, headers=headers)
+
+def weak_etag(tag):
+    """Opaque tag tanpa prefix W/ untuk weak comparison"""
+    tag = tag.strip()
+    return tag[2:] if tag.startswith('W/') else tag
+
+def conditional_response(event, resp):
+    """
+    GET dengan If-None-Match yang cocok dengan ETag -> 304 tanpa body
+    """
+    resp = with_etag(resp)
+    etag = resp['headers'].get('ETag')
+    if not etag:
+        return resp
+    
+    headers = event.get('headers') or {}
+    if_none_match = None
+    for name, value in headers.items():
+        if name.lower() == 'if-none-match':
+            if_none_match = value
+            break
+    
+    if not if_none_match:
+        return resp
+    
+    # If-None-Match memakai weak comparison (RFC 9110 13.1.2): W/"x" cocok
+    # dengan "x", misalnya ETag yang dilemahkan CDN / proxy kompresi
+    candidates = [weak_etag(tag) for tag in if_none_match.split(',')]
+    if '*' in candidates or weak_etag(etag) in candidates:
+        return {
+            'statusCode': 304,
+            'headers': resp['headers'],
+            'body': ''
+        }
+    
+    return resp
+
+def catalog_version(cur, table_name):
+    """
+    Versi murah untuk tabel catalog: MAX(updated_at) (index updated_at) +
+    catalog_versions yang dinaikkan trigger saat baris ditambah / dihapus.
+    update_inventory selalu mengisi updated_at, jadi perubahan stok
+    ikut mengubah versi. table_name hanya nilai konstan dari kode ini.
+    """
+    if not schema_cache.has_column(cur, 'catalog_versions', 'version'):
+        # Database lama (init_database belum dijalankan ulang): updated_at saja
+        cur.execute(f"SELECT MAX(updated_at) FROM {table_name}")
+        max_updated_at, table_version = cur.fetchone()[0], None
+    else:
+        cur.execute(f"""
+            SELECT
+                (SELECT MAX(updated_at) FROM {table_name}),
+                (SELECT version FROM catalog_versions WHERE table_name = %s)
+        """, (table_name,))
+        max_updated_at, table_version = cur.fetchone()
+    return (max_updated_at.isoformat() if max_updated_at else None, table_version)
+
+def stock_expression(cur):
+    """
+    Ekspresi stok untuk inventory (alias i). Produk sharded menyimpan stoknya
+    di inventory_stock_shards, jadi dihitung dari SUM shard.
+    """
+    if schema_cache.has_column(cur, 'inventory', 'stock_shards'):
+        return stock_shards.EFFECTIVE_STOCK_SQL
+    return 'i.stock_quantity'
+
+# Urutan kolom SELECT -> key JSON, dipakai fast_json.rows()
+CUSTOMER_COLUMNS = ('customer_id', 'customer_name', 'email', 'phone', 'address')
+PRODUCT_COLUMNS = ('product_id', 'product_name', 'price', 'stock_quantity', 'description', 'category')
+ORDER_COLUMNS = ('order_id', 'customer_id', 'total_amount', 'status', 'created_at')
+ORDER_ITEM_COLUMNS = ('product_id', 'quantity', 'price')
+
 def list_customers(event):
     """
     GET /customers
     Returns list of all customers for dropdown
     """
+    cache_key = ('customers',)
+    cached = catalog_cache.get(cache_key)
+    if cached and cached.fresh:
+        return cached.value
+    
     conn = get_db_connection()
     cur = conn.cursor()
     
     try:
+        version = catalog_version(cur, 'customers')
+        if cached and cached.version == version:
+            catalog_cache.touch(cache_key)
+            return cached.value
+        
         cur.execute("""
             SELECT customer_id, customer_name, email, phone, address
             FROM customers
             ORDER BY customer_name
         """)
         
-        customers = []
-        for row in cur.fetchall():
-            customers.append({
-                'customer_id': row[0],
-                'customer_name': row[1],
-                'email': row[2],
-                'phone': row[3],
-                'address': row[4]
-            })
+        customers = fast_json.rows(CUSTOMER_COLUMNS, cur)
+        
+        # Simpan response yang sudah di-encode + ETag, cache hit tidak perlu json.dumps lagi
+        resp = with_etag(response(200, {'customers': customers}))
+        catalog_cache.put(cache_key, resp, version)
         
-        return response(200, {'customers': customers})
+        return resp
         
     except Exception as e:
-        print(f"Error listing customers: {str(e)}")
+        log.error('list_customers failed', error=str(e))
         return response(500, {'message': 'Failed to list customers', 'error': str(e)})
     finally:
         cur.close()
-        conn.close()
+        release_db_connection(conn)
 
 def list_products(event):
     """
     GET /products
     Returns list of all products from inventory for dropdown
     """
+    # Get query parameters for filtering
+    query_params = event.get('queryStringParameters', {}) or {}
+    category_filter = query_params.get('category')
+    in_stock_only = query_params.get('in_stock', 'true').lower() == 'true'
+    
+    # Cache per kombinasi filter
+    cache_key = ('products', category_filter, in_stock_only)
+    cached = catalog_cache.get(cache_key)
+    if cached and cached.fresh:
+        return cached.value
+    
     conn = get_db_connection()
     cur = conn.cursor()
     
     try:
-        # Pertama, cek apakah kolom category ada
-        cur.execute("""
-            SELECT column_name 
-            FROM information_schema.columns 
-            WHERE table_name = 'inventory' 
-            AND column_name = 'category'
-        """)
-        has_category = cur.fetchone() is not None
-        
-        print(f"Database has category column: {has_category}")
-        
-        # Get query parameters for filtering
-        query_params = event.get('queryStringParameters', {}) or {}
-        category_filter = query_params.get('category')
-        in_stock_only = query_params.get('in_stock', 'true').lower() == 'true'
+        stock_sql = stock_expression(cur)
+        version = catalog_version(cur, 'inventory')
+        if stock_sql != 'i.stock_quantity':
+            # Decrement produk sharded hanya menyentuh tabel shard
+            version = (version, catalog_version(cur, 'inventory_stock_shards'))
+        if cached and cached.version == version:
+            catalog_cache.touch(cache_key)
+            return cached.value
+        
+        # Cek apakah kolom category ada (dari cache schema, bukan query per request)
+        has_category = schema_cache.has_column(cur, 'inventory', 'category')
         
         # Build query dynamically berdasarkan kolom yang ada
         if has_category:
-            query = """
-                SELECT product_id, product_name, price, stock_quantity, 
+            query = f"""
+                SELECT product_id, product_name, price, {stock_sql} AS stock_quantity, 
                        COALESCE(description, '') as description,
                        COALESCE(category, '') as category
-                FROM inventory
+                FROM inventory i
                 WHERE 1=1
             """
         else:
-            query = """
-                SELECT product_id, product_name, price, stock_quantity, 
+            query = f"""
+                SELECT product_id, product_name, price, {stock_sql} AS stock_quantity, 
                        COALESCE(description, '') as description,
                        '' as category
-                FROM inventory
+                FROM inventory i
                 WHERE 1=1
             """
         
         params = []
         
         if in_stock_only:
-            query += " AND stock_quantity > 0"
+            query += f" AND {stock_sql} > 0"
         
         if category_filter and has_category:
             query += " AND category = %s"
@@ -124,26 +251,15 @@ def list_products(event):
         
         query += " ORDER BY product_name"
         
-        print(f"Executing query: {query}")
-        print(f"With params: {params}")
+        log.debug('list_products query', sql=query, params=params)
         
         cur.execute(query, params)
         
-        products = []
-        for row in cur.fetchall():
-            product = {
-                'product_id': row[0],
-                'product_name': row[1],
-                'price': float(row[2]),
-                'stock_quantity': row[3],
-                'description': row[4],
-                'category': row[5] if has_category else ''
-            }
-            products.append(product)
-        
-        print(f"Found {len(products)} products")
+        # Tuple cursor langsung jadi dict; Decimal price di-encode oleh fast_json
+        products = fast_json.rows(PRODUCT_COLUMNS, cur)
+        log.set(product_count=len(products))
         
-        return response(200, {
+        body = {
             'products': products,
             'count': len(products),
             'metadata': {
@@ -153,12 +269,17 @@ def list_products(event):
                     'in_stock_only': in_stock_only
                 }
             }
-        })
+        }
+        resp = with_etag(response(200, body))
+        catalog_cache.put(cache_key, resp, version)
+        
+        return resp
         
     except Exception as e:
-        print(f"Error listing products: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        log.error('list_products failed', error=str(e), exc_info=True)
+        if isinstance(e, UndefinedColumn):
+            # Schema berubah sejak cache diisi, probe ulang di request berikutnya
+            schema_cache.invalidate()
         return response(500, {
             'message': 'Failed to list products', 
             'error': str(e),
@@ -166,7 +287,7 @@ def list_products(event):
         })
     finally:
         cur.close()
-        conn.close()
+        release_db_connection(conn)
 
 def get_product(product_id):
     """
@@ -176,30 +297,152 @@ def get_product(product_id):
     cur = conn.cursor()
     
     try:
-        cur.execute("""
-            SELECT product_id, product_name, price, stock_quantity, description
-            FROM inventory
-            WHERE product_id = %s AND stock_quantity > 0
+        stock_sql = stock_expression(cur)
+        cur.execute(f"""
+            SELECT * FROM (
+                SELECT product_id, product_name, price, {stock_sql} AS stock_quantity, description
+                FROM inventory i
+                WHERE product_id = %s
+            ) product
+            WHERE stock_quantity > 0
         """, (product_id,))
         
-        row = cur.fetchone()
-        if not row:
-            return None
-        
-        return {
-            'product_id': row[0],
-            'product_name': row[1],
-            'price': float(row[2]),
-            'stock_quantity': row[3],
-            'description': row[4]
-        }
+        # Sama dengan list_products: Decimal price dibiarkan, di-encode oleh fast_json
+        products = fast_json.rows(PRODUCT_COLUMNS, cur)
+        return products[0] if products else None
         
     except Exception as e:
-        print(f"Error getting product: {str(e)}")
+        log.error('get_product failed', product_id=product_id, error=str(e))
         return None
     finally:
         cur.close()
-        conn.close()
+        release_db_connection(conn)
+
+def archive_order(order_id, body):
+    order_archive.put_order_archive(s3_client, S3_BUCKET, order_id, body)
+
+def finish_order_archive(cur, conn, order_id, archive_future):
+    """
+    Tunggu upload arsip selesai (Lambda di-freeze setelah return, jadi
+    thread tidak boleh ditinggal jalan sendiri).
+
+    Kegagalan arsip TIDAK menggagalkan order: data utama ada di database.
+    Kalau sukses, orders.archived_at diisi. Kalau gagal / timeout,
+    archived_at tetap NULL dan order akan di-upload ulang oleh
+    reconcile_order_archives.
+    Return True kalau arsip berhasil.
+    """
+    try:
+        archive_future.result(timeout=ARCHIVE_TIMEOUT)
+    except Exception as e:
+        log.warning('archive failed, left for reconciliation', order_id=order_id, error=str(e))
+        return False
+    
+    try:
+        if schema_cache.has_column(cur, 'orders', 'archived_at'):
+            order_archive.mark_archived(cur, [order_id])
+            conn.commit()
+    except Exception as e:
+        # Arsip sudah ada di S3, paling buruk reconcile meng-upload ulang (idempotent)
+        conn.rollback()
+        log.warning('mark archived failed', order_id=order_id, error=str(e))
+    
+    return True
+
+def reconcile_order_archives(event):
+    """
+    Upload ulang arsip S3 untuk order yang archived_at-nya masih NULL
+    (upload gagal / timeout di create_order).
+    Dipanggil terjadwal (EventBridge) dengan input {"action": "reconcile_archives"}
+    """
+    limit = int(event.get('limit', 100))
+    min_age_seconds = int(event.get('min_age_seconds', 300))
+    
+    conn = get_db_connection()
+    cur = conn.cursor()
+    
+    try:
+        if not schema_cache.has_column(cur, 'orders', 'archived_at'):
+            return {'status': 'skipped', 'message': 'orders.archived_at does not exist, run init_database'}
+        
+        # Order yang masih sangat baru dilewati: create_order mungkin masih berjalan
+        cur.execute("""
+            SELECT order_id, customer_id, total_amount, created_at
+            FROM orders
+            WHERE archived_at IS NULL
+            AND created_at < %s
+            ORDER BY created_at
+            LIMIT %s
+        """, (datetime.now() - timedelta(seconds=min_age_seconds), limit))
+        orders = cur.fetchall()
+        
+        if not orders:
+            return {'status': 'success', 'archived': 0, 'failed': 0}
+        
+        cur.execute("""
+            SELECT order_id, product_id, quantity
+            FROM order_items
+            WHERE order_id = ANY(%s)
+            ORDER BY id
+        """, ([row[0] for row in orders],))
+        items_by_order = {}
+        for order_id, product_id, quantity in cur.fetchall():
+            items_by_order.setdefault(order_id, []).append({
+                'product_id': product_id,
+                'quantity': quantity
+            })
+        
+        futures = {}
+        for order_id, customer_id, total_amount, created_at in orders:
+            body = order_archive.build_order_archive(
+                order_id, customer_id, items_by_order.get(order_id, []), total_amount, created_at
+            )
+            futures[order_id] = archive_executor.submit(archive_order, order_id, body)
+        
+        archived_ids = []
+        failed = []
+        for order_id, future in futures.items():
+            try:
+                future.result(timeout=ARCHIVE_TIMEOUT)
+                archived_ids.append(order_id)
+            except Exception as e:
+                log.warning('reconcile archive failed', order_id=order_id, error=str(e))
+                failed.append(order_id)
+        
+        if archived_ids:
+            order_archive.mark_archived(cur, archived_ids)
+            conn.commit()
+        
+        log.set(archived=len(archived_ids), archive_failed=len(failed))
+        return {
+            'status': 'success' if not failed else 'partial',
+            'archived': len(archived_ids),
+            'failed': len(failed),
+            'failed_order_ids': failed
+        }
+    finally:
+        cur.close()
+        release_db_connection(conn)
+
+def start_order_execution(order_id, step_functions_input):
+    """
+    Start workflow dengan nama idempotent order-{order_id}.
+    Kalau execution dengan nama itu sudah ada (misalnya sudah dijalankan
+    dispatcher), anggap sukses.
+    """
+    execution_name = f"order-{order_id}"
+    
+    try:
+        execution_response = sfn_client.start_execution(
+            stateMachineArn=STATE_MACHINE_ARN,
+            name=execution_name,
+            input=json.dumps(step_functions_input)
+        )
+    except sfn_client.exceptions.ExecutionAlreadyExists:
+        log.debug('execution already exists', execution_name=execution_name)
+        return construct_execution_arn(order_id)
+    
+    return execution_response['executionArn']
 
 def create_order(event):
     body = json.loads(event['body'])
@@ -233,16 +476,25 @@ def create_order(event):
     cur = conn.cursor()
     
     try:
+        # Ambil harga semua produk di cart dalam satu query
+        product_ids = list({item['product_id'] for item in items})
+        with instrumentation.span('price_lookup'):
+            cur.execute("""
+                SELECT product_id, price, product_name
+                FROM inventory
+                WHERE product_id = ANY(%s)
+            """, (product_ids,))
+            prices = {row[0]: (row[1], row[2]) for row in cur.fetchall()}
+        
         # Calculate total amount
         total_amount = 0
         item_details = []
+        order_item_rows = []
         for item in items:
-            cur.execute("SELECT price, product_name FROM inventory WHERE product_id = %s", (item['product_id'],))
-            result = cur.fetchone()
-            if not result:
+            if item['product_id'] not in prices:
                 return response(400, {'message': f"Product {item['product_id']} not found"})
             
-            price, product_name = result
+            price, product_name = prices[item['product_id']]
             item_total = price * item['quantity']
             total_amount += item_total
             
@@ -253,81 +505,122 @@ def create_order(event):
                 'quantity': item['quantity'],
                 'price': float(price)
             })
+            order_item_rows.append((order_id, item['product_id'], item['quantity'], price))
+        # Urutkan per product_id: lock per produk yang diambil saat insert item
+        # selalu berurutan sama, jadi order [A, B] dan [B, A] tidak bisa deadlock
+        order_item_rows.sort(key=lambda row: row[1])
         
         # Insert order
-        cur.execute("""
-            INSERT INTO orders (order_id, customer_id, total_amount, status, created_at)
-            VALUES (%s, %s, %s, %s, %s)
-        """, (order_id, customer_id, total_amount, 'pending', datetime.now()))
-        
-        # Insert order items
-        for item in items:
-            cur.execute("""
+        # execution_arn bisa ditentukan di depan karena nama execution selalu order-{order_id},
+        # jadi GET /status/{id} cukup membaca kolom ini
+        with instrumentation.span('insert_order'):
+            created_at = datetime.now()
+            if schema_cache.has_column(cur, 'orders', 'execution_arn'):
+                cur.execute("""
+                    INSERT INTO orders (order_id, customer_id, total_amount, status, created_at, execution_arn)
+                    VALUES (%s, %s, %s, %s, %s, %s)
+                """, (order_id, customer_id, total_amount, 'pending', created_at, construct_execution_arn(order_id)))
+            else:
+                cur.execute("""
+                    INSERT INTO orders (order_id, customer_id, total_amount, status, created_at)
+                    VALUES (%s, %s, %s, %s, %s)
+                """, (order_id, customer_id, total_amount, 'pending', created_at))
+        
+            # Insert semua order items dalam satu statement multi-row
+            execute_values(cur, """
                 INSERT INTO order_items (order_id, product_id, quantity, price)
-                SELECT %s, %s, %s, price FROM inventory WHERE product_id = %s
-            """, (order_id, item['product_id'], item['quantity'], item['product_id']))
+                VALUES %s
+            """, order_item_rows, page_size=len(order_item_rows))
         
-        conn.commit()
+        # Step Functions input dengan format camelCase yang diharapkan
+        step_functions_input = {
+            'orderId': order_id,
+            'customerId': customer_id,
+            'totalAmount': float(total_amount),
+            'items': item_details,  # Format yang sesuai dengan Step Functions
+            'timestamp': created_at.isoformat()
+        }
         
-        # Save order to S3
-        s3_key = f"orders/{order_id}.json"
-        s3_client.put_object(
-            Bucket=S3_BUCKET,
-            Key=s3_key,
-            Body=json.dumps({
-                'order_id': order_id,
-                'customer_id': customer_id,
-                'items': items,
-                'total_amount': float(total_amount),
-                'created_at': datetime.now().isoformat()
-            })
-        )
-
-        print(f"STATE_MACHINE_ARN: {STATE_MACHINE_ARN}")
-        print(f"ARN type check: {'execution' in STATE_MACHINE_ARN}")
+        log.payload('step_functions_input', step_functions_input)
+        
+        # Transactional outbox: workflow launch ikut tersimpan di transaksi yang sama
+        # dengan order, lalu dijalankan oleh lambda dispatch_outbox
+        with instrumentation.span('outbox_write'):
+            use_outbox = schema_cache.has_column(cur, 'order_outbox', 'order_id')
+            if use_outbox:
+                cur.execute("""
+                    INSERT INTO order_outbox (order_id, payload)
+                    VALUES (%s, %s)
+                """, (order_id, Json(step_functions_input)))
+        
+        with instrumentation.span('commit'):
+            conn.commit()
         
         # Validasi format ARN
+        # (order sudah tersimpan, arsip S3-nya nanti dibuat oleh dispatch_outbox / reconcile_order_archives)
         if 'execution' in STATE_MACHINE_ARN:
             return response(400, {
                 'message': 'Invalid State Machine ARN configuration',
                 'error': 'ARN appears to be an execution ARN, not a state machine ARN'
             })
         
-        # Start Step Functions workflow dengan format camelCase yang diharapkan
-        step_functions_input = {
-            'orderId': order_id,
-            'customerId': customer_id,
-            'totalAmount': float(total_amount),
-            'items': item_details,  # Format yang sesuai dengan Step Functions
-            'timestamp': datetime.now().isoformat()
-        }
-        
-        print(f"Step Functions Input: {json.dumps(step_functions_input, indent=2)}")
-        
-        execution_name = f"order-{order_id}"
-        print(f"Starting execution with name: {execution_name}")
-
-        execution_response = sfn_client.start_execution(
-            stateMachineArn=STATE_MACHINE_ARN,
-            name=execution_name,
-            input=json.dumps(step_functions_input)
-        )
+        # Dengan outbox, arsip S3 ditulis dispatch_outbox: tidak ada S3 put maupun
+        # UPDATE archived_at di request ini. Database lama tanpa outbox masih
+        # meng-upload di background, paralel dengan start_execution.
+        archived = False
+        archive_future = None
+        if not use_outbox:
+            archive_future = archive_executor.submit(
+                archive_order,
+                order_id,
+                order_archive.build_order_archive(order_id, customer_id, items, total_amount, created_at)
+            )
+        
+        execution_arn = construct_execution_arn(order_id)
+        workflow_status = 'queued'
+        try:
+            if not use_outbox or OUTBOX_INLINE_DISPATCH:
+                try:
+                    with instrumentation.span('start_execution'):
+                        execution_arn = start_order_execution(order_id, step_functions_input)
+                    workflow_status = 'started'
+                except Exception as e:
+                    if not use_outbox:
+                        raise
+                    # Tidak masalah, baris outbox masih pending dan akan diambil dispatcher
+                    log.warning('inline workflow start failed, left in outbox', order_id=order_id, error=str(e))
+        finally:
+            # Selalu tunggu arsip selesai sebelum return, termasuk saat start_execution gagal
+            if archive_future:
+                with instrumentation.span('archive_wait'):
+                    archived = finish_order_archive(cur, conn, order_id, archive_future)
+        
+        if workflow_status == 'started' and use_outbox:
+            cur.execute("""
+                UPDATE order_outbox
+                SET status = 'dispatched', dispatched_at = %s
+                WHERE order_id = %s AND status = 'pending'
+            """, (datetime.now(), order_id))
+            conn.commit()
         
-        execution_arn = execution_response['executionArn']
-        print(f"Execution started: {execution_arn}")
+        if execution_arn != construct_execution_arn(order_id) and schema_cache.has_column(cur, 'orders', 'execution_arn'):
+            cur.execute("""
+                UPDATE orders SET execution_arn = %s WHERE order_id = %s
+            """, (execution_arn, order_id))
+            conn.commit()
         
         return response(201, {
             'message': 'Order created successfully',
             'order_id': order_id,
             'execution_arn': execution_arn,
+            'workflow_status': workflow_status,
+            'archived': archived,
             'note': 'Save this execution_arn to check workflow status later'
         })
         
     except Exception as e:
         conn.rollback()
-        print(f"Error in create_order: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        log.error('create_order failed', error=str(e), exc_info=True)
         
         # Check if it's a Step Functions error
         if "InvalidArn" in str(e) or "stepfunctions" in str(e).lower():
@@ -336,7 +629,7 @@ def create_order(event):
                 'message': 'Order created but workflow failed to start',
                 'order_id': order_id,
                 'error': str(e),
-                'note': 'Order was saved to database and S3 successfully'
+                'note': 'Order was saved to database'
             })
         else:
             # For other errors, return 500
@@ -346,58 +639,143 @@ def create_order(event):
             })
     finally:
         cur.close()
-        conn.close()
+        release_db_connection(conn)
+
+# Di bawah jumlah ini COUNT(*) masih murah, di atasnya pakai estimasi planner
+EXACT_COUNT_THRESHOLD = int(os.environ.get('EXACT_COUNT_THRESHOLD', 10000))
+
+def encode_cursor(created_at, order_id):
+    """
+    Cursor opaque untuk keyset pagination: posisi (created_at, order_id)
+    dari baris terakhir di halaman sebelumnya
+    """
+    raw = json.dumps([created_at.isoformat(), order_id])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+def decode_cursor(cursor):
+    padded = cursor + '=' * (-len(cursor) % 4)
+    created_at, order_id = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    return datetime.fromisoformat(created_at), order_id
+
+def count_orders(cur, exact=False):
+    """
+    Jumlah order untuk pagination.
+    Pakai statistik pg_class (tanpa scan) kecuali diminta exact
+    atau tabelnya masih kecil.
+    Returns (total, is_estimate)
+    """
+    if not exact:
+        cur.execute("SELECT reltuples::bigint FROM pg_class WHERE oid = 'orders'::regclass")
+        row = cur.fetchone()
+        estimate = row[0] if row else -1
+        if estimate >= EXACT_COUNT_THRESHOLD:
+            return estimate, True
+    
+    cur.execute("SELECT COUNT(*) FROM orders")
+    return cur.fetchone()[0], False
 
 def list_orders(event):
+    """
+    GET /orders
+    Dua mode pagination:
+    - cursor (keyset): ?cursor=<next_cursor>&limit=10, kirim cursor kosong untuk halaman pertama
+    - page (legacy):   ?page=1&limit=10
+    Total exact hanya dihitung kalau ?include_total=true
+    """
     params = event.get('queryStringParameters', {}) or {}
-    page = int(params.get('page', 1))
     limit = int(params.get('limit', 10))
+    if limit < 1 or limit > 1000:
+        return response(400, {'message': 'limit must be between 1 and 1000'})
+    
+    use_cursor = 'cursor' in params
+    cursor = params.get('cursor') or None
+    page = int(params.get('page', 1))
     offset = (page - 1) * limit
+    include_total = str(params.get('include_total', 'false')).lower() == 'true'
+    
+    after = None
+    if cursor:
+        try:
+            after = decode_cursor(cursor)
+        except Exception:
+            return response(400, {'message': 'Invalid cursor'})
     
     conn = get_db_connection()
     cur = conn.cursor()
     
     try:
-        cur.execute("""
-            SELECT order_id, customer_id, total_amount, status, created_at
-            FROM orders
-            ORDER BY created_at DESC
-            LIMIT %s OFFSET %s
-        """, (limit, offset))
-        
-        orders = []
-        for row in cur.fetchall():
-            orders.append({
-                'order_id': row[0],
-                'customer_id': row[1],
-                'total_amount': float(row[2]),
-                'status': row[3],
-                'created_at': row[4].isoformat()
-            })
-        
-        cur.execute("SELECT COUNT(*) FROM orders")
-        total = cur.fetchone()[0]
+        # Ambil limit + 1 baris untuk tahu apakah masih ada halaman berikutnya
+        if after:
+            cur.execute("""
+                SELECT order_id, customer_id, total_amount, status, created_at
+                FROM orders
+                WHERE (created_at, order_id) < (%s, %s)
+                ORDER BY created_at DESC, order_id DESC
+                LIMIT %s
+            """, (after[0], after[1], limit + 1))
+        elif use_cursor:
+            cur.execute("""
+                SELECT order_id, customer_id, total_amount, status, created_at
+                FROM orders
+                ORDER BY created_at DESC, order_id DESC
+                LIMIT %s
+            """, (limit + 1,))
+        else:
+            cur.execute("""
+                SELECT order_id, customer_id, total_amount, status, created_at
+                FROM orders
+                ORDER BY created_at DESC, order_id DESC
+                LIMIT %s OFFSET %s
+            """, (limit + 1, offset))
+        
+        rows = cur.fetchall()
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        
+        orders = fast_json.rows(ORDER_COLUMNS, rows)
+        
+        next_cursor = None
+        if has_more and rows:
+            next_cursor = encode_cursor(rows[-1][4], rows[-1][0])
+        
+        pagination = {
+            'limit': limit,
+            'has_more': has_more,
+            'next_cursor': next_cursor
+        }
         
-        return response(200, {
-            'orders': orders,
-            'pagination': {
+        if not use_cursor:
+            total, is_estimate = count_orders(cur, exact=include_total)
+            pagination.update({
                 'page': page,
-                'limit': limit,
                 'total': total,
+                'total_is_estimate': is_estimate,
                 'pages': (total + limit - 1) // limit
-            }
+            })
+        elif include_total:
+            total, is_estimate = count_orders(cur, exact=True)
+            pagination.update({
+                'total': total,
+                'total_is_estimate': is_estimate
+            })
+        
+        return response(200, {
+            'orders': orders,
+            'pagination': pagination
         })
     finally:
         cur.close()
-        conn.close()
+        release_db_connection(conn)
 
 def get_order(order_id):
     conn = get_db_connection()
     cur = conn.cursor()
     
     try:
-        cur.execute("""
-            SELECT order_id, customer_id, total_amount, status, created_at
+        has_execution_arn = schema_cache.has_column(cur, 'orders', 'execution_arn')
+        cur.execute(f"""
+            SELECT order_id, customer_id, total_amount, status, created_at,
+                   {'execution_arn' if has_execution_arn else 'NULL'}
             FROM orders
             WHERE order_id = %s
         """, (order_id,))
@@ -412,25 +790,14 @@ def get_order(order_id):
             WHERE order_id = %s
         """, (order_id,))
         
-        items = []
-        for item_row in cur.fetchall():
-            items.append({
-                'product_id': item_row[0],
-                'quantity': item_row[1],
-                'price': float(item_row[2])
-            })
+        order = dict(zip(ORDER_COLUMNS, row))
+        order['execution_arn'] = row[5] or construct_execution_arn(row[0])
+        order['items'] = fast_json.rows(ORDER_ITEM_COLUMNS, cur)
         
-        return response(200, {
-            'order_id': row[0],
-            'customer_id': row[1],
-            'total_amount': float(row[2]),
-            'status': row[3],
-            'created_at': row[4].isoformat(),
-            'items': items
-        })
+        return response(200, order)
     finally:
         cur.close()
-        conn.close()
+        release_db_connection(conn)
 
 def update_order(order_id, event):
     body = json.loads(event['body'])
@@ -461,7 +828,7 @@ def update_order(order_id, event):
         })
     finally:
         cur.close()
-        conn.close()
+        release_db_connection(conn)
 
 def delete_order(order_id):
     conn = get_db_connection()
@@ -482,49 +849,140 @@ def delete_order(order_id):
         })
     finally:
         cur.close()
-        conn.close()
+        release_db_connection(conn)
 
 def construct_execution_arn(order_id):
     """
     Construct execution ARN from order ID
-    Format: arn:aws:states:region:account:execution:stateMachineName:executionId
+    create_order selalu memakai nama execution order-{order_id}, jadi ARN-nya
+    bisa diturunkan langsung dari STATE_MACHINE_ARN tanpa memanggil AWS API.
+    Format: arn:aws:states:region:account:execution:stateMachineName:executionName
+    """
+    # Format: arn:aws:states:region:account:stateMachine:stateMachineName
+    parts = STATE_MACHINE_ARN.split(':')
+    if len(parts) < 7:
+        return None
+    
+    region = parts[3]
+    account_id = parts[4]
+    state_machine_name = parts[6]
+    return f"arn:aws:states:{region}:{account_id}:execution:{state_machine_name}:order-{order_id}"
+
+def find_execution_arn(order_id):
+    """
+    Cari execution ARN untuk order: satu lookup primary key ke tabel orders.
+    Return None kalau order tidak ada.
     """
+    conn = get_db_connection()
+    cur = conn.cursor()
+    
     try:
-        # Parse state machine ARN
-        # Format: arn:aws:states:region:account:stateMachine:stateMachineName
-        parts = STATE_MACHINE_ARN.split(':')
-        
-        if len(parts) >= 7:
-            # Extract components
-            region = parts[3]
-            account_id = parts[4]
-            state_machine_name = parts[6]
-            
-            # Try different execution name patterns
-            possible_names = [
-                order_id,                    # just the order ID
-                f"order-{order_id}",         # order- prefix
-                f"exec-{order_id}",          # exec- prefix
-                f"{order_id[:8]}",           # first 8 chars
-            ]
-            
-            for exec_name in possible_names:
-                execution_arn = f"arn:aws:states:{region}:{account_id}:execution:{state_machine_name}:{exec_name}"
-                print(f"Trying constructed ARN: {execution_arn}")
-                
-                # Try to verify if it exists
-                try:
-                    sfn_client.describe_execution(executionArn=execution_arn)
-                    print(f"ARN verified: {execution_arn}")
-                    return execution_arn
-                except:
-                    continue
+        if not schema_cache.has_column(cur, 'orders', 'execution_arn'):
+            # Database belum dimigrasi, pakai nama execution yang deterministik
+            return construct_execution_arn(order_id)
         
-        return None
+        cur.execute("""
+            SELECT execution_arn
+            FROM orders
+            WHERE order_id = %s
+        """, (order_id,))
         
-    except Exception as e:
-        print(f"Error constructing execution ARN: {e}")
-        return None
+        row = cur.fetchone()
+        if not row:
+            return None
+        
+        # Order lama (sebelum kolom execution_arn ada) masih NULL
+        return row[0] or construct_execution_arn(order_id)
+        
+    except UndefinedColumn:
+        schema_cache.invalidate()
+        return construct_execution_arn(order_id)
+    finally:
+        cur.close()
+        release_db_connection(conn)
+
+def parse_stats_window(params):
+    """
+    Window waktu untuk /stats (berdasarkan tanggal order dibuat):
+    ?days=7 atau ?from=YYYY-MM-DD&to=YYYY-MM-DD (inklusif)
+    Return (start_date, end_date_exclusive), None berarti tanpa batas
+    """
+    if params.get('days'):
+        days = int(params['days'])
+        if days < 1:
+            raise ValueError('days must be positive')
+        end = datetime.now().date() + timedelta(days=1)
+        return end - timedelta(days=days), end
+    
+    start = datetime.strptime(params['from'], '%Y-%m-%d').date() if params.get('from') else None
+    end = None
+    if params.get('to'):
+        end = datetime.strptime(params['to'], '%Y-%m-%d').date() + timedelta(days=1)
+    return start, end
+
+def get_stats(event):
+    """
+    GET /stats
+    Agregat dashboard (total order, revenue, pending, completed) dari view
+    order_stats_daily_live (summary + delta yang ditulis trigger di tabel orders)
+    """
+    params = event.get('queryStringParameters', {}) or {}
+    try:
+        start, end = parse_stats_window(params)
+    except ValueError as e:
+        return response(400, {'message': f'Invalid stats window: {str(e)}'})
+    
+    conn = get_db_connection()
+    cur = conn.cursor()
+    
+    try:
+        # Fallback ke tabel orders kalau summary table belum dibuat init_database
+        if schema_cache.has_column(cur, 'order_stats_daily_live', 'stat_date'):
+            cur.execute("""
+                SELECT status, SUM(order_count), SUM(total_revenue)
+                FROM order_stats_daily_live
+                WHERE (%(start)s::date IS NULL OR stat_date >= %(start)s::date)
+                AND (%(end)s::date IS NULL OR stat_date < %(end)s::date)
+                GROUP BY status
+            """, {'start': start, 'end': end})
+            source = 'order_stats_daily'
+        else:
+            cur.execute("""
+                SELECT COALESCE(status, 'unknown'), COUNT(*), SUM(total_amount)
+                FROM orders
+                WHERE (%(start)s::timestamp IS NULL OR created_at >= %(start)s::timestamp)
+                AND (%(end)s::timestamp IS NULL OR created_at < %(end)s::timestamp)
+                GROUP BY 1
+            """, {'start': start, 'end': end})
+            source = 'orders'
+        
+        orders_by_status = {}
+        for status, order_count, total_revenue in cur.fetchall():
+            if not order_count:
+                continue
+            orders_by_status[status] = {
+                'count': int(order_count),
+                'revenue': float(total_revenue or 0)
+            }
+        
+        def count_of(*statuses):
+            return sum(orders_by_status.get(s, {}).get('count', 0) for s in statuses)
+        
+        return response(200, {
+            'total_orders': count_of(*orders_by_status.keys()),
+            'total_revenue': round(sum(v['revenue'] for v in orders_by_status.values()), 2),
+            'pending_orders': count_of('pending'),
+            'completed_orders': count_of('completed', 'delivered'),
+            'orders_by_status': orders_by_status,
+            'window': {
+                'from': start.isoformat() if start else None,
+                'to': (end - timedelta(days=1)).isoformat() if end else None
+            },
+            'source': source
+        })
+    finally:
+        cur.close()
+        release_db_connection(conn)
 
 def list_executions(event):
     """
@@ -563,7 +1021,7 @@ def list_executions(event):
         })
         
     except Exception as e:
-        print(f"Error listing executions: {str(e)}")
+        log.error('list_executions failed', error=str(e))
         return response(500, {
             'message': 'Failed to list executions',
             'error': str(e)
@@ -573,64 +1031,18 @@ def get_workflow_status(identifier):
     """
     Get workflow status by either:
     1. Execution ARN (from create_order response)
-    2. Order ID (will search for executions)
+    2. Order ID (execution_arn dibaca dari tabel orders)
     """
-    print(f"get_workflow_status called with identifier: {identifier}")
+    log.set(identifier=identifier)
     
     try:
         # Check if identifier is execution ARN
         if identifier.startswith('arn:aws:states:') and 'execution:' in identifier:
             execution_arn = identifier
-            print(f"Using provided execution ARN: {execution_arn}")
         else:
-            # It's an order ID, we need to find the execution
-            order_id = identifier
-            print(f"Searching for execution for order: {order_id}")
-            
-            # Method 1: List executions and find by name
-            state_machine_arn = STATE_MACHINE_ARN
-            print(f"State Machine ARN: {state_machine_arn}")
-            
-            # Extract state machine name
-            state_machine_name = state_machine_arn.split(':')[-1]
-            
-            # List executions for this state machine
-            try:
-                executions_response = sfn_client.list_executions(
-                    stateMachineArn=state_machine_arn,
-                    statusFilter='ALL',  # Include all statuses
-                    maxResults=100
-                )
-                
-                print(f"Found {len(executions_response.get('executions', []))} executions total")
-                
-                # Look for execution with matching name pattern
-                execution_arn = None
-                for execution in executions_response.get('executions', []):
-                    exec_name = execution.get('name', '')
-                    exec_arn = execution.get('executionArn', '')
-                    
-                    # Check if execution name contains order ID
-                    if order_id in exec_name:
-                        execution_arn = exec_arn
-                        print(f"Found matching execution: {execution_arn}")
-                        break
-                    
-                    # Also check if name is exactly the order ID
-                    if exec_name == order_id or exec_name == f"order-{order_id}":
-                        execution_arn = exec_arn
-                        print(f"Found exact matching execution: {execution_arn}")
-                        break
-                
-                if not execution_arn:
-                    # Method 2: Try to construct execution ARN
-                    print("Trying to construct execution ARN...")
-                    execution_arn = construct_execution_arn(order_id)
-                    
-            except Exception as list_error:
-                print(f"Error listing executions: {list_error}")
-                # Fall back to constructing ARN
-                execution_arn = construct_execution_arn(order_id)
+            # It's an order ID
+            execution_arn = find_execution_arn(identifier)
+            log.debug('execution arn resolved', order_id=identifier, execution_arn=execution_arn)
         
         if not execution_arn:
             return response(404, {
@@ -681,106 +1093,129 @@ def get_workflow_status(identifier):
             'hint': 'The workflow may not have been started or has been deleted'
         })
     except Exception as e:
-        print(f"Error getting workflow status: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        log.error('get_workflow_status failed', error=str(e), exc_info=True)
         return response(500, {
             'message': 'Failed to get workflow status',
             'error': str(e),
             'identifier': identifier
         })
 
+# =====================================================
+# ROUTING
+# =====================================================
+class RouteParamError(Exception):
+    """Parameter route tidak valid; message dikirim sebagai response 400"""
+
+def path_param(name, message):
+    """Extractor pathParameters[name]; kosong / tidak ada -> 400 dengan message"""
+    def extract(event):
+        value = (event.get('pathParameters') or {}).get(name)
+        if not value:
+            raise RouteParamError(message)
+        return value
+    return extract
+
+# handler dipanggil dengan hasil extractor params (berurutan), lalu event kalau pass_event
+Route = namedtuple('Route', ['name', 'handler', 'params', 'pass_event'])
+
+ORDER_ID = path_param('id', 'Order ID is required')
+
+# Registry (method, resource) -> Route, dibangun sekali saat import.
+# Tambah endpoint baru cukup dengan satu baris di sini.
+ROUTES = {
+    ('GET', '/customers'): Route('list_customers', list_customers, (), True),
+    ('GET', '/products'): Route('list_products', list_products, (), True),
+    ('GET', '/orders'): Route('list_orders', list_orders, (), True),
+    ('POST', '/orders'): Route('create_order', create_order, (), True),
+    ('GET', '/orders/{id}'): Route('get_order', get_order, (ORDER_ID,), False),
+    ('PUT', '/orders/{id}'): Route('update_order', update_order, (ORDER_ID,), True),
+    ('DELETE', '/orders/{id}'): Route('delete_order', delete_order, (ORDER_ID,), False),
+    ('GET', '/status/{id}'): Route(
+        'get_workflow_status', get_workflow_status,
+        (path_param('id', 'Order ID or Execution ARN is required'),), False
+    ),
+    ('GET', '/executions'): Route('list_executions', list_executions, (), True),
+    ('GET', '/stats'): Route('get_stats', get_stats, (), True),
+}
+
+AVAILABLE_ROUTES = [f"{method} {resource}" for method, resource in ROUTES]
+
+# Hook timing per route: hook(route_name, event, resp, elapsed_ms)
+route_hooks = []
+
+def add_route_hook(hook):
+    route_hooks.append(hook)
+    return hook
+
+@add_route_hook
+def log_route_timing(route_name, event, resp, elapsed_ms):
+    # Masuk ke baris ringkasan request (structured_log), bukan baris log terpisah
+    log.set(route=route_name, route_ms=round(elapsed_ms, 1))
+
+def dispatch(route, event):
+    try:
+        args = [extract(event) for extract in route.params]
+    except RouteParamError as e:
+        return response(400, {'message': str(e)})
+    if route.pass_event:
+        args.append(event)
+    
+    started = time.perf_counter()
+    resp = route.handler(*args)
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    
+    for hook in route_hooks:
+        try:
+            hook(route.name, event, resp, elapsed_ms)
+        except Exception as e:
+            log.warning('route hook failed', route=route.name, error=str(e))
+    return resp
+
+@log.wrap_handler('statusCode')
+@instrumentation.instrument_handler('order_management')
 def lambda_handler(event, context):
-    print(f"Event received: {json.dumps(event, indent=2)}")
+    resp = route_request(event, context)
+    
+    # Conditional GET: ETag + If-None-Match
+    if event.get('httpMethod') == 'GET':
+        resp = conditional_response(event, resp)
+    
+    return resp
+
+def route_request(event, context):
+    log.payload('event', event)
+    
+    # Invocation terjadwal / langsung (bukan dari API Gateway)
+    if event.get('action') == 'reconcile_archives':
+        return reconcile_order_archives(event)
     
     http_method = event.get('httpMethod', '')
     resource = event.get('resource', '')  # Gunakan resource, bukan path!
-    
-    print(f"DEBUG - Method: {http_method}, Resource: {resource}")
+    log.set(method=http_method, resource=resource)
     
     try:
         # Handle CORS preflight
         if http_method == 'OPTIONS':
-            print("OPTIONS request - CORS preflight")
             return response(200, {})
         
-        # Routing berdasarkan resource pattern
-        if resource == '/customers' and http_method == 'GET':
-            print("Routing to list_customers")
-            return list_customers(event)
-        
-        elif resource == '/products' and http_method == 'GET':
-            print("Routing to list_products")
-            return list_products(event)
-        
-        elif resource == '/orders' and http_method == 'GET':
-            print("Routing to list_orders")
-            return list_orders(event)
-            
-        elif resource == '/orders' and http_method == 'POST':
-            print("Routing to create_order")
-            return create_order(event)
-            
-        elif resource == '/orders/{id}' and http_method == 'GET':
-            print("Routing to get_order")
-            if not event.get('pathParameters') or 'id' not in event['pathParameters']:
-                return response(400, {'message': 'Order ID is required'})
-            order_id = event['pathParameters']['id']
-            return get_order(order_id)
-            
-        elif resource == '/orders/{id}' and http_method == 'PUT':
-            print("Routing to update_order")
-            if not event.get('pathParameters') or 'id' not in event['pathParameters']:
-                return response(400, {'message': 'Order ID is required'})
-            order_id = event['pathParameters']['id']
-            return update_order(order_id, event)
-            
-        elif resource == '/orders/{id}' and http_method == 'DELETE':
-            print("Routing to delete_order")
-            if not event.get('pathParameters') or 'id' not in event['pathParameters']:
-                return response(400, {'message': 'Order ID is required'})
-            order_id = event['pathParameters']['id']
-            return delete_order(order_id)
-            
-        elif resource == '/status/{id}' and http_method == 'GET':
-            print("Routing to get_workflow_status")
-            if not event.get('pathParameters') or 'id' not in event['pathParameters']:
-                return response(400, {'message': 'Order ID or Execution ARN is required'})
-            identifier = event['pathParameters']['id']
-            return get_workflow_status(identifier)
-        
-        elif resource == '/executions' and http_method == 'GET':
-            print("Routing to list_executions")
-            return list_executions(event)
-        
-        else:
-            print(f"NO ROUTE MATCHED - Method: {http_method}, Resource: {resource}")
-            print(f"Available resources: /customers, /products, /orders, /orders/{{id}}, /status/{{id}}, /executions")
+        route = ROUTES.get((http_method, resource))
+        if route is None:
+            log.set(route='unmatched')
             return response(400, {
                 'message': 'Invalid request',
                 'debug_info': {
                     'method': http_method,
                     'resource': resource,
-                    'available_routes': [
-                        'GET /customers',
-                        'GET /products',
-                        'GET /orders',
-                        'POST /orders',
-                        'GET /orders/{id}',
-                        'PUT /orders/{id}',
-                        'DELETE /orders/{id}',
-                        'GET /status/{id}',
-                        'GET /executions'
-                    ]
+                    'available_routes': AVAILABLE_ROUTES
                 }
             })
+        
+        return dispatch(route, event)
             
     except Exception as e:
-        print(f"Error in lambda_handler: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        log.error('lambda_handler failed', error=str(e), exc_info=True)
         return response(500, {
             'message': 'Internal server error',
             'error': str(e),
             'traceback': traceback.format_exc()
-        })
\ No newline at end of file
+        })
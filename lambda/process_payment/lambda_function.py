@@ -1,20 +1,24 @@
-import json
 import random
 import time
+import structured_log
+import instrumentation
 
+log = structured_log.get_logger('process_payment')
+
+@log.wrap_handler('paymentStatus', 'transaction_id')
+@instrumentation.instrument_handler('process_payment')
 def lambda_handler(event, context):
     """
     Simulate payment processing
     """
     try:
-        print(f"=== PAYMENT PROCESSING START ===")
-        print(f"Event received: {json.dumps(event, indent=2)}")
+        log.payload('event', event)
         
         # Extract data
         order_id = event.get('order_id')
         total_amount = event.get('total_amount', 0)
         
-        print(f"Processing payment - Order ID: {order_id}, Amount: {total_amount}")
+        log.set(order_id=order_id, amount=total_amount)
         
         if not order_id:
             return {
@@ -48,19 +52,14 @@ def lambda_handler(event, context):
             'timestamp': current_time
         }
         
-        print(f"=== PAYMENT PROCESSING END ===")
-        print(f"Returning response: {json.dumps(response, indent=2)}")
         return response
         
     except Exception as e:
-        print(f"Error processing payment: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        log.error('process_payment failed', error=str(e), exc_info=True)
         
         error_response = {
             'paymentStatus': 'error',  # PERHATIKAN: camelCase
             'message': f'Payment error: {str(e)}',
             'timestamp': int(time.time())
         }
-        print(f"Returning error response: {json.dumps(error_response, indent=2)}")
         return error_response
\ No newline at end of file
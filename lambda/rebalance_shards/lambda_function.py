@@ -0,0 +1,96 @@
+import os
+import db_pool
+import stock_shards
+import structured_log
+import instrumentation
+
+# Produk yang direbalance per invocation terjadwal
+REBALANCE_BATCH_SIZE = int(os.environ.get('REBALANCE_BATCH_SIZE', 100))
+
+log = structured_log.get_logger('rebalance_shards')
+
+def get_db_connection():
+    # Pinjam koneksi dari pool (dipakai ulang antar warm invocation)
+    return db_pool.get_connection()
+
+def release_db_connection(conn):
+    db_pool.release_connection(conn)
+
+def rebalance_all(cur, conn):
+    """
+    Ratakan shard semua produk sharded. Satu transaksi per produk supaya
+    lock shard tidak ditahan lama dan decrement lain tetap jalan.
+    """
+    cur.execute("""
+        SELECT product_id
+        FROM inventory
+        WHERE stock_shards > 0
+        ORDER BY product_id
+        LIMIT %s
+    """, (REBALANCE_BATCH_SIZE,))
+    product_ids = [row[0] for row in cur.fetchall()]
+    conn.commit()
+
+    results = {}
+    for product_id in product_ids:
+        results[product_id] = stock_shards.rebalance(cur, product_id)
+        conn.commit()
+    return results
+
+@log.wrap_handler('status', 'action', 'product_id', 'stock_quantity')
+@instrumentation.instrument_handler('rebalance_shards')
+def lambda_handler(event, context):
+    """
+    Kelola sharded stock counter.
+    - Tanpa action (EventBridge schedule): rebalance semua produk sharded
+    - {"action": "enable", "product_id": "...", "shards": 8}
+    - {"action": "disable", "product_id": "..."}
+    - {"action": "add_stock", "product_id": "...", "quantity": 100}
+    - {"action": "rebalance", "product_id": "..."}
+    """
+    event = event or {}
+    action = event.get('action', 'rebalance_all')
+    product_id = event.get('product_id')
+    log.set(action=action, product_id=product_id)
+
+    if action != 'rebalance_all' and not product_id:
+        return {'status': 'error', 'message': 'product_id is required'}
+
+    conn = get_db_connection()
+    cur = conn.cursor()
+
+    try:
+        if action == 'rebalance_all':
+            results = rebalance_all(cur, conn)
+            log.set(rebalanced=len(results))
+            return {'status': 'success', 'rebalanced': results}
+
+        if action == 'enable':
+            total = stock_shards.enable(cur, product_id, int(event.get('shards', 8)))
+        elif action == 'disable':
+            total = stock_shards.disable(cur, product_id)
+        elif action == 'add_stock':
+            total = stock_shards.add_stock(cur, product_id, int(event.get('quantity', 0)))
+        elif action == 'rebalance':
+            total = stock_shards.rebalance(cur, product_id)
+        else:
+            return {'status': 'error', 'message': f'Unknown action: {action}'}
+
+        conn.commit()
+        return {
+            'status': 'success',
+            'action': action,
+            'product_id': product_id,
+            'stock_quantity': total
+        }
+
+    except ValueError as e:
+        conn.rollback()
+        return {'status': 'error', 'message': str(e)}
+    except Exception as e:
+        conn.rollback()
+        log.error('manage stock shards failed', error=str(e), exc_info=True)
+        return {'status': 'error', 'message': str(e)}
+    finally:
+        cur.close()
+        release_db_connection(conn)
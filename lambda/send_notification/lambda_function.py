@@ -1,22 +1,27 @@
 import json
 import os
-import boto3
 from datetime import datetime
+import structured_log
+import instrumentation
+import aws_clients
 
 # ==============================
 # AWS CLIENT
 # ==============================
-sns_client = boto3.client("sns")
+sns_client = aws_clients.lazy("sns")
 SNS_TOPIC_ARN = os.environ.get("SNS_TOPIC_ARN")
 
+log = structured_log.get_logger("send_notification")
+
+@log.wrap_handler("status", "order_id", "notification_type", "message_id")
+@instrumentation.instrument_handler("send_notification")
 def lambda_handler(event, context):
     """
     Send notifications via SNS
     Event source: AWS Step Functions
     """
 
-    print("📩 Incoming event:")
-    print(json.dumps(event, indent=2))
+    log.payload("event", event)
 
     try:
         # ==============================
@@ -111,8 +116,7 @@ Immediate investigation is required.
             Subject=subject,
             Message=message.strip()
         )
-
-        print("✅ SNS message sent:", response["MessageId"])
+        log.set(message_id=response["MessageId"])
 
         return {
             "status": "success",
@@ -123,7 +127,7 @@ Immediate investigation is required.
         }
 
     except Exception as e:
-        print("❌ Error sending notification:", str(e))
+        log.error("send notification failed", error=str(e), exc_info=True)
 
         # IMPORTANT:
         # Jangan raise exception supaya Step Function tidak FAILED total
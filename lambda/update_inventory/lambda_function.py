@@ -1,28 +1,225 @@
 import json
 import os
-import psycopg2
-import boto3
-from datetime import datetime
+import db_pool
+import schema_cache
+import stock_shards
+import structured_log
+import time
+from datetime import datetime, timedelta
+from psycopg2.extras import execute_values
+import instrumentation
+import aws_clients
 
-# Environment variables
-DB_HOST = os.environ.get('DB_HOST')
-DB_NAME = os.environ.get('DB_NAME')
-DB_USER = os.environ.get('DB_USER')
-DB_PASSWORD = os.environ.get('DB_PASSWORD')
+# Threshold low-stock kalau kolom inventory.reorder_point belum ada
+DEFAULT_REORDER_POINT = 10
+# Alert LowStock untuk produk yang sama tidak dikirim ulang dalam window ini
+LOW_STOCK_DEDUP_SECONDS = int(os.environ.get('LOW_STOCK_DEDUP_SECONDS', 300))
+# put_events menerima maksimal 10 entry per call
+PUT_EVENTS_BATCH_SIZE = 10
+PUT_EVENTS_MAX_ATTEMPTS = int(os.environ.get('PUT_EVENTS_MAX_ATTEMPTS', 3))
 
-eventbridge = boto3.client('events')
+log = structured_log.get_logger('update_inventory')
+
+eventbridge = aws_clients.lazy('events')
 
 def get_db_connection():
-    return psycopg2.connect(
-        host=DB_HOST,
-        database=DB_NAME,
-        user=DB_USER,
-        password=DB_PASSWORD
-    )
+    # Pinjam koneksi dari pool (dipakai ulang antar warm invocation)
+    return db_pool.get_connection()
+
+def release_db_connection(conn):
+    db_pool.release_connection(conn)
+
+def reserve_stock(cur, order_id, quantities=None):
+    """
+    Kurangi stok semua produk dalam satu statement (satu round trip):
+    - quantities None: item dibaca dari order_items di CTE yang sama
+    - row lock diambil berurutan berdasarkan product_id, jadi dua order dengan
+      produk yang sama tidak bisa saling deadlock
+    - lock-nya FOR NO KEY UPDATE (product_id tidak berubah), jadi tidak
+      bentrok dengan FK check (FOR KEY SHARE) dari INSERT order_items
+    - UPDATE hanya mengenai produk yang stoknya cukup (stock_quantity >= qty)
+    - status order diubah ke 'processing' di statement yang sama
+    Produk sharded (stock_shards > 0) tidak dikunci di sini, hanya dikembalikan
+    supaya caller menguranginya lewat stock_shards.decrement().
+    Caller wajib rollback kalau ada baris non-sharded dengan new_stock NULL (stok kurang).
+    Returns list of (product_id, product_name, current_stock, quantity, new_stock, stock_shards, reorder_point)
+    """
+    product_ids = sorted(quantities or ())
+    now = datetime.now()
+    if quantities is None:
+        requested = """
+            SELECT product_id, SUM(quantity)::int AS quantity
+            FROM order_items
+            WHERE order_id = %(order_id)s
+            GROUP BY product_id
+        """
+    else:
+        requested = """
+            SELECT product_id, quantity
+            FROM unnest(%(product_ids)s::varchar[], %(quantities)s::int[]) AS r (product_id, quantity)
+        """
+    # Database lama tanpa kolom reorder_point memakai threshold default 10
+    reorder_point = 'i.reorder_point'
+    if not schema_cache.has_column(cur, 'inventory', 'reorder_point'):
+        reorder_point = str(DEFAULT_REORDER_POINT)
+    unsharded_only = ''
+    sharded_rows = ''
+    if schema_cache.has_column(cur, 'inventory', 'stock_shards'):
+        unsharded_only = 'WHERE i.stock_shards = 0'
+        sharded_rows = f"""
+        UNION ALL
+        SELECT i.product_id, i.product_name, NULL, req.quantity, NULL, i.stock_shards, {reorder_point}
+        FROM inventory i
+        JOIN req ON req.product_id = i.product_id
+        WHERE i.stock_shards > 0
+        """
+    
+    cur.execute(f"""
+        WITH req AS (
+            {requested}
+        ),
+        locked AS (
+            SELECT i.product_id, i.product_name, i.stock_quantity, req.quantity,
+                   {reorder_point} AS reorder_point
+            FROM inventory i
+            JOIN req ON req.product_id = i.product_id
+            {unsharded_only}
+            ORDER BY i.product_id
+            FOR NO KEY UPDATE OF i
+        ),
+        decremented AS (
+            UPDATE inventory i
+            SET stock_quantity = i.stock_quantity - l.quantity,
+                updated_at = %(now)s
+            FROM locked l
+            WHERE i.product_id = l.product_id
+            AND i.stock_quantity >= l.quantity
+            RETURNING i.product_id, i.stock_quantity AS new_stock
+        ),
+        order_update AS (
+            UPDATE orders
+            SET status = 'processing', updated_at = %(now)s
+            WHERE order_id = %(order_id)s
+            RETURNING order_id
+        )
+        SELECT l.product_id, l.product_name, l.stock_quantity, l.quantity, d.new_stock, 0 AS stock_shards,
+               l.reorder_point
+        FROM locked l
+        LEFT JOIN decremented d ON d.product_id = l.product_id
+        {sharded_rows}
+        ORDER BY 1
+    """, {
+        'product_ids': product_ids,
+        'quantities': [quantities[product_id] for product_id in product_ids],
+        'now': now,
+        'order_id': order_id
+    })
+    return cur.fetchall()
+
+def claim_low_stock_alerts(cur, conn, alerts):
+    """
+    Dedup alert lintas invocation/container lewat tabel low_stock_alerts:
+    klaim hanya berhasil kalau alert terakhir produk itu lebih lama dari
+    LOW_STOCK_DEDUP_SECONDS (atau belum pernah ada).
+    Dijalankan di transaksi pendek sendiri setelah update stok commit:
+    UPDATE dengan WHERE yang false tidak mengunci baris, jadi order-order
+    untuk SKU yang sudah low-stock tidak antri di satu baris low_stock_alerts
+    selama transaksi stok berjalan.
+    Returns alert yang boleh dikirim.
+    """
+    if not alerts or not schema_cache.has_column(cur, 'low_stock_alerts', 'last_sent_at'):
+        return alerts
+    
+    now = datetime.now()
+    # Urut product_id supaya lock baris low_stock_alerts tidak saling deadlock
+    product_ids = sorted({alert['product_id'] for alert in alerts})
+    cur.execute("""
+        WITH refreshed AS (
+            UPDATE low_stock_alerts
+            SET last_sent_at = %(now)s
+            WHERE product_id = ANY(%(product_ids)s)
+            AND last_sent_at < %(cutoff)s
+            RETURNING product_id
+        ),
+        inserted AS (
+            INSERT INTO low_stock_alerts (product_id, last_sent_at)
+            SELECT unnest(%(product_ids)s::varchar[]), %(now)s
+            ON CONFLICT (product_id) DO NOTHING
+            RETURNING product_id
+        )
+        SELECT product_id FROM refreshed
+        UNION
+        SELECT product_id FROM inserted
+    """, {
+        'product_ids': product_ids,
+        'now': now,
+        'cutoff': now - timedelta(seconds=LOW_STOCK_DEDUP_SECONDS)
+    })
+    claimed = {row[0] for row in cur.fetchall()}
+    conn.commit()
+    return [alert for alert in alerts if alert['product_id'] in claimed]
+
+def release_low_stock_alerts(cur, conn, alerts):
+    """Alert yang gagal dikirim dibuka lagi supaya invocation berikutnya mencoba ulang"""
+    if not alerts or not schema_cache.has_column(cur, 'low_stock_alerts', 'last_sent_at'):
+        return
+    cur.execute("""
+        DELETE FROM low_stock_alerts
+        WHERE product_id = ANY(%s)
+    """, ([alert['product_id'] for alert in alerts],))
+    conn.commit()
+
+def publish_low_stock_events(alerts):
+    """
+    Kirim alert LowStock dalam batch put_events (maks 10 entry per call).
+    Entry yang gagal (FailedEntryCount > 0) dikirim ulang dengan backoff.
+    Returns alert yang tetap gagal setelah PUT_EVENTS_MAX_ATTEMPTS.
+    """
+    timestamp = datetime.now().isoformat()
+    pending = [(alert, {
+        'Source': 'order.system',
+        'DetailType': 'LowStock',
+        'Detail': json.dumps({
+            'product_id': alert['product_id'],
+            'product_name': alert['product_name'],
+            'current_stock': alert['current_stock'],
+            'reorder_point': alert['reorder_point'],
+            'timestamp': timestamp
+        })
+    }) for alert in alerts]
+    
+    for attempt in range(PUT_EVENTS_MAX_ATTEMPTS):
+        if attempt:
+            time.sleep(0.1 * (2 ** attempt))
+        
+        failed = []
+        for start in range(0, len(pending), PUT_EVENTS_BATCH_SIZE):
+            batch = pending[start:start + PUT_EVENTS_BATCH_SIZE]
+            try:
+                result = eventbridge.put_events(Entries=[entry for _, entry in batch])
+            except Exception as e:
+                log.warning('put_events failed', error=str(e), exc_info=True)
+                failed.extend(batch)
+                continue
+            
+            if result.get('FailedEntryCount'):
+                # Entries di response sejajar dengan urutan request
+                for item, outcome in zip(batch, result['Entries']):
+                    if outcome.get('ErrorCode'):
+                        log.warning('low stock event failed', product_id=item[0]['product_id'],
+                                    error_code=outcome.get('ErrorCode'))
+                        failed.append(item)
+        
+        pending = failed
+        if not pending:
+            break
+    
+    return [alert for alert, _ in pending]
 
+@log.wrap_handler('inventoryStatus')
+@instrumentation.instrument_handler('update_inventory')
 def lambda_handler(event, context):
-    print(f"=== INVENTORY UPDATE START ===")
-    print(f"Event received: {json.dumps(event, indent=2)}")
+    log.payload('event', event)
     
     # Extract data - handle nested structure
     order_id = event.get('order_id')
@@ -39,7 +236,7 @@ def lambda_handler(event, context):
         transaction_id = event.get('transaction_id')
         items = event.get('items', [])
     
-    print(f"Extracted - order_id: {order_id}, transaction_id: {transaction_id}, items count: {len(items)}")
+    log.set(order_id=order_id, transaction_id=transaction_id, items=len(items))
     
     if not order_id:
         return {
@@ -49,95 +246,77 @@ def lambda_handler(event, context):
 
     order_id = str(order_id)
     
-    # If items are empty, fetch from database
-    if not items:
-        try:
-            print(f"Fetching items from database for order_id: {order_id}")
-            conn = get_db_connection()
-            cur = conn.cursor()
-            
-            cur.execute("""
-                SELECT oi.product_id, oi.quantity, i.product_name, i.price
-                FROM order_items oi
-                JOIN inventory i ON oi.product_id = i.product_id
-                WHERE oi.order_id = %s
-            """, (order_id,))
-            
-            items = []
-            for row in cur.fetchall():
-                items.append({
-                    'productId': row[0],
-                    'productName': row[2],
-                    'quantity': row[1],
-                    'price': float(row[3])
-                })
-            
-            cur.close()
-            conn.close()
-            
-            print(f"Fetched {len(items)} items from database")
-            
-            if not items:
-                return {
-                    'inventoryStatus': 'failed',
-                    'message': 'No items found for this order'
-                }
-        except Exception as e:
-            print(f"Error fetching order items: {str(e)}")
-            return {
-                'inventoryStatus': 'failed',
-                'message': f'Error fetching items: {str(e)}'
-            }
-    
     conn = get_db_connection()
     cur = conn.cursor()
     
     try:
+        # Gabungkan item dengan product_id yang sama.
+        # Kalau input workflow tidak membawa items, reserve_stock membaca
+        # order_items langsung di statement yang sama (tanpa koneksi kedua)
+        quantities = None
+        if items:
+            quantities = {}
+            for item in items:
+                product_id = item.get('productId')
+                if not product_id:
+                    log.warning('item without productId skipped', item=item)
+                    continue
+                quantities[product_id] = quantities.get(product_id, 0) + item.get('quantity', 0)
+        else:
+            log.debug('no items in input, reading order_items', order_id=order_id)
+        
+        reserved = reserve_stock(cur, order_id, quantities)
+        
+        if quantities is None and not reserved:
+            conn.rollback()
+            return {
+                'inventoryStatus': 'failed',
+                'message': 'No items found for this order'
+            }
+        
+        found = {row[0] for row in reserved}
+        missing = [product_id for product_id in quantities or () if product_id not in found]
+        if missing:
+            log.warning('products not found in inventory', product_ids=missing)
+        
+        # Baris non-sharded yang tidak ter-update berarti stoknya kurang
+        rows = [row[:5] + row[6:] for row in reserved if not row[5]]
+        short_items = [row for row in rows if row[4] is None]
+        
+        # Produk flash-sale: kurangi salah satu shard, tanpa row lock inventory
+        if not short_items:
+            for product_id, product_name, _, quantity, _, shard_count, reorder_point in reserved:
+                if not shard_count:
+                    continue
+                current_stock, new_stock = stock_shards.decrement(cur, product_id, quantity, shard_count)
+                row = (product_id, product_name, current_stock, quantity, new_stock, reorder_point)
+                rows.append(row)
+                if new_stock is None:
+                    short_items.append(row)
+                    break
+        
+        # Ada stok yang kurang: batalkan semuanya
+        if short_items:
+            conn.rollback()
+            error_msg = '; '.join(
+                f'Insufficient stock for product {product_name}. Available: {current_stock}, Requested: {quantity}'
+                for _, product_name, current_stock, quantity, _, _ in short_items
+            )
+            log.set(insufficient=[product_id for product_id, *_ in short_items])
+            return {
+                'inventoryStatus': 'failed',
+                'message': error_msg,
+                'insufficient_items': [{
+                    'product_id': product_id,
+                    'product_name': product_name,
+                    'available': current_stock,
+                    'requested': quantity
+                } for product_id, product_name, current_stock, quantity, _, _ in short_items]
+            }
+        
         updated_products = []
         low_stock_alerts = []
-        
-        for item in items:
-            product_id = item.get('productId')
-            quantity = item.get('quantity', 0)
-            
-            if not product_id:
-                print(f"Product ID not found for item: {item}")
-                continue
-            
-            # Check current stock
-            cur.execute("""
-                SELECT stock_quantity, product_name
-                FROM inventory
-                WHERE product_id = %s
-                FOR UPDATE
-            """, (product_id,))
-            
-            result = cur.fetchone()
-            if not result:
-                print(f"Product {product_id} not found in inventory")
-                continue
-            
-            current_stock, product_name = result
-            
-            # Check if sufficient stock
-            if current_stock < quantity:
-                conn.rollback()
-                error_msg = f'Insufficient stock for product {product_name}. Available: {current_stock}, Requested: {quantity}'
-                print(error_msg)
-                return {
-                    'inventoryStatus': 'failed',
-                    'message': error_msg
-                }
-            
-            # Update inventory
-            new_stock = current_stock - quantity
-            cur.execute("""
-                UPDATE inventory
-                SET stock_quantity = %s,
-                    updated_at = %s
-                WHERE product_id = %s
-            """, (new_stock, datetime.now(), product_id))
-            
+        for product_id, product_name, current_stock, quantity, new_stock, reorder_point in rows:
             updated_products.append({
                 'product_id': product_id,
                 'product_name': product_name,
@@ -146,43 +325,35 @@ def lambda_handler(event, context):
                 'quantity_sold': quantity
             })
             
-            # Check for low stock
-            if new_stock <= 10:
+            # Check for low stock (threshold per produk)
+            if new_stock <= reorder_point:
                 low_stock_alerts.append({
                     'product_id': product_id,
                     'product_name': product_name,
-                    'current_stock': new_stock
+                    'current_stock': new_stock,
+                    'reorder_point': reorder_point
                 })
         
-        # Update order status
-        cur.execute("""
-            UPDATE orders
-            SET status = 'processing', updated_at = %s
-            WHERE order_id = %s
-        """, (datetime.now(), str(order_id)))
-        
         conn.commit()
         
-        # Send low stock events
+        # Klaim dedup di transaksi terpisah setelah stok commit. Kalau klaim gagal,
+        # stok tetap tersimpan; alert-nya dilewati dan produk tetap tertangkap detects_lowstock
+        alerts_to_send = []
         if low_stock_alerts:
-            for alert in low_stock_alerts:
-                try:
-                    eventbridge.put_events(
-                        Entries=[{
-                            'Source': 'order.system',
-                            'DetailType': 'LowStock',
-                            'Detail': json.dumps({
-                                'product_id': alert['product_id'],
-                                'product_name': alert['product_name'],
-                                'current_stock': alert['current_stock'],
-                                'timestamp': datetime.now().isoformat()
-                            })
-                        }]
-                    )
-                except Exception as e:
-                    print(f"Error sending low stock event: {str(e)}")
+            try:
+                alerts_to_send = claim_low_stock_alerts(cur, conn, low_stock_alerts)
+            except Exception as e:
+                conn.rollback()
+                log.warning('claiming low stock alerts failed', error=str(e), exc_info=True)
+        
+        # Send low stock events
+        if alerts_to_send:
+            failed_alerts = publish_low_stock_events(alerts_to_send)
+            if failed_alerts:
+                release_low_stock_alerts(cur, conn, failed_alerts)
+            log.set(alerts_failed=len(failed_alerts))
         
-        print(f"Inventory updated successfully for order {order_id}")
+        log.set(low_stock_alerts=len(low_stock_alerts), alerts_claimed=len(alerts_to_send))
         
         return {
             'inventoryStatus': 'success',
@@ -193,13 +364,11 @@ def lambda_handler(event, context):
         
     except Exception as e:
         conn.rollback()
-        print(f"Error updating inventory: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        log.error('update_inventory failed', order_id=order_id, error=str(e), exc_info=True)
         return {
             'inventoryStatus': 'failed',
             'message': f'Inventory update error: {str(e)}'
         }
     finally:
         cur.close()
-        conn.close()
\ No newline at end of file
+        release_db_connection(conn)
\ No newline at end of file
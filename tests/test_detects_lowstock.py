@@ -0,0 +1,69 @@
+import pytest
+
+import stock_shards
+from conftest import load_lambda
+
+detects_lowstock = load_lambda('detects_lowstock')
+
+
+class StubSNS:
+    def __init__(self):
+        self.messages = []
+
+    def publish(self, **kwargs):
+        self.messages.append(kwargs['Message'])
+        return {'MessageId': str(len(self.messages))}
+
+
+@pytest.fixture
+def scan(db, monkeypatch):
+    sns = StubSNS()
+    monkeypatch.setattr(detects_lowstock, 'sns_client', sns)
+    monkeypatch.setattr(detects_lowstock, 'get_db_connection', lambda: db.conn)
+    monkeypatch.setattr(detects_lowstock, 'release_db_connection', lambda conn: None)
+
+    def run():
+        result = detects_lowstock.lambda_handler({}, None)
+        assert result['status'] == 'stock detection finished', result
+        return [p['product_id'] for p in result['products']]
+
+    return run
+
+
+def set_stock(conn, product_id, stock_quantity):
+    cur = conn.cursor()
+    cur.execute("""
+        UPDATE inventory SET stock_quantity = %s, updated_at = CURRENT_TIMESTAMP
+        WHERE product_id = %s
+    """, (stock_quantity, product_id))
+    conn.commit()
+
+
+def test_restocked_product_that_falls_again_between_runs_is_reported_again(db, scan):
+    set_stock(db.conn, 'PROD001', 5)
+    assert scan() == ['PROD001']
+    assert scan() == []
+
+    # Restock lalu habis lagi sebelum run berikutnya
+    set_stock(db.conn, 'PROD001', 50)
+    set_stock(db.conn, 'PROD001', 3)
+
+    assert scan() == ['PROD001']
+
+
+def test_rebalance_keeps_marker_of_sharded_product_still_low(db, scan):
+    cur = db.conn.cursor()
+    stock_shards.enable(cur, 'PROD001', 4)
+    db.conn.commit()
+    stock_shards.decrement(cur, 'PROD001', 95, 4)
+    db.conn.commit()
+    assert scan() == ['PROD001']
+
+    stock_shards.rebalance(cur, 'PROD001')
+    db.conn.commit()
+    assert scan() == []
+
+    stock_shards.add_stock(cur, 'PROD001', 40)
+    stock_shards.decrement(cur, 'PROD001', 42, 4)
+    db.conn.commit()
+    assert scan() == ['PROD001']
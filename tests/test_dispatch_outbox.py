@@ -0,0 +1,148 @@
+import json
+from datetime import datetime, timedelta
+
+import boto3
+import pytest
+from moto import mock_aws
+
+from conftest import load_lambda
+
+dispatch_outbox = load_lambda('dispatch_outbox')
+
+PASS_DEFINITION = json.dumps({'StartAt': 'Done', 'States': {'Done': {'Type': 'Pass', 'End': True}}})
+
+
+class FailingStepFunctions:
+    class exceptions:
+        class ExecutionAlreadyExists(Exception):
+            pass
+
+    def start_execution(self, **kwargs):
+        raise RuntimeError('ThrottlingException: Rate exceeded')
+
+
+def outbox_row(conn, order_id):
+    cur = conn.cursor()
+    cur.execute("""
+        SELECT status, attempts, next_attempt_at, last_error
+        FROM order_outbox
+        WHERE order_id = %s
+    """, (order_id,))
+    row = cur.fetchone()
+    conn.commit()
+    return row
+
+
+@pytest.fixture
+def state_machine(monkeypatch):
+    with mock_aws():
+        client = boto3.client('stepfunctions')
+        arn = client.create_state_machine(
+            name='order-workflow',
+            definition=PASS_DEFINITION,
+            roleArn='arn:aws:iam::123456789012:role/order-workflow'
+        )['stateMachineArn']
+        monkeypatch.setattr(dispatch_outbox, 'STATE_MACHINE_ARN', arn)
+        yield client, arn
+
+
+def test_retry_delay_is_exponential_and_capped():
+    assert [dispatch_outbox.retry_delay(n) for n in (1, 2, 3, 4)] == [10, 20, 40, 80]
+    assert dispatch_outbox.retry_delay(50) == 900
+
+
+def test_claim_batch_leases_rows(db, make_outbox):
+    for order_id in ('ORD1', 'ORD2', 'ORD3'):
+        make_outbox(order_id)
+    cur = db.conn.cursor()
+
+    first = dispatch_outbox.claim_batch(cur, db.conn, 2)
+    second = dispatch_outbox.claim_batch(cur, db.conn, 2)
+    third = dispatch_outbox.claim_batch(cur, db.conn, 2)
+
+    assert len(first) == 2
+    assert [row[1] for row in second] == sorted({'ORD1', 'ORD2', 'ORD3'} - {row[1] for row in first})
+    # Semua baris sedang di-lease, tidak ada yang bisa diambil lagi
+    assert third == []
+    status, attempts, next_attempt_at, _ = outbox_row(db.conn, 'ORD1')
+    assert (status, attempts) == ('pending', 1)
+    assert next_attempt_at > datetime.now() + timedelta(seconds=dispatch_outbox.OUTBOX_LEASE_SECONDS - 10)
+
+
+def test_claim_batch_skips_rows_locked_by_another_dispatcher(db, make_outbox):
+    make_outbox('ORD1')
+    make_outbox('ORD2')
+    other = db.connect()
+    other_cur = other.cursor()
+    other_cur.execute("SELECT id FROM order_outbox WHERE order_id = 'ORD1' FOR UPDATE")
+
+    cur = db.conn.cursor()
+    cur.execute("SET lock_timeout = '1s'")
+    rows = dispatch_outbox.claim_batch(cur, db.conn, 10)
+
+    assert [row[1] for row in rows] == ['ORD2']
+    other.rollback()
+    assert [row[1] for row in dispatch_outbox.claim_batch(cur, db.conn, 10)] == ['ORD1']
+
+
+def test_start_execution_already_exists_is_success(state_machine):
+    client, arn = state_machine
+    first = client.start_execution(stateMachineArn=arn, name='order-ORD1', input='{}')['executionArn']
+    client.stop_execution(executionArn=first)
+
+    execution_arn = dispatch_outbox.start_execution(client, 'ORD1', {'orderId': 'ORD1'})
+
+    assert execution_arn == first
+
+
+def test_dispatch_batch_marks_already_started_order_dispatched(db, make_outbox, state_machine, monkeypatch):
+    client, arn = state_machine
+    monkeypatch.setattr(dispatch_outbox, 'S3_BUCKET', None)
+    make_outbox('ORD1')
+    make_outbox('ORD2')
+    # ORD1 sudah dijalankan inline oleh create_order sebelum baris outbox-nya ditandai
+    started = client.start_execution(stateMachineArn=arn, name='order-ORD1', input='{}')['executionArn']
+    client.stop_execution(executionArn=started)
+
+    result = dispatch_outbox.dispatch_batch(db.conn.cursor(), db.conn, client)
+
+    assert result == (2, 2, 0)
+    assert outbox_row(db.conn, 'ORD1')[0] == 'dispatched'
+    assert outbox_row(db.conn, 'ORD2')[0] == 'dispatched'
+    executions = client.list_executions(stateMachineArn=arn)['executions']
+    assert sorted(e['name'] for e in executions) == ['order-ORD1', 'order-ORD2']
+
+
+def test_failed_start_is_retried_with_backoff(db, make_outbox, monkeypatch):
+    monkeypatch.setattr(dispatch_outbox, 'S3_BUCKET', None)
+    make_outbox('ORD1')
+    cur = db.conn.cursor()
+
+    result = dispatch_outbox.dispatch_batch(cur, db.conn, FailingStepFunctions())
+
+    assert result == (1, 0, 1)
+    status, attempts, next_attempt_at, last_error = outbox_row(db.conn, 'ORD1')
+    assert (status, attempts) == ('pending', 1)
+    assert 'Rate exceeded' in last_error
+    delay = (next_attempt_at - datetime.now()).total_seconds()
+    assert 0 < delay <= dispatch_outbox.retry_delay(1)
+    # Belum waktunya retry
+    assert dispatch_outbox.claim_batch(cur, db.conn, 10) == []
+
+
+def test_rows_past_max_attempts_keep_retrying_and_are_reported(db, make_outbox, monkeypatch):
+    monkeypatch.setattr(dispatch_outbox, 'S3_BUCKET', None)
+    monkeypatch.setattr(dispatch_outbox, 'sfn_client', FailingStepFunctions())
+    monkeypatch.setattr(dispatch_outbox, 'get_db_connection', lambda: db.conn)
+    monkeypatch.setattr(dispatch_outbox, 'release_db_connection', lambda conn: None)
+    make_outbox('ORD1', attempts=dispatch_outbox.OUTBOX_MAX_ATTEMPTS + 5)
+
+    result = dispatch_outbox.lambda_handler({}, None)
+
+    assert result['status'] == 'success'
+    assert result['failed'] == 1
+    assert result['stuck'] == 1
+    status, _, next_attempt_at, _ = outbox_row(db.conn, 'ORD1')
+    # Tetap di antrian dengan backoff maksimal, bukan status terminal
+    assert status == 'pending'
+    assert (next_attempt_at - datetime.now()).total_seconds() > 800
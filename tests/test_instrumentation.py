@@ -0,0 +1,53 @@
+import boto3
+import pytest
+from botocore.config import Config
+from moto import mock_aws
+
+import instrumentation
+
+
+@pytest.fixture
+def invocation(monkeypatch):
+    """Invocation aktif tanpa lewat instrument_handler (INSTRUMENTATION_MODE=off di test)"""
+    monkeypatch.setattr(instrumentation, 'INSTRUMENTATION_MODE', 'emf')
+    current = instrumentation.Invocation('test')
+    monkeypatch.setattr(instrumentation, '_invocation', current)
+    monkeypatch.setattr(instrumentation._local, 'stack', [], raising=False)
+    return current
+
+
+def test_successful_call_is_counted(invocation):
+    with mock_aws():
+        s3 = instrumentation.instrument_client(boto3.client('s3'))
+        s3.create_bucket(Bucket='test-bucket')
+
+    assert invocation.counters['AwsCalls'] == 1
+    assert invocation.counters['AwsErrors'] == 0
+    assert invocation.root.children[0].name == 'aws.s3.CreateBucket'
+
+
+def test_api_error_response_is_counted(invocation):
+    with mock_aws():
+        s3 = instrumentation.instrument_client(boto3.client('s3'))
+        with pytest.raises(s3.exceptions.NoSuchBucket):
+            s3.get_object(Bucket='missing-bucket', Key='order.json')
+
+    assert invocation.counters['AwsCalls'] == 1
+    assert invocation.counters['AwsErrors'] == 1
+
+
+def test_connection_error_is_counted(invocation):
+    s3 = instrumentation.instrument_client(boto3.client(
+        's3',
+        endpoint_url='http://127.0.0.1:9',
+        config=Config(retries={'total_max_attempts': 1}, connect_timeout=1)
+    ))
+
+    with pytest.raises(Exception) as raised:
+        s3.put_object(Bucket='test-bucket', Key='order.json', Body=b'{}')
+
+    # Error asli botocore yang sampai ke caller, bukan TypeError dari hook
+    assert not isinstance(raised.value, TypeError)
+    assert invocation.counters['AwsCalls'] == 1
+    assert invocation.counters['AwsErrors'] == 1
+    assert invocation.root.children[0].name == 'aws.s3.PutObject'
@@ -0,0 +1,216 @@
+import json
+from concurrent.futures import Future
+from datetime import datetime, timedelta
+
+import pytest
+
+import schema_cache
+from conftest import StubS3, load_lambda, outbox_payload
+
+order_management = load_lambda('order_management')
+dispatch_outbox = load_lambda('dispatch_outbox')
+
+
+class RecordingCursor:
+    def __init__(self):
+        self.queries = []
+        self.rowcount = 0
+
+    def execute(self, query, params=None):
+        self.queries.append((query, params))
+
+
+class RecordingConnection:
+    def __init__(self):
+        self.commits = 0
+        self.rollbacks = 0
+
+    def commit(self):
+        self.commits += 1
+
+    def rollback(self):
+        self.rollbacks += 1
+
+
+def failed_future(error):
+    future = Future()
+    future.set_exception(error)
+    return future
+
+
+@pytest.fixture
+def use_db(db, monkeypatch):
+    """order_management memakai koneksi test, bukan pool"""
+    monkeypatch.setattr(order_management, 'get_db_connection', lambda: db.conn)
+    monkeypatch.setattr(order_management, 'release_db_connection', lambda conn: conn.rollback())
+    return db
+
+
+def archived_at(conn, order_id):
+    cur = conn.cursor()
+    cur.execute("SELECT archived_at FROM orders WHERE order_id = %s", (order_id,))
+    value = cur.fetchone()[0]
+    conn.commit()
+    return value
+
+
+def test_finish_order_archive_failed_put_leaves_order_unarchived(monkeypatch):
+    monkeypatch.setattr(schema_cache, 'has_column', lambda cur, table, column: True)
+    cur, conn = RecordingCursor(), RecordingConnection()
+
+    archived = order_management.finish_order_archive(cur, conn, 'ORD1', failed_future(RuntimeError('S3 down')))
+
+    assert archived is False
+    assert cur.queries == []
+    assert conn.commits == 0
+
+
+def test_finish_order_archive_timeout_leaves_order_unarchived(monkeypatch):
+    monkeypatch.setattr(schema_cache, 'has_column', lambda cur, table, column: True)
+    monkeypatch.setattr(order_management, 'ARCHIVE_TIMEOUT', 0.01)
+    cur, conn = RecordingCursor(), RecordingConnection()
+
+    # Future yang tidak pernah selesai = upload yang menggantung
+    archived = order_management.finish_order_archive(cur, conn, 'ORD1', Future())
+
+    assert archived is False
+    assert cur.queries == []
+
+
+def test_finish_order_archive_success_marks_order(monkeypatch):
+    monkeypatch.setattr(schema_cache, 'has_column', lambda cur, table, column: True)
+    cur, conn = RecordingCursor(), RecordingConnection()
+    future = Future()
+    future.set_result(None)
+
+    archived = order_management.finish_order_archive(cur, conn, 'ORD1', future)
+
+    assert archived is True
+    assert 'archived_at' in cur.queries[0][0]
+    assert cur.queries[0][1][1] == ['ORD1']
+    assert conn.commits == 1
+
+
+def test_reconcile_uploads_and_marks_unarchived_orders(use_db, make_order, monkeypatch):
+    old = datetime.now() - timedelta(minutes=10)
+    make_order('ORD-OLD', created_at=old, items=(('PROD001', 2, 10), ('PROD002', 1, 25.5)))
+    make_order('ORD-DONE', created_at=old, archived_at=old)
+    # Masih terlalu baru, create_order / dispatcher mungkin masih berjalan
+    make_order('ORD-NEW')
+    s3 = StubS3()
+    monkeypatch.setattr(order_management, 's3_client', s3)
+
+    result = order_management.reconcile_order_archives({'min_age_seconds': 300})
+
+    assert result['status'] == 'success'
+    assert result['archived'] == 1
+    assert list(s3.objects) == [('test-bucket', 'orders/ORD-OLD.json')]
+    body = json.loads(s3.objects[('test-bucket', 'orders/ORD-OLD.json')])
+    assert body['order_id'] == 'ORD-OLD'
+    assert body['items'] == [
+        {'product_id': 'PROD001', 'quantity': 2},
+        {'product_id': 'PROD002', 'quantity': 1}
+    ]
+    assert archived_at(use_db.conn, 'ORD-OLD') is not None
+    assert archived_at(use_db.conn, 'ORD-NEW') is None
+
+
+def test_reconcile_failed_upload_keeps_order_for_next_run(use_db, make_order, monkeypatch):
+    make_order('ORD-OLD', created_at=datetime.now() - timedelta(minutes=10))
+    monkeypatch.setattr(order_management, 's3_client', StubS3(error=RuntimeError('S3 down')))
+
+    result = order_management.reconcile_order_archives({'min_age_seconds': 300})
+
+    assert result['status'] == 'partial'
+    assert result['failed_order_ids'] == ['ORD-OLD']
+    assert archived_at(use_db.conn, 'ORD-OLD') is None
+
+    s3 = StubS3()
+    monkeypatch.setattr(order_management, 's3_client', s3)
+    result = order_management.reconcile_order_archives({'min_age_seconds': 300})
+
+    assert result['archived'] == 1
+    assert archived_at(use_db.conn, 'ORD-OLD') is not None
+
+
+def create_order_event():
+    return {'body': json.dumps({
+        'customer_id': 'CUST001',
+        'items': [{'product_id': 'PROD001', 'quantity': 2}]
+    })}
+
+
+def test_create_order_with_outbox_does_not_touch_s3(use_db, monkeypatch):
+    s3 = StubS3(error=AssertionError('create_order must not upload the archive'))
+    monkeypatch.setattr(order_management, 's3_client', s3)
+
+    resp = order_management.create_order(create_order_event())
+    body = json.loads(resp['body'])
+
+    assert resp['statusCode'] == 201
+    assert body['workflow_status'] == 'queued'
+    assert body['archived'] is False
+    assert archived_at(use_db.conn, body['order_id']) is None
+
+    cur = use_db.conn.cursor()
+    cur.execute("SELECT status, payload FROM order_outbox WHERE order_id = %s", (body['order_id'],))
+    status, payload = cur.fetchone()
+    assert status == 'pending'
+    # make_outbox membangun payload dengan helper yang sama
+    assert payload == outbox_payload(use_db.conn, body['order_id'])
+
+
+class StubStepFunctions:
+    class exceptions:
+        class ExecutionAlreadyExists(Exception):
+            pass
+
+    def start_execution(self, stateMachineArn, name, input):
+        return {'executionArn': f"{stateMachineArn.replace('stateMachine', 'execution')}:{name}"}
+
+
+def test_create_order_without_outbox_failed_put_returns_archived_false(use_db, monkeypatch):
+    cur = use_db.conn.cursor()
+    cur.execute("DROP TABLE order_outbox")
+    use_db.conn.commit()
+    schema_cache.invalidate()
+    monkeypatch.setattr(order_management, 's3_client', StubS3(error=RuntimeError('S3 down')))
+    monkeypatch.setattr(order_management, 'sfn_client', StubStepFunctions())
+
+    resp = order_management.create_order(create_order_event())
+    body = json.loads(resp['body'])
+
+    assert resp['statusCode'] == 201
+    assert body['workflow_status'] == 'started'
+    assert body['archived'] is False
+    assert archived_at(use_db.conn, body['order_id']) is None
+
+
+def test_dispatcher_archives_order_and_skips_archived(db, make_outbox, monkeypatch):
+    make_outbox('ORD1')
+    make_outbox('ORD2', archived_at=datetime.now())
+    cur = db.conn.cursor()
+    monkeypatch.setattr(dispatch_outbox, 'S3_BUCKET', 'test-bucket')
+    s3 = StubS3()
+
+    claimed, dispatched, failed = dispatch_outbox.dispatch_batch(cur, db.conn, StubStepFunctions(), s3=s3)
+
+    assert (claimed, dispatched, failed) == (2, 2, 0)
+    assert list(s3.objects) == [('test-bucket', 'orders/ORD1.json')]
+    assert json.loads(s3.objects[('test-bucket', 'orders/ORD1.json')])['items'] == [
+        {'product_id': 'PROD001', 'quantity': 2}
+    ]
+    assert archived_at(db.conn, 'ORD1') is not None
+
+
+def test_dispatcher_failed_archive_still_dispatches(db, make_outbox, monkeypatch):
+    make_outbox('ORD1')
+    cur = db.conn.cursor()
+    monkeypatch.setattr(dispatch_outbox, 'S3_BUCKET', 'test-bucket')
+
+    claimed, dispatched, failed = dispatch_outbox.dispatch_batch(
+        cur, db.conn, StubStepFunctions(), s3=StubS3(error=RuntimeError('S3 down'))
+    )
+
+    assert (claimed, dispatched, failed) == (1, 1, 0)
+    assert archived_at(db.conn, 'ORD1') is None
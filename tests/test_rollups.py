@@ -0,0 +1,61 @@
+from datetime import date
+
+
+def product_sales(conn, view):
+    cur = conn.cursor()
+    cur.execute(f"""
+        SELECT product_id, order_count, total_quantity, total_revenue
+        FROM {view}
+        WHERE stat_date = %s
+        ORDER BY product_id
+    """, (date.today(),))
+    rows = [(p, int(c), int(q), float(r)) for p, c, q, r in cur.fetchall()]
+    conn.commit()
+    return rows
+
+
+def insert_order(conn, order_id, items):
+    cur = conn.cursor()
+    cur.execute("""
+        INSERT INTO orders (order_id, customer_id, total_amount, status)
+        VALUES (%s, 'CUST001', 0, 'pending')
+    """, (order_id,))
+    for product_id, quantity, price in items:
+        cur.execute("""
+            INSERT INTO order_items (order_id, product_id, quantity, price)
+            VALUES (%s, %s, %s, %s)
+        """, (order_id, product_id, quantity, price))
+
+
+def test_same_product_orders_do_not_wait_on_rollup_row(db):
+    first, second = db.connect(), db.connect()
+    second.cursor().execute("SET lock_timeout = '1s'")
+
+    # Urutan produk terbalik: dengan upsert per baris ini menunggu first (atau deadlock)
+    insert_order(first, 'ORD1', [('PROD001', 1, 10), ('PROD002', 1, 25.5)])
+    insert_order(second, 'ORD2', [('PROD002', 2, 25.5), ('PROD001', 3, 10)])
+    second.commit()
+    first.commit()
+
+    assert product_sales(db.conn, 'product_sales_daily_live') == [
+        ('PROD001', 2, 4, 40.0),
+        ('PROD002', 2, 3, 76.5)
+    ]
+
+
+def test_compact_folds_product_deltas_into_rollup(db, make_order):
+    make_order('ORD1', items=(('PROD001', 2, 10), ('PROD002', 1, 25.5)))
+    make_order('ORD2', items=(('PROD001', 1, 10),))
+    cur = db.conn.cursor()
+    cur.execute("DELETE FROM orders WHERE order_id = 'ORD2'")
+    db.conn.commit()
+    live = product_sales(db.conn, 'product_sales_daily_live')
+
+    cur.execute("SELECT rollup_compact()")
+    db.conn.commit()
+
+    assert live == [('PROD001', 1, 2, 20.0), ('PROD002', 1, 1, 25.5)]
+    assert product_sales(db.conn, 'product_sales_daily') == live
+    assert product_sales(db.conn, 'product_sales_daily_live') == live
+    cur.execute("SELECT COUNT(*) FROM product_sales_daily_delta")
+    assert cur.fetchone()[0] == 0
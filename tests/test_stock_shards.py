@@ -0,0 +1,31 @@
+import pytest
+
+import stock_shards
+
+
+@pytest.fixture
+def sharded(db):
+    cur = db.conn.cursor()
+    stock_shards.enable(cur, 'PROD001', 4)
+    db.conn.commit()
+
+
+@pytest.mark.parametrize('operation', [
+    lambda cur: stock_shards.rebalance(cur, 'PROD001'),
+    lambda cur: stock_shards.add_stock(cur, 'PROD001', 10),
+    lambda cur: stock_shards.enable(cur, 'PROD001', 8),
+    lambda cur: stock_shards.disable(cur, 'PROD001'),
+], ids=['rebalance', 'add_stock', 'enable', 'disable'])
+def test_shard_maintenance_does_not_block_order_items_insert(db, sharded, make_order, operation):
+    other = db.connect()
+    operation(other.cursor())
+
+    # FK check INSERT order_items mengambil FOR KEY SHARE di baris inventory
+    db.conn.cursor().execute("SET lock_timeout = '1s'")
+    db.conn.commit()
+    make_order('ORD1', items=(('PROD001', 1, 10),))
+
+    other.commit()
+    cur = db.conn.cursor()
+    cur.execute("SELECT COUNT(*) FROM order_items WHERE product_id = 'PROD001'")
+    assert cur.fetchone()[0] == 1
@@ -0,0 +1,44 @@
+import json
+
+import structured_log
+
+
+def records(capsys):
+    return [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+
+
+def test_exc_info_is_one_json_record_with_traceback(capsys):
+    log = structured_log.StructuredLogger('test')
+    try:
+        raise RuntimeError('boom')
+    except RuntimeError as e:
+        log.error('failed', error=str(e), exc_info=True)
+
+    [record] = records(capsys)
+    assert record['msg'] == 'failed'
+    assert 'RuntimeError: boom' in record['traceback']
+
+
+def test_level_is_checked_through_enabled(capsys):
+    log = structured_log.StructuredLogger('test', level='WARNING')
+    log.debug('hidden')
+    log.info('hidden')
+    log.payload('event', {'a': 1})
+    log.warning('shown')
+
+    assert not log.enabled('INFO')
+    assert [r['msg'] for r in records(capsys)] == ['shown']
+
+
+def test_wrap_handler_writes_one_summary_line(capsys):
+    log = structured_log.StructuredLogger('test', sample_rate=0)
+
+    @log.wrap_handler('status')
+    def handler(event, context):
+        log.set(order_id='ORD1')
+        return {'status': 'success'}
+
+    handler({}, None)
+
+    [record] = records(capsys)
+    assert (record['msg'], record['order_id'], record['status']) == ('request', 'ORD1', 'success')
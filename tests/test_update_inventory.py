@@ -0,0 +1,82 @@
+import pytest
+
+from conftest import load_lambda
+
+update_inventory = load_lambda('update_inventory')
+
+
+class StubEventBridge:
+    def __init__(self):
+        self.entries = []
+
+    def put_events(self, Entries):
+        self.entries.extend(Entries)
+        return {'FailedEntryCount': 0, 'Entries': [{'EventId': str(n)} for n in range(len(Entries))]}
+
+
+@pytest.fixture
+def inventory(db, monkeypatch):
+    events = StubEventBridge()
+    monkeypatch.setattr(update_inventory, 'eventbridge', events)
+    monkeypatch.setattr(update_inventory, 'get_db_connection', lambda: db.conn)
+    monkeypatch.setattr(update_inventory, 'release_db_connection', lambda conn: None)
+    cur = db.conn.cursor()
+    cur.execute("UPDATE inventory SET stock_quantity = 15 WHERE product_id = 'PROD001'")
+    db.conn.commit()
+    return events
+
+
+def reserve(order_id, quantity):
+    return update_inventory.lambda_handler({
+        'orderId': order_id,
+        'items': [{'productId': 'PROD001', 'quantity': quantity}]
+    }, None)
+
+
+def test_low_stock_alert_is_claimed_once_per_window(db, make_order, inventory):
+    make_order('ORD1')
+    make_order('ORD2')
+
+    first = reserve('ORD1', 6)
+    second = reserve('ORD2', 1)
+
+    assert first['inventoryStatus'] == second['inventoryStatus'] == 'success'
+    assert len(first['low_stock_alerts']) == len(second['low_stock_alerts']) == 1
+    # Alert kedua masih di dalam LOW_STOCK_DEDUP_SECONDS
+    assert len(inventory.entries) == 1
+
+
+def test_claim_does_not_hold_alert_row_lock(db, make_order, inventory):
+    make_order('ORD1')
+    make_order('ORD2')
+    reserve('ORD1', 6)
+
+    # Baris low_stock_alerts sudah ada; transaksi lain yang sedang mengklaim
+    # produk yang sama tidak boleh membuat update stok menunggu
+    other = db.connect()
+    other.cursor().execute("""
+        UPDATE low_stock_alerts SET last_sent_at = last_sent_at
+        WHERE product_id = 'PROD001'
+    """)
+    cur = db.conn.cursor()
+    cur.execute("SET lock_timeout = '1s'")
+    db.conn.commit()
+
+    result = reserve('ORD2', 1)
+
+    assert result['inventoryStatus'] == 'success'
+    assert result['updated_products'][0]['new_stock'] == 8
+    other.rollback()
+
+
+def test_alert_is_sent_again_after_dedup_window(db, make_order, inventory):
+    make_order('ORD1')
+    make_order('ORD2')
+    reserve('ORD1', 6)
+    cur = db.conn.cursor()
+    cur.execute("UPDATE low_stock_alerts SET last_sent_at = last_sent_at - INTERVAL '1 hour'")
+    db.conn.commit()
+
+    reserve('ORD2', 1)
+
+    assert len(inventory.entries) == 2